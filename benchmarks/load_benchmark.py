@@ -0,0 +1,273 @@
+"""负载测试与查询回放
+
+从 JSONL 查询日志（每行一个 JSON，取 query 字段，没有时取 title）回放查询到
+WorkflowCoordinator，统计吞吐量、端到端与各阶段的 p50/p95/p99 耗时、token 总数，
+并按 CostTracker.MODEL_PRICING 估算成本。
+
+两种负载模式：
+    开环：按目标 QPS 以泊松到达发起请求，不等待前一个请求完成
+    闭环：N 个用户各自循环发起请求，完成后等待思考时间再发下一个
+
+默认使用 benchmarks/stand_ins.py 中的离线替身后端，延迟分布可配置，固定种子时可复现。
+
+用法：
+    python benchmarks/load_benchmark.py requests.jsonl --mode closed --users 8 --requests 100
+    python benchmarks/load_benchmark.py requests.jsonl --mode open --qps 5 --llm-latency lognormal:1.2,0.4
+    python benchmarks/load_benchmark.py requests.jsonl --backend live --requests 10
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def load_queries(path: str, limit: Optional[int] = None) -> List[str]:
+    """读取查询日志"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            query = (record.get("query") or record.get("title")) if isinstance(record, dict) else record
+            if query:
+                queries.append(str(query))
+            if limit and len(queries) >= limit:
+                break
+    return queries
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else 0.0
+    }
+
+class UsageRecorder:
+    """替换 CostTracker.track_usage，记录 token 使用量并按模型定价估算成本（不写日志文件）"""
+    def __init__(self, cost_tracker):
+        self.cost_tracker = cost_tracker
+        self.tokens: Dict[str, int] = {}
+        self.costs: Dict[str, float] = {}
+
+    async def track_usage(self, content: str, token_usage: Any, model: str,
+                          session_id: str, task_type: str, thinking_time: float = 0.0):
+        self.add(task_type, token_usage, model)
+
+    def add(self, task_type: str, token_usage: Any, model: str):
+        if not token_usage:
+            return
+        if not isinstance(token_usage, dict):
+            token_usage = vars(token_usage)
+        total = token_usage.get("total_tokens", 0) or 0
+        completion = token_usage.get("completion_tokens", 0) or 0
+        prompt = token_usage.get("prompt_tokens", total - completion) or 0
+        self.tokens[task_type] = self.tokens.get(task_type, 0) + total
+        self.costs[task_type] = self.costs.get(task_type, 0.0) + self.cost_tracker.calculate_cost(
+            prompt, completion, model
+        )
+
+async def run_query(coordinator, query: str, session_id: str, timeout: Optional[float],
+                    samples: List[Dict[str, Any]], recorder: Optional[UsageRecorder] = None):
+    """执行一个查询并记录样本"""
+    start = time.perf_counter()
+    try:
+        result = await coordinator.process_query(query, session_id, timeout=timeout)
+        metadata = result.metadata
+        error = metadata.get("error")
+        if recorder is not None and result.evaluation_result.get("token_usage"):
+            recorder.add(
+                "evaluation",
+                result.evaluation_result["token_usage"],
+                coordinator.config.default_models["response_generation"]
+            )
+    except Exception as e:
+        metadata, error = {}, str(e)
+    samples.append({
+        "latency": time.perf_counter() - start,
+        "stage_timings": metadata.get("stage_timings", {}),
+        "queue_time": metadata.get("queue_time"),
+        "cache_hit": bool(metadata.get("cache_hit")),
+        "degradations": metadata.get("degradations", []),
+        "error": error
+    })
+
+async def run_closed_loop(coordinator, queries: List[str], total: int, users: int,
+                          think_time: float = 0.0, timeout: Optional[float] = None,
+                          recorder: Optional[UsageRecorder] = None) -> List[Dict[str, Any]]:
+    """闭环负载：users 个用户共享请求序列，各自完成一个再发下一个"""
+    samples: List[Dict[str, Any]] = []
+    counter = iter(range(total))
+
+    async def user(user_id: int):
+        for i in counter:
+            await run_query(coordinator, queries[i % len(queries)], f"bench-{user_id}-{i}",
+                            timeout, samples, recorder)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(user(u) for u in range(max(1, users))))
+    return samples
+
+async def run_open_loop(coordinator, queries: List[str], total: int, qps: float,
+                        timeout: Optional[float] = None, seed: Optional[int] = 0,
+                        recorder: Optional[UsageRecorder] = None) -> List[Dict[str, Any]]:
+    """开环负载：按泊松过程以目标 QPS 发起请求"""
+    samples: List[Dict[str, Any]] = []
+    rng = random.Random(seed)
+    pending = []
+    next_at = time.perf_counter()
+    for i in range(total):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        pending.append(asyncio.ensure_future(run_query(
+            coordinator, queries[i % len(queries)], f"bench-{i}", timeout, samples, recorder
+        )))
+        next_at += rng.expovariate(qps)
+    await asyncio.gather(*pending)
+    return samples
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float,
+              recorder: Optional[UsageRecorder] = None) -> Dict[str, Any]:
+    stages: Dict[str, List[float]] = {}
+    for sample in samples:
+        for stage, duration in sample["stage_timings"].items():
+            stages.setdefault(stage, []).append(duration)
+    queue_times = [s["queue_time"] for s in samples if s["queue_time"] is not None]
+    errors = [s for s in samples if s["error"]]
+
+    summary = {
+        "requests": len(samples),
+        "errors": len(errors),
+        "cache_hits": sum(1 for s in samples if s["cache_hit"]),
+        "degraded": sum(1 for s in samples if s["degradations"]),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "latency": latency_summary([s["latency"] for s in samples]),
+        "stages": {stage: latency_summary(values) for stage, values in stages.items()}
+    }
+    if queue_times:
+        summary["queue_time"] = latency_summary(queue_times)
+    if recorder is not None:
+        total_cost = sum(recorder.costs.values())
+        summary["tokens"] = dict(recorder.tokens, total=sum(recorder.tokens.values()))
+        summary["cost"] = dict(recorder.costs, total=total_cost)
+        summary["cost_per_request"] = total_cost / len(samples) if samples else 0.0
+    return summary
+
+def build_coordinator(args: argparse.Namespace):
+    """按参数创建协调器，离线模式下先注册替身后端"""
+    from engine.utils.resources import resources
+    from engine.web.apiconfig import config
+
+    stand_ins = None
+    if args.backend == "standin":
+        from benchmarks.stand_ins import StandIns
+        stand_ins = StandIns(
+            llm_latency=args.llm_latency,
+            embedding_latency=args.embedding_latency,
+            search_latency=args.search_latency,
+            response_chars=args.response_chars,
+            fallback_rate=args.fallback_rate,
+            seed=args.seed
+        )
+        stand_ins.register(resources, config.api)
+
+    from engine.core.workflow_coordinator import WorkflowCoordinator, WorkflowConfig
+    coordinator = WorkflowCoordinator(WorkflowConfig(
+        answer_cache_enabled=args.cache,
+        max_in_flight_queries=args.max_in_flight
+    ))
+    if stand_ins is not None:
+        stand_ins.attach(coordinator)
+    return coordinator, stand_ins
+
+def print_summary(summary: Dict[str, Any]):
+    latency = summary["latency"]
+    print(f"请求数: {summary['requests']}  错误: {summary['errors']}  "
+          f"缓存命中: {summary['cache_hits']}  降级: {summary['degraded']}")
+    print(f"总耗时: {summary['elapsed']:.2f} s  吞吐量: {summary['throughput']:.2f} req/s")
+    print(f"端到端: p50 {latency['p50']:.3f} s  p95 {latency['p95']:.3f} s  p99 {latency['p99']:.3f} s")
+    if "queue_time" in summary:
+        queue = summary["queue_time"]
+        print(f"排队: p50 {queue['p50']:.3f} s  p95 {queue['p95']:.3f} s  p99 {queue['p99']:.3f} s")
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<22} p50 {stats['p50']:.3f} s  p95 {stats['p95']:.3f} s  p99 {stats['p99']:.3f} s")
+    if "tokens" in summary:
+        print(f"token 总数: {summary['tokens']['total']}")
+        print(f"估算成本: ${summary['cost']['total']:.4f}（每请求 ${summary['cost_per_request']:.5f}）")
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    queries = load_queries(args.log, args.limit)
+    if not queries:
+        raise SystemExit(f"查询日志为空: {args.log}")
+    total = args.requests or len(queries)
+
+    coordinator, stand_ins = build_coordinator(args)
+    recorder = UsageRecorder(coordinator.cost_tracker)
+    coordinator.cost_tracker.track_usage = recorder.track_usage
+
+    start = time.perf_counter()
+    if args.mode == "open":
+        samples = await run_open_loop(coordinator, queries, total, args.qps, args.timeout, args.seed, recorder)
+    else:
+        samples = await run_closed_loop(coordinator, queries, total, args.users, args.think_time,
+                                        args.timeout, recorder)
+    summary = summarize(samples, time.perf_counter() - start, recorder)
+    if stand_ins is not None:
+        summary["backend_calls"] = stand_ins.calls()
+    return summary
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="回放查询日志，测量吞吐量、分阶段延迟和成本")
+    parser.add_argument("log", help="JSONL 查询日志")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed", help="开环或闭环负载")
+    parser.add_argument("--requests", type=int, help="请求总数，默认为日志中的查询数，不足时循环回放")
+    parser.add_argument("--limit", type=int, help="最多读取的查询数")
+    parser.add_argument("--qps", type=float, default=2.0, help="开环模式的目标 QPS")
+    parser.add_argument("--users", type=int, default=4, help="闭环模式的并发用户数")
+    parser.add_argument("--think-time", type=float, default=0.0, help="闭环模式下两次请求之间的等待（秒）")
+    parser.add_argument("--timeout", type=float, help="每个请求的截止时间（秒）")
+    parser.add_argument("--max-in-flight", type=int, help="启用准入控制时的最大并发查询数")
+    parser.add_argument("--cache", action="store_true", help="启用答案缓存（默认关闭，避免回放时命中缓存）")
+    parser.add_argument("--backend", choices=["standin", "live"], default="standin",
+                        help="standin 使用离线替身后端，live 使用 apiconfig 中配置的真实服务")
+    parser.add_argument("--llm-latency", default="lognormal:1.0,0.3", help="替身模型调用延迟分布")
+    parser.add_argument("--embedding-latency", default="lognormal:0.05,0.3", help="替身 Embeddings 延迟分布")
+    parser.add_argument("--search-latency", default="lognormal:0.3,0.3", help="替身 Bing 搜索延迟分布")
+    parser.add_argument("--response-chars", type=int, default=800, help="替身模型每次回答的字符数")
+    parser.add_argument("--fallback-rate", type=float, default=0.0, help="替身评估触发网页搜索回退的比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    summary = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary)
+    return 1 if summary["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
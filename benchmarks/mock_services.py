@@ -0,0 +1,281 @@
+"""Azure OpenAI 与 Bing 搜索的本地模拟服务
+
+实现 AzureChatOpenAI / AzureOpenAI / AzureOpenAIEmbeddings 使用的 chat completions 与
+embeddings 协议（含流式输出和 base64 编码），以及 FallbackSearchEngine 使用的 Bing v7
+搜索接口。延迟、错误率、限流（429）和流式分块间隔均可配置，便于在本机离线压测完整流程。
+
+用法：
+    python benchmarks/mock_services.py --port 8100 --chat-latency lognormal:0.8,0.3 --rate-limit 20
+
+然后将配置指向模拟服务：
+    export AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100
+    export AZURE_OPENAI_API_KEY=mock
+    export BING_SEARCH_ENDPOINT=http://127.0.0.1:8100/v7.0/search
+"""
+from typing import Any, Dict, List, Optional
+from array import array
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.stand_ins import LatencyModel, StandInTokenizer
+from engine.web.server import HTTPServer, HTTPError, Request, Response
+
+def azure_error(status: int, code: str, message: str, headers: Optional[Dict[str, str]] = None) -> HTTPError:
+    """构造 Azure OpenAI 格式的错误响应"""
+    return HTTPError(status, message, headers, body={"error": {"code": code, "message": message}})
+
+class TokenBucket:
+    """令牌桶限流"""
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        """取一个令牌，不足时返回需要等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+class MockServices(HTTPServer):
+    """模拟服务：按路径后缀分发到 chat completions、embeddings 和 Bing 搜索"""
+    name = "模拟服务"
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8100,
+                 chat_latency: str = "lognormal:0.8,0.3",
+                 embedding_latency: str = "lognormal:0.05,0.3",
+                 search_latency: str = "lognormal:0.3,0.3",
+                 chunk_delay: float = 0.02,
+                 chunk_chars: int = 8,
+                 completion_chars: int = 600,
+                 dimensions: int = 3072,
+                 error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None,
+                 burst: Optional[int] = None,
+                 seed: Optional[int] = 0):
+        super().__init__(host, port)
+        seeds = [None] * 4 if seed is None else [seed + i for i in range(4)]
+        self.chat_latency = LatencyModel.parse(chat_latency, seeds[0])
+        self.embedding_latency = LatencyModel.parse(embedding_latency, seeds[1])
+        self.search_latency = LatencyModel.parse(search_latency, seeds[2])
+        self.random = random.Random(seeds[3])
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.completion_chars = completion_chars
+        self.dimensions = dimensions
+        self.error_rate = error_rate
+        self.limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.tokenizer = StandInTokenizer()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    async def handle(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        if request.path == "/health":
+            return 200, json.dumps({"status": "ok"}), "application/json"
+        if request.path == "/stats":
+            return 200, json.dumps(self.stats), "application/json"
+
+        if request.path.endswith("/chat/completions") and request.method == "POST":
+            route, handler = "chat", self._chat_completions
+        elif request.path.endswith("/embeddings") and request.method == "POST":
+            route, handler = "embeddings", self._embeddings
+        elif request.path.endswith("/v7.0/search") and request.method == "GET":
+            route, handler = "search", self._bing_search
+        else:
+            raise azure_error(404, "404", "Resource not found")
+
+        counts = self.stats.setdefault(route, {"requests": 0, "rate_limited": 0, "errors": 0})
+        counts["requests"] += 1
+        self._inject_faults(counts)
+        return await handler(request, writer)
+
+    def _inject_faults(self, counts: Dict[str, int]):
+        """按配置返回 429 或 500"""
+        if self.limiter is not None:
+            retry_after = self.limiter.take()
+            if retry_after is not None:
+                counts["rate_limited"] += 1
+                raise azure_error(
+                    429, "429", "Rate limit is exceeded. Try again later.",
+                    {"Retry-After": str(max(1, round(retry_after))), "retry-after-ms": str(int(retry_after * 1000))}
+                )
+        if self.error_rate and self.random.random() < self.error_rate:
+            counts["errors"] += 1
+            raise azure_error(500, "InternalServerError", "The server had an error while processing your request.")
+
+    def _completion_text(self, messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> str:
+        """根据提示类型生成可被调用方解析的回答"""
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        if '"score"' in prompt and "hallucination_risk" in prompt:
+            # ResultEvaluator 要求严格的 JSON 评估结果
+            return json.dumps({"score": 0.85, "hallucination_risk": 0.1, "confidence": 0.9, "issues": []})
+
+        digest = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8]
+        length = self.completion_chars if not max_tokens else min(self.completion_chars, max_tokens)
+        body = (f"模拟回答（{digest}）：" + "根据检索到的资料，相关指标保持稳定增长。" * (length // 20 + 1))[:length]
+        if "Final Answer:" in prompt:
+            # ReAct 代理按 Thought / Final Answer 格式解析输出
+            return f"Thought: I now know the final answer\nFinal Answer: {body}"
+        return body
+
+    async def _chat_completions(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        data = request.json()
+        messages = data.get("messages") or []
+        model = data.get("model") or request.path.split("/")[-3]
+        content = self._completion_text(messages, data.get("max_tokens") or data.get("max_completion_tokens"))
+        prompt_tokens = sum(len(self.tokenizer.encode(str(m.get("content", "")))) for m in messages)
+        completion_tokens = len(self.tokenizer.encode(content))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        await self.chat_latency.wait()
+        if not data.get("stream"):
+            return 200, json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }, ensure_ascii=False), "application/json"
+
+        # 流式输出：首块延迟由 chat_latency 决定，之后按固定间隔推送
+        await self._start_sse(writer)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+
+        writer.write(self._sse(None, chunk({"role": "assistant", "content": ""})))
+        for i in range(0, len(content), self.chunk_chars):
+            writer.write(self._sse(None, chunk({"content": content[i:i + self.chunk_chars]})))
+            await writer.drain()
+            await asyncio.sleep(self.chunk_delay)
+        writer.write(self._sse(None, chunk({}, "stop")))
+        if (data.get("stream_options") or {}).get("include_usage"):
+            writer.write(self._sse(None, dict(chunk({}), choices=[], usage=usage)))
+        writer.write(self._sse(None, "[DONE]"))
+        await writer.drain()
+        return None
+
+    def _vector(self, item: Any, dimensions: int) -> List[float]:
+        rng = random.Random(hashlib.md5(json.dumps(item).encode("utf-8")).hexdigest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    async def _embeddings(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        data = request.json()
+        inputs = data.get("input")
+        if inputs is None:
+            raise azure_error(400, "invalid_request_error", "'input' is a required property")
+        # 输入可以是字符串、字符串列表、token 列表或 token 列表的列表
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = int(data.get("dimensions") or self.dimensions)
+
+        await self.embedding_latency.wait()
+        items = []
+        prompt_tokens = 0
+        for index, item in enumerate(inputs):
+            vector = self._vector(item, dimensions)
+            if data.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            else:
+                embedding = vector
+            prompt_tokens += len(item) if isinstance(item, list) else len(self.tokenizer.encode(item))
+            items.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        return 200, json.dumps({
+            "object": "list",
+            "data": items,
+            "model": data.get("model") or request.path.split("/")[-2],
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        }), "application/json"
+
+    async def _bing_search(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        query = (request.query.get("q") or [""])[0]
+        count = int((request.query.get("count") or ["5"])[0])
+
+        await self.search_latency.wait()
+        pages = [{
+            "id": f"https://api.bing.microsoft.com/api/v7/#WebPages.{i}",
+            "name": f"{query} - 结果 {i + 1}",
+            "url": f"https://example.com/search/{i + 1}",
+            "snippet": f"{query} 相关的网页摘要 {i + 1}，包含示例数据和事实依据。"
+        } for i in range(count)]
+        return 200, json.dumps({
+            "_type": "SearchResponse",
+            "queryContext": {"originalQuery": query},
+            "webPages": {"totalEstimatedMatches": count, "value": pages}
+        }, ensure_ascii=False), "application/json"
+
+def main():
+    parser = argparse.ArgumentParser(description="启动 Azure OpenAI 与 Bing 搜索的本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8100, help="监听端口")
+    parser.add_argument("--chat-latency", default="lognormal:0.8,0.3", help="chat completions 延迟（流式时为首块延迟）")
+    parser.add_argument("--embedding-latency", default="lognormal:0.05,0.3", help="embeddings 延迟")
+    parser.add_argument("--search-latency", default="lognormal:0.3,0.3", help="Bing 搜索延迟")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="流式输出的分块间隔（秒）")
+    parser.add_argument("--completion-chars", type=int, default=600, help="每次回答的字符数")
+    parser.add_argument("--dimensions", type=int, default=3072, help="默认向量维度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的请求比例")
+    parser.add_argument("--rate-limit", type=float, help="每秒允许的请求数，超出时返回 429")
+    parser.add_argument("--burst", type=int, help="限流的突发容量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    server = MockServices(
+        host=args.host,
+        port=args.port,
+        chat_latency=args.chat_latency,
+        embedding_latency=args.embedding_latency,
+        search_latency=args.search_latency,
+        chunk_delay=args.chunk_delay,
+        completion_chars=args.completion_chars,
+        dimensions=args.dimensions,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        seed=args.seed
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""离线替身后端
+
+为负载测试提供不访问网络的聊天模型、Embeddings、OpenAI 客户端、向量库、Bing 搜索和
+tokenizer 替身，延迟按可配置的分布采样，固定随机种子时结果可复现。
+"""
+from typing import Any, Dict, List, Optional
+from types import SimpleNamespace
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from engine.utils.tokens import TokenCounter, approximate_tokens
+
+class LatencyModel:
+    """延迟分布
+
+    支持的写法：
+        fixed:0.5            固定 0.5 秒
+        uniform:0.2,0.8      0.2 到 0.8 秒均匀分布
+        lognormal:1.0,0.4    中位数 1.0 秒、对数标准差 0.4 的对数正态分布
+    """
+    def __init__(self, kind: str = "fixed", a: float = 0.0, b: float = 0.0, seed: Optional[int] = None):
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"未知的延迟分布: {kind}")
+        self.kind = kind
+        self.a = a
+        self.b = b
+        self.random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyModel":
+        kind, _, args = spec.partition(":")
+        values = [float(value) for value in args.split(",") if value.strip()] if args else []
+        values += [0.0] * (2 - len(values))
+        return cls(kind.strip(), values[0], values[1], seed)
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return self.random.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return self.a * math.exp(self.random.gauss(0.0, self.b))
+        return self.a
+
+    async def wait(self):
+        await asyncio.sleep(self.sample())
+
+class StandInTokenizer:
+    """近似 tokenizer：ASCII 约 4 个字符一个 token，其他字符各算一个"""
+    def encode(self, text: str) -> List[int]:
+        ascii_chars = sum(1 for char in text if ord(char) < 128)
+        return [0] * (math.ceil(ascii_chars / 4) + len(text) - ascii_chars)
+
+class StandInChatModel:
+    """聊天模型替身，提供与 AzureChatOpenAI 相同的 invoke / ainvoke / astream / bind 接口"""
+    def __init__(self, latency: LatencyModel, response_chars: int = 800, chunk_chars: int = 20,
+                 max_tokens: Optional[int] = None, counter: Optional[List[int]] = None):
+        self.latency = latency
+        self.response_chars = response_chars
+        self.chunk_chars = chunk_chars
+        self.max_tokens = max_tokens
+        # bind 产生的副本与原模型共享调用计数
+        self._counter = counter if counter is not None else [0]
+
+    @property
+    def calls(self) -> int:
+        return self._counter[0]
+
+    def bind(self, max_tokens: Optional[int] = None, **kwargs) -> "StandInChatModel":
+        return StandInChatModel(self.latency, self.response_chars, self.chunk_chars, max_tokens, self._counter)
+
+    def _usage(self, messages: Any, content: str) -> Dict[str, int]:
+        """与真实服务一样在响应中返回 token 使用量"""
+        prompt_tokens = approximate_tokens(str(messages))
+        completion_tokens = approximate_tokens(content)
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _content(self, messages: Any) -> str:
+        length = self.response_chars
+        if self.max_tokens:
+            length = min(length, self.max_tokens)
+        seed = hashlib.md5(str(messages).encode("utf-8")).hexdigest()
+        text = f"模拟回答（{seed[:8]}）：" + "根据检索到的资料，相关指标保持稳定增长。" * (length // 20 + 1)
+        return text[:length]
+
+    def invoke(self, messages: Any) -> SimpleNamespace:
+        self._counter[0] += 1
+        time.sleep(self.latency.sample())
+        content = self._content(messages)
+        return SimpleNamespace(content=content, usage_metadata=self._usage(messages, content))
+
+    async def ainvoke(self, messages: Any) -> SimpleNamespace:
+        self._counter[0] += 1
+        await self.latency.wait()
+        content = self._content(messages)
+        return SimpleNamespace(content=content, usage_metadata=self._usage(messages, content))
+
+    async def astream(self, messages: Any):
+        self._counter[0] += 1
+        content = self._content(messages)
+        chunks = [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)]
+        # 总延迟均匀分摊到每个块上
+        delay = self.latency.sample() / max(1, len(chunks))
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield SimpleNamespace(content=chunk, usage_metadata=None)
+        # 与 stream_usage 一致，使用量在最后一个空块中返回
+        yield SimpleNamespace(content="", usage_metadata=self._usage(messages, content))
+
+class StandInEmbeddings:
+    """Embeddings 替身，按文本哈希生成确定性向量"""
+    def __init__(self, latency: LatencyModel, dimensions: int = 64):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.md5(text.encode("utf-8")).hexdigest())
+        return [rng.gauss(0.0, 1.0) for _ in range(self.dimensions)]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        return self._vector(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await self.latency.wait()
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await self.latency.wait()
+        return [self._vector(text) for text in texts]
+
+class StandInDocumentStore:
+    """向量库替身：检索时调用一次 Embeddings 并返回固定文档"""
+    version = "stand-in"
+
+    def __init__(self, embeddings: StandInEmbeddings, doc_chars: int = 300):
+        self.embeddings = embeddings
+        self.doc_chars = doc_chars
+
+    async def search(self, query: str, k: int = 3, **kwargs) -> List[SimpleNamespace]:
+        await self.embeddings.aembed_query(query)
+        return [
+            SimpleNamespace(
+                page_content=(f"文档片段 {i + 1}：" + "示例数据与事实依据。" * (self.doc_chars // 10 + 1))[:self.doc_chars],
+                metadata={"source": f"stand-in-{i + 1}"}
+            )
+            for i in range(k)
+        ]
+
+    async def search_many(self, queries: List[str], k: int = 3, **kwargs) -> List[List[SimpleNamespace]]:
+        await self.embeddings.aembed_documents(queries)
+        return [
+            [
+                SimpleNamespace(
+                    page_content=(f"文档片段 {q + 1}-{i + 1}：" + "示例数据与事实依据。" * (self.doc_chars // 10 + 1))[:self.doc_chars],
+                    metadata={"source": f"stand-in-{q + 1}-{i + 1}"}
+                )
+                for i in range(k)
+            ]
+            for q in range(len(queries))
+        ]
+
+class StandInAgentExecutor:
+    """ReAct 代理替身：一次文档检索加一次模型调用"""
+    def __init__(self, llm: StandInChatModel, doc_store: StandInDocumentStore):
+        self.llm = llm
+        self.doc_store = doc_store
+
+    async def ainvoke(self, inputs: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        docs = await self.doc_store.search(inputs["input"])
+        response = await self.llm.ainvoke([inputs["input"]] + [doc.page_content for doc in docs])
+        return {"input": inputs["input"], "output": response.content}
+
+class StandInOpenAIClient:
+    """OpenAI SDK 客户端替身，只实现 chat.completions.create（同步调用，与真实客户端一致）
+
+    以 fallback_rate 的概率返回低分评估，从而触发网页搜索回退。
+    """
+    def __init__(self, latency: LatencyModel, fallback_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.fallback_rate = fallback_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, str]], **kwargs) -> SimpleNamespace:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        low = self.random.random() < self.fallback_rate
+        content = json.dumps({
+            "score": 0.5 if low else 0.9,
+            "hallucination_risk": 0.5 if low else 0.1,
+            "confidence": 0.8,
+            "issues": []
+        })
+        prompt_tokens = sum(approximate_tokens(str(message.get("content", ""))) for message in messages)
+        completion_tokens = approximate_tokens(content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+class StandInWebSearch:
+    """Bing 搜索替身，接口与 FallbackSearchEngine.fallback_search 相同"""
+    def __init__(self, latency: LatencyModel, results: int = 3):
+        self.latency = latency
+        self.results = results
+        self.calls = 0
+
+    async def fallback_search(self, query: str, max_results: int = 5,
+                              min_relevance_score: float = 0.7) -> List[SimpleNamespace]:
+        self.calls += 1
+        await self.latency.wait()
+        return [
+            SimpleNamespace(
+                source="bing",
+                content=f"网页摘要 {i + 1}：{query}",
+                url=f"https://example.com/{i + 1}",
+                relevance_score=0.9
+            )
+            for i in range(min(self.results, max_results))
+        ]
+
+class StandIns:
+    """一组替身后端"""
+    def __init__(self,
+                 llm_latency: str = "lognormal:1.0,0.3",
+                 embedding_latency: str = "lognormal:0.05,0.3",
+                 search_latency: str = "lognormal:0.3,0.3",
+                 response_chars: int = 800,
+                 fallback_rate: float = 0.0,
+                 seed: Optional[int] = 0):
+        # 每个后端使用独立的随机数序列，互不影响
+        seeds = [None] * 4 if seed is None else [seed + i for i in range(4)]
+        self.llm = StandInChatModel(LatencyModel.parse(llm_latency, seeds[0]), response_chars)
+        self.embeddings = StandInEmbeddings(LatencyModel.parse(embedding_latency, seeds[1]))
+        self.openai_client = StandInOpenAIClient(LatencyModel.parse(llm_latency, seeds[2]), fallback_rate, seed)
+        self.web_search = StandInWebSearch(LatencyModel.parse(search_latency, seeds[3]))
+        self.doc_store = StandInDocumentStore(self.embeddings)
+        self.tokenizer = StandInTokenizer()
+
+    def register(self, registry, api_config):
+        """注册到资源注册表，需在创建 WorkflowCoordinator 之前调用"""
+        token_counter = TokenCounter(self.tokenizer)
+        for name in {api_config.azure_openai["model"], api_config.embedding["model"], "gpt-4o"}:
+            registry.register(("tokenizer", name), self.tokenizer)
+            registry.register(("token_counter", name), token_counter)
+        for temperature in (None, 0):
+            registry.register(("chat_llm", temperature), self.llm)
+        registry.register("openai_client", self.openai_client)
+        registry.register(("embeddings", tuple(sorted(api_config.embedding.items()))), self.embeddings)
+        registry.register("document_store", self.doc_store)
+
+    def attach(self, coordinator):
+        """替换协调器中不经过资源注册表创建的组件"""
+        coordinator.tool_orchestrator.agent_executor = StandInAgentExecutor(self.llm, self.doc_store)
+        coordinator.result_evaluator.fallback_search = self.web_search
+
+    def calls(self) -> Dict[str, int]:
+        return {
+            "llm": self.llm.calls,
+            "evaluator": self.openai_client.calls,
+            "embeddings": self.embeddings.calls,
+            "web_search": self.web_search.calls
+        }
@@ -0,0 +1,108 @@
+"""冷启动基准测试
+
+在全新的子进程中测量导入 engine.core.workflow_coordinator 的耗时，以及构建
+WorkflowCoordinator（可处理第一个查询）的耗时，并列出已加载的重量级依赖。
+
+用法：
+    python benchmarks/startup_benchmark.py --runs 5
+    python benchmarks/startup_benchmark.py --max-import-ms 800 --max-ready-ms 2000 --forbid-heavy
+"""
+from typing import Dict, List
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 只应在对应代码路径首次运行时才加载的依赖
+HEAVY_MODULES = [
+    "langchain.agents",
+    "langchain_chroma",
+    "chromadb",
+    "pandas",
+    "openpyxl",
+    "pypdf",
+    "docx",
+    "bs4",
+    "markdown"
+]
+
+PROBE = """
+import json, sys, time
+heavy = json.loads(sys.argv[1])
+start = time.perf_counter()
+import engine.core.workflow_coordinator as wc
+import_time = time.perf_counter() - start
+after_import = [m for m in heavy if m in sys.modules]
+start = time.perf_counter()
+wc.WorkflowCoordinator()
+ready_time = time.perf_counter() - start
+after_ready = [m for m in heavy if m in sys.modules]
+print(json.dumps({
+    "import_ms": import_time * 1000,
+    "ready_ms": (import_time + ready_time) * 1000,
+    "heavy_after_import": after_import,
+    "heavy_after_ready": after_ready
+}))
+"""
+
+def run_probe() -> Dict:
+    """在独立进程中运行一次探测"""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(HEAVY_MODULES)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    # 组件初始化可能打印日志，结果位于最后一行
+    return json.loads(output.strip().splitlines()[-1])
+
+def summarize(runs: List[Dict]) -> Dict:
+    import_ms = [r["import_ms"] for r in runs]
+    ready_ms = [r["ready_ms"] for r in runs]
+    return {
+        "runs": len(runs),
+        "import_ms": {"median": statistics.median(import_ms), "max": max(import_ms)},
+        "ready_ms": {"median": statistics.median(ready_ms), "max": max(ready_ms)},
+        "heavy_after_import": sorted({m for r in runs for m in r["heavy_after_import"]}),
+        "heavy_after_ready": sorted({m for r in runs for m in r["heavy_after_ready"]})
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="测量引擎导入与首个查询就绪的冷启动耗时")
+    parser.add_argument("--runs", type=int, default=5, help="子进程运行次数")
+    parser.add_argument("--max-import-ms", type=float, help="导入耗时中位数上限，超出时返回非零")
+    parser.add_argument("--max-ready-ms", type=float, help="就绪耗时中位数上限，超出时返回非零")
+    parser.add_argument("--forbid-heavy", action="store_true", help="导入后出现重量级依赖时返回非零")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    summary = summarize([run_probe() for _ in range(args.runs)])
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"运行次数: {summary['runs']}")
+        print(f"导入耗时: 中位数 {summary['import_ms']['median']:.1f} ms, 最大 {summary['import_ms']['max']:.1f} ms")
+        print(f"就绪耗时: 中位数 {summary['ready_ms']['median']:.1f} ms, 最大 {summary['ready_ms']['max']:.1f} ms")
+        print(f"导入后已加载的重量级依赖: {summary['heavy_after_import'] or '无'}")
+        print(f"就绪后已加载的重量级依赖: {summary['heavy_after_ready'] or '无'}")
+
+    failures = []
+    if args.max_import_ms is not None and summary["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"导入耗时超出上限 {args.max_import_ms} ms")
+    if args.max_ready_ms is not None and summary["ready_ms"]["median"] > args.max_ready_ms:
+        failures.append(f"就绪耗时超出上限 {args.max_ready_ms} ms")
+    if args.forbid_heavy and summary["heavy_after_import"]:
+        failures.append(f"导入阶段加载了重量级依赖: {summary['heavy_after_import']}")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
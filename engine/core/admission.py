@@ -0,0 +1,127 @@
+from typing import Any, Deque, Dict, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from ..utils.metrics import WorkflowMetrics
+
+class AdmissionRejected(Exception):
+    """请求未被准入"""
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+class AdmissionController:
+    """查询准入控制：限制同时处理的查询数，超出部分进入有界 FIFO 队列
+
+    队列已满、或按当前平均处理时长估算的排队时间会超过调用方截止时间时立即拒绝，
+    避免请求在队列中耗尽预算后再失败。
+    """
+    def __init__(self,
+                 max_in_flight: int = 8,
+                 max_queue: int = 64,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 smoothing: float = 0.2):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.metrics = metrics
+        self.smoothing = smoothing
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # 平均处理时长（指数滑动平均），用于估算排队时间
+        self._service_time: Optional[float] = None
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def estimated_wait(self) -> float:
+        """估算新请求的排队时间（秒）"""
+        if self._service_time is None or self._in_flight < self.max_in_flight:
+            return 0.0
+        return self._service_time * (self.queued + 1) / self.max_in_flight
+
+    async def acquire(self, deadline: Optional[float] = None) -> float:
+        """获取处理槽位，返回排队时间；无法准入时抛出 AdmissionRejected"""
+        start = time.monotonic()
+        if self._in_flight < self.max_in_flight and not self.queued:
+            self._in_flight += 1
+            return self._admit(start)
+
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", start, "排队请求已满")
+        if deadline is not None and start + self.estimated_wait() > deadline:
+            self._reject("deadline", start, "预计排队时间超过截止时间")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                self._hand_off()
+            self._reject("deadline", start, "排队期间已超过截止时间")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分配到槽位但调用方取消，转交给下一个等待者
+                self._hand_off()
+            raise
+        return self._admit(start)
+
+    def release(self, service_time: Optional[float] = None):
+        """释放处理槽位，并更新平均处理时长"""
+        if service_time is not None:
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time += self.smoothing * (service_time - self._service_time)
+        self._hand_off()
+
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[float] = None):
+        """在准入槽位内执行代码块，产出排队时间"""
+        queue_time = await self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield queue_time
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_service_time": self._service_time or 0.0,
+            "estimated_wait": self.estimated_wait()
+        }
+
+    def _hand_off(self):
+        """将槽位交给队首仍在等待的请求，没有等待者时归还"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _admit(self, start: float) -> float:
+        queue_time = time.monotonic() - start
+        self.admitted += 1
+        if self.metrics is not None:
+            self.metrics.record("admission_queue", queue_time)
+        return queue_time
+
+    def _reject(self, reason: str, start: float, message: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        if self.metrics is not None:
+            self.metrics.record("admission_queue", time.monotonic() - start, error=True)
+        raise AdmissionRejected(reason, message)
@@ -0,0 +1,44 @@
+from typing import Any, Dict, Optional
+import copy
+import hashlib
+import json
+from pydantic import BaseModel
+from .query_parser import normalize_query
+from ..utils.cache import TTLCache, SQLiteCache, TieredCache
+
+def config_fingerprint(config: BaseModel, exclude: Optional[set] = None) -> str:
+    """计算配置的指纹，配置变化时缓存自动失效"""
+    data = config.dict(exclude=exclude or set())
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class AnswerCache:
+    """端到端答案缓存，键由规范化查询、配置指纹和知识库版本组成"""
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: Optional[float] = 3600.0,
+                 sqlite_path: Optional[str] = None,
+                 sqlite_max_entries: Optional[int] = 100000):
+        persistent = None
+        if sqlite_path:
+            persistent = SQLiteCache(sqlite_path, table="answer_cache", ttl=ttl, max_entries=sqlite_max_entries)
+        self.cache = TieredCache(TTLCache(max_size=max_size, ttl=ttl), persistent)
+
+    @staticmethod
+    def make_key(query: str, fingerprint: str, kb_version: str) -> str:
+        raw = "\x00".join([normalize_query(query), fingerprint, kb_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回缓存的结果字典副本"""
+        value = self.cache.get(key)
+        return copy.deepcopy(value) if value is not None else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        self.cache.set(key, copy.deepcopy(result))
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
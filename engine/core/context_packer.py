@@ -0,0 +1,156 @@
+from typing import Any, Dict, List, Tuple
+from dataclasses import dataclass
+import json
+import re
+from .query_parser import normalize_query
+from ..utils.tokens import TokenCounter
+
+# 在中英文句末标点和换行之后切分，标点保留在句子末尾
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?；;\n])|(?<=\.\s)")
+
+@dataclass
+class PackedContext:
+    """打包后的子任务上下文及统计"""
+    text: str
+    original_tokens: int
+    packed_tokens: int
+    duplicate_sentences: int = 0
+    truncated_tasks: int = 0
+    # 去重后、截断前的输出总 token 数
+    content_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.packed_tokens)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "original_tokens": self.original_tokens,
+            "packed_tokens": self.packed_tokens,
+            "saved_tokens": self.saved_tokens,
+            "duplicate_sentences": self.duplicate_sentences,
+            "truncated_tasks": self.truncated_tasks,
+            "content_tokens": self.content_tokens
+        }
+
+class ContextPacker:
+    """将子任务输出打包进固定 token 预算
+
+    只保留任务类型和输出文本，去掉跨任务重复的句子；超出预算时按各任务的长度比例截断，
+    截断以句子为单位，单个句子超出配额时按字符比例截断。
+    """
+    def __init__(self, token_counter: TokenCounter, budget: int = 6000):
+        self.token_counter = token_counter
+        self.budget = budget
+
+    @staticmethod
+    def task_output(result: Any) -> str:
+        """提取子任务的输出文本"""
+        if not isinstance(result, dict):
+            return str(result)
+        output = result.get("result", result.get("output", ""))
+        if isinstance(output, dict):
+            output = output.get("output", json.dumps(output, ensure_ascii=False, default=str))
+        return str(output)
+
+    @staticmethod
+    def envelope(result: Any) -> str:
+        """子任务结果中输出文本以外的字段（状态、耗时等）序列化后的文本"""
+        if not isinstance(result, dict):
+            return ""
+        output_key = "result" if "result" in result else "output"
+        return json.dumps({key: value for key, value in result.items() if key != output_key},
+                          ensure_ascii=False, default=str)
+
+    def pack(self, task_results: List[Any]) -> PackedContext:
+        # 去掉跨任务重复的句子，保留第一次出现的位置
+        seen = set()
+        duplicates = 0
+        tasks: List[Tuple[str, List[Tuple[str, bool]]]] = []
+        for result in task_results:
+            sentences = []
+            for sentence in SENTENCE_BOUNDARY.split(self.task_output(result)):
+                # 比较时忽略空白，中文句子中的空格多为排版差异
+                key = re.sub(r"\s+", "", normalize_query(sentence))
+                if not key:
+                    continue
+                if key in seen:
+                    duplicates += 1
+                    sentences.append((sentence, False))
+                    continue
+                seen.add(key)
+                sentences.append((sentence, True))
+            label = result.get("task_type", "unknown") if isinstance(result, dict) else "unknown"
+            tasks.append((label, sentences))
+
+        # 所有句子（含重复句）和其余字段一次批量计数；原始大小由这些计数相加得到，
+        # 不再把整个 task_results 序列化后重新编码
+        sentence_texts = [s for _, sentences in tasks for s, _ in sentences]
+        counts = self.token_counter.count_many(sentence_texts + [self.envelope(result) for result in task_results])
+        original_tokens = sum(counts)
+        counts = iter(counts)
+        tasks = [
+            (label, [(s, tokens) for (s, keep), tokens in zip(sentences, counts) if keep])
+            for label, sentences in tasks
+        ]
+
+        total = sum(tokens for _, sentences in tasks for _, tokens in sentences)
+        truncated = 0
+        sections = []
+        for i, (label, sentences) in enumerate(tasks):
+            task_tokens = sum(tokens for _, tokens in sentences)
+            if total > self.budget and task_tokens:
+                # 超出预算时按比例分配每个任务的配额
+                quota = self.budget * task_tokens // total
+                kept = self._truncate(sentences, quota)
+                if "".join(kept) != "".join(sentence for sentence, _ in sentences):
+                    truncated += 1
+            else:
+                kept = [sentence for sentence, _ in sentences]
+            text = "".join(kept).strip()
+            if text:
+                sections.append(f"[{i + 1}] {label}\n{text}")
+
+        packed = "\n\n".join(sections)
+        return PackedContext(
+            text=packed,
+            original_tokens=original_tokens,
+            packed_tokens=self.token_counter.count(packed),
+            duplicate_sentences=duplicates,
+            truncated_tasks=truncated,
+            content_tokens=total
+        )
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """按句子把文本切成不超过 max_tokens 的块，超长的单个句子按字符比例切开"""
+        sentences = [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+        chunks = []
+        current, used = [], 0
+        for sentence, tokens in zip(sentences, self.token_counter.count_many(sentences)):
+            if current and used + tokens > max_tokens:
+                chunks.append("".join(current).strip())
+                current, used = [], 0
+            if tokens > max_tokens:
+                step = max(1, len(sentence) * max_tokens // tokens)
+                chunks.extend(sentence[i:i + step].strip() for i in range(0, len(sentence), step))
+                continue
+            current.append(sentence)
+            used += tokens
+        if current:
+            chunks.append("".join(current).strip())
+        return [chunk for chunk in chunks if chunk]
+
+    @staticmethod
+    def _truncate(sentences: List[Tuple[str, int]], quota: int) -> List[str]:
+        kept = []
+        used = 0
+        for sentence, tokens in sentences:
+            if used + tokens <= quota:
+                kept.append(sentence)
+                used += tokens
+                continue
+            if not kept and tokens:
+                # 第一个句子就超出配额时按字符比例截断
+                kept.append(sentence[:len(sentence) * quota // tokens])
+            break
+        return kept
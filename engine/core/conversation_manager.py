@@ -4,7 +4,7 @@ from pydantic import BaseModel
 import json
 import sqlite3
 from pathlib import Path
-import tiktoken  # 添加 tiktoken 导入
+from ..utils.resources import resources
 
 class Message(BaseModel):
     role: str
@@ -28,12 +28,8 @@ class ConversationManager:
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.create_tables()
         
-        # 初始化 tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model("gpt-4o")
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 进程内共享的 token 计数器
+        self.token_counter = resources.token_counter("gpt-4o")
         self.clear_all()  # 初始化时清理数据库
     
     def clear_all(self):
@@ -80,7 +76,7 @@ class ConversationManager:
 
     def count_tokens(self, text: str) -> int:
         """计算文本的 token 数量"""
-        return len(self.tokenizer.encode(text))
+        return self.token_counter.count(text)
 
     def add_message(self, session_id: str, message: Message):
         """添加新消息到对话历史"""
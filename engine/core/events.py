@@ -1,6 +1,6 @@
 from typing import Dict, Any
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 class EventType(Enum):
@@ -8,14 +8,17 @@ class EventType(Enum):
     QUERY_VALIDATED = "query_validated"
     TASKS_GENERATED = "tasks_generated"
     TASKS_EXECUTED = "tasks_executed"
+    RESPONSE_TOKEN = "response_token"
     RESPONSE_GENERATED = "response_generated"
     QUALITY_EVALUATED = "quality_evaluated"
     CONVERSATION_UPDATED = "conversation_updated"
+    WORKFLOW_COMPLETED = "workflow_completed"
     ERROR_OCCURRED = "error_occurred"
 
 @dataclass
 class WorkflowEvent:
     type: EventType
     data: Dict[str, Any]
-    timestamp: datetime = datetime.now()
+    # 使用 default_factory，保证每个事件记录自己的创建时间
+    timestamp: datetime = field(default_factory=datetime.now)
     metadata: Dict[str, Any] = None
\ No newline at end of file
@@ -1,8 +1,8 @@
 from typing import List, Dict, Optional
 from pydantic import BaseModel
-import aiohttp
 import json
 from ..web.apiconfig import config
+from ..utils.resources import resources
 
 class SearchResult(BaseModel):
     source: str
@@ -29,24 +29,25 @@ class FallbackSearchEngine:
         headers = {'Ocp-Apim-Subscription-Key': self.subscription_key}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.endpoint, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if "webPages" in result and "value" in result["webPages"]:
-                            filtered_results = []
-                            for item in result["webPages"]["value"]:
-                                relevance_score = self._calculate_relevance(query, item["snippet"])
-                                if relevance_score >= min_relevance_score:
-                                    filtered_results.append(SearchResult(
-                                        source="bing",
-                                        content=item["snippet"],
-                                        url=item["url"],
-                                        relevance_score=relevance_score
-                                    ))
-                            return filtered_results
-                    return []
-                    
+            # 复用共享的 HTTP 会话，避免每次搜索重新建立连接池
+            session = await resources.http_session()
+            async with session.get(self.endpoint, headers=headers, params=params) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    if "webPages" in result and "value" in result["webPages"]:
+                        filtered_results = []
+                        for item in result["webPages"]["value"]:
+                            relevance_score = self._calculate_relevance(query, item["snippet"])
+                            if relevance_score >= min_relevance_score:
+                                filtered_results.append(SearchResult(
+                                    source="bing",
+                                    content=item["snippet"],
+                                    url=item["url"],
+                                    relevance_score=relevance_score
+                                ))
+                        return filtered_results
+                return []
+                
         except Exception as e:
             print(f"Bing 搜索错误: {str(e)}")
             return []
@@ -0,0 +1,147 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+import math
+import re
+import threading
+from .query_parser import normalize_query
+
+# 简单查找类问题的提问方式
+LOOKUP_PATTERN = re.compile(
+    r"(什么是|是什么|是谁|谁是|在哪|哪里|哪个|哪一|何时|什么时候|多少|几个|几年|定义|含义|意思"
+    r"|^(what|who|when|where|which)\b|how (many|much|old)|definition of)"
+)
+# 需要分解的分析类问题
+COMPLEX_PATTERN = re.compile(
+    r"(比较|对比|区别|差异|分析|影响|趋势|预测|评估|原因|为什么|如何|怎样|优缺点|利弊|关系|前景|策略|建议"
+    r"|\b(compare|comparison|versus|vs|why|how|impact|trend|analy[sz]e|evaluate|pros and cons)\b)"
+)
+# 多个子问题的连接方式
+CLAUSE_PATTERN = re.compile(r"[，,；;？?]|以及|并且|同时|另外|分别|\band\b|\balso\b")
+# 命名实体：书名号、引号中的名称、英文专有名词和缩写
+ENTITY_PATTERN = re.compile(r"《[^》]+》|“[^”]+”|\"[^\"]+\"|\b[A-Z][a-zA-Z]+\b|\b[A-Z]{2,}\b")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?\s*(?:%|年|月|日|亿|万)?")
+
+@dataclass
+class RouteDecision:
+    """查询路由结果：simple 走单任务检索，complex 交给模型分解
+
+    probability 为简单查询的概率，confidence 为所选路由的概率。
+    """
+    route: str
+    confidence: float
+    probability: float
+    score: float
+    features: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def simple(self) -> bool:
+        return self.route == "simple"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class QueryClassifier:
+    """基于规则特征的本地查询分类器，只用 CPU，不调用模型
+
+    特征包括查询长度、提问方式、子句数量、命名实体和数字个数，以及模型对历史相同查询的分解结果。
+    各特征按权重线性组合后经 sigmoid 得到简单查询的概率，不低于 threshold 时走快速路径。
+    """
+    WEIGHTS = {
+        "bias": 0.0,
+        "length": -0.06,
+        "lookup": 1.5,
+        "complex": -1.8,
+        "clauses": -0.9,
+        "entities": -0.5,
+        "numbers": -0.3,
+        "history": 2.5
+    }
+
+    def __init__(self,
+                 threshold: float = 0.7,
+                 history_size: int = 4096,
+                 weights: Optional[Dict[str, float]] = None):
+        self.threshold = threshold
+        self.weights = dict(self.WEIGHTS, **(weights or {}))
+        self.history_size = history_size
+        # 规范化查询 -> (模型分解出的任务数之和, 观察次数)
+        self._history: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.routes = {"simple": 0, "complex": 0}
+        self._confidence_sum = 0.0
+
+    def features(self, query: str) -> Dict[str, Any]:
+        """提取分类特征"""
+        text = normalize_query(query)
+        features = {
+            "length": len(text),
+            "lookup": bool(LOOKUP_PATTERN.search(text)),
+            "complex": min(2, len(COMPLEX_PATTERN.findall(text))),
+            "clauses": len(CLAUSE_PATTERN.findall(text)),
+            "entities": len(ENTITY_PATTERN.findall(query)),
+            "numbers": len(NUMBER_PATTERN.findall(text)),
+            "history": None
+        }
+        with self._lock:
+            observed = self._history.get(text)
+        if observed:
+            features["history"] = observed[0] / observed[1]
+        return features
+
+    def score(self, features: Dict[str, Any]) -> float:
+        """特征的线性组合，越大越可能是简单查询"""
+        w = self.weights
+        score = (
+            w["bias"]
+            + w["length"] * max(0, features["length"] - 12)
+            + w["lookup"] * features["lookup"]
+            + w["complex"] * features["complex"]
+            + w["clauses"] * features["clauses"]
+            + w["entities"] * max(0, features["entities"] - 2)
+            + w["numbers"] * max(0, features["numbers"] - 2)
+        )
+        if features["history"] is not None:
+            # 模型以往只分解出一个任务时偏向简单，分解出多个任务时偏向复杂
+            score += w["history"] * (1.0 if features["history"] <= 1.5 else -1.0)
+        return score
+
+    def classify(self, query: str) -> RouteDecision:
+        """对查询分类并记录路由统计"""
+        features = self.features(query)
+        score = self.score(features)
+        probability = 1.0 / (1.0 + math.exp(-score))
+        route = "simple" if probability >= self.threshold else "complex"
+        confidence = probability if route == "simple" else 1.0 - probability
+        with self._lock:
+            self.routes[route] += 1
+            self._confidence_sum += confidence
+        return RouteDecision(
+            route=route,
+            confidence=round(confidence, 4),
+            probability=round(probability, 4),
+            score=round(score, 4),
+            features=features
+        )
+
+    def observe(self, query: str, task_count: int):
+        """记录模型对查询的分解结果，作为后续相同查询的历史特征"""
+        key = normalize_query(query)
+        with self._lock:
+            total, count = self._history.pop(key, (0, 0))
+            self._history[key] = (total + task_count, count + 1)
+            while len(self._history) > self.history_size:
+                self._history.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = sum(self.routes.values())
+            return {
+                "threshold": self.threshold,
+                "decisions": decisions,
+                "simple": self.routes["simple"],
+                "complex": self.routes["complex"],
+                "simple_rate": self.routes["simple"] / decisions if decisions else 0.0,
+                "avg_confidence": self._confidence_sum / decisions if decisions else 0.0,
+                "history_size": len(self._history)
+            }
@@ -1,9 +1,23 @@
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Optional, TYPE_CHECKING
 from pydantic import BaseModel
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import AzureChatOpenAI
-from langchain.docstore.document import Document
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
 from ..web.apiconfig import config
+from ..utils.resources import resources
+from ..utils.cache import TTLCache, SQLiteCache, TieredCache
+import hashlib
+import json
+import re
+import unicodedata
+
+if TYPE_CHECKING:
+    from .query_classifier import RouteDecision
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：统一全半角、大小写和空白，去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?？。.!！ ")
 
 class SubTask(BaseModel):
     task_type: str  # 任务类型：doc_qa, db_query, calculation, analysis
@@ -11,32 +25,188 @@ class SubTask(BaseModel):
     parameters: Dict  # 任务参数
     priority: int  # 任务优先级
 
-class QueryParser:
+class TaskStreamParser:
+    """增量解析 {"tasks": [...]} 格式的 JSON 文本
+
+    逐块输入模型输出，tasks 数组中的每个对象一闭合就解析并返回；
+    close 时对完整文本做严格的 JSON 校验。
+    """
     def __init__(self):
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=config.api.azure_openai["azure_endpoint"],
-            api_key=config.api.azure_openai["api_key"],
-            api_version=config.api.azure_openai["api_version"],
-            model=config.api.azure_openai["model"],
-            temperature=0
-        )
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        # tasks 数组所在的嵌套深度，以及当前任务对象的起始位置
+        self._tasks_depth: Optional[int] = None
+        self._tasks_closed = False
+        self._task_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """输入一段文本，返回其中新闭合的任务对象"""
+        self.buffer += text
+        completed = []
+        while self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = json.loads(self.buffer[self._string_start:self._pos + 1])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                if char == "[" and self._depth == 1 and self._last_string == "tasks" and self._tasks_depth is None:
+                    self._tasks_depth = self._depth + 1
+                elif char == "{" and not self._tasks_closed and self._depth == self._tasks_depth:
+                    self._task_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if char == "}" and self._task_start is not None and self._depth == self._tasks_depth:
+                    completed.append(json.loads(self.buffer[self._task_start:self._pos + 1]))
+                    self._task_start = None
+                elif char == "]" and self._tasks_depth is not None and self._depth == self._tasks_depth - 1:
+                    self._tasks_closed = True
+            self._pos += 1
+        return completed
+
+    def close(self) -> Dict[str, Any]:
+        """校验完整文本并返回解析结果"""
+        return json.loads(self.buffer)
+
+class QueryParser:
+    def __init__(self,
+                 fast_path_threshold: Optional[float] = 0.7,
+                 cache_enabled: bool = True,
+                 cache_ttl: Optional[float] = 86400.0,
+                 cache_max_size: int = 1024,
+                 cache_path: Optional[str] = None,
+                 cache_persistent_max_entries: Optional[int] = 100000):
+        self.llm = resources.chat_llm(temperature=0)
+        
+        # 简单查询由本地分类器直接路由为单个检索任务，不调用模型；threshold 为 None 时关闭
+        # query_classifier 依赖本模块的 normalize_query，在此导入以避免循环导入
+        from .query_classifier import QueryClassifier
+        self.classifier = QueryClassifier(threshold=fast_path_threshold) if fast_path_threshold is not None else None
         
         self.task_prompt = ChatPromptTemplate.from_messages([
             ("system", "你是一个专业的查询解析器。你需要将用户的查询分解为具体的子任务。"),
             ("user", "{query}"),
-            ("system", "请将查询分解为子任务，并以JSON格式返回，包含task_type、description、parameters和priority字段。")
+            ("system", "请将查询分解为子任务，并以JSON格式返回：{{\"tasks\": [{{\"task_type\": ..., \"description\": ..., "
+                       "\"parameters\": {{}}, \"priority\": 1}}]}}，按优先级从高到低排列。")
         ])
         
         self.answer_prompt = ChatPromptTemplate.from_messages([
             ("system", "你是一个专业的问答助手。请基于提供的上下文信息，生成准确、完整的回答。如果上下文中没有相关信息，请明确指出。"),
             ("user", "问题：{query}\n\n上下文信息：\n{context}")
         ])
+        
+        # temperature 为 0 时相同查询的分解结果相同，按规范化查询和提示词版本缓存
+        self.prompt_version = hashlib.sha256(
+            self.task_prompt.format(query="{query}").encode("utf-8")
+        ).hexdigest()[:12]
+        self.cache = None
+        if cache_enabled:
+            persistent = None
+            if cache_path:
+                persistent = SQLiteCache(cache_path, table="decomposition_cache", ttl=cache_ttl,
+                                         max_entries=cache_persistent_max_entries)
+            self.cache = TieredCache(TTLCache(max_size=cache_max_size, ttl=cache_ttl), persistent)
     
-    def parse_query(self, query: str) -> List[SubTask]:
-        """解析用户查询并分解为子任务"""
+    def _cache_key(self, query: str) -> str:
+        raw = "\x00".join([normalize_query(query), self.prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cached_tasks(self, query: str) -> Optional[List[SubTask]]:
+        """返回缓存的分解结果，未启用或未命中时返回 None"""
+        if self.cache is None:
+            return None
+        tasks = self.cache.get(self._cache_key(query))
+        return [SubTask(**task) for task in tasks] if tasks is not None else None
+
+    def _cache_tasks(self, query: str, tasks: List[SubTask]):
+        if self.cache is not None and tasks:
+            self.cache.set(self._cache_key(query), [task.dict() for task in tasks])
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """分解缓存的命中率统计，未启用时返回 None"""
+        if self.cache is None:
+            return None
+        return dict(self.cache.stats(), prompt_version=self.prompt_version)
+
+    def route(self, query: str) -> Optional["RouteDecision"]:
+        """判断查询是否走快速路径，未启用分类器时返回 None"""
+        return self.classifier.classify(query) if self.classifier is not None else None
+
+    def _fast_path_tasks(self, query: str, decision: "RouteDecision") -> List[SubTask]:
+        """简单查询直接作为单个检索任务"""
+        return [SubTask(
+            task_type="search",
+            description=query,
+            parameters={"route": "fast_path", "confidence": decision.confidence},
+            priority=1
+        )]
+
+    def _observe(self, query: str, task_count: int):
+        """把模型的分解结果记入分类器的历史统计"""
+        if self.classifier is not None:
+            self.classifier.observe(query, task_count)
+
+    def parse_query(self, query: str, decision: Optional["RouteDecision"] = None) -> List[SubTask]:
+        """解析用户查询并分解为子任务；decision 为调用方已得到的路由结果"""
+        decision = decision or self.route(query)
+        if decision is not None and decision.simple:
+            return self._fast_path_tasks(query, decision)
+        
+        cached = self._cached_tasks(query)
+        if cached is not None:
+            return cached
+        
         response = self.llm.invoke(self.task_prompt.format(query=query))
-        tasks_dict = eval(response.content)  # 将JSON字符串转换为Python对象
-        return [SubTask(**task) for task in tasks_dict["tasks"]]
+        tasks_dict = json.loads(response.content)
+        tasks = [SubTask(**task) for task in tasks_dict["tasks"]]
+        self._observe(query, len(tasks))
+        self._cache_tasks(query, tasks)
+        return tasks
+
+    async def astream_tasks(self, query: str, decision: Optional["RouteDecision"] = None) -> AsyncIterator[SubTask]:
+        """流式解析用户查询，每个子任务在模型输出中闭合后立即产出"""
+        decision = decision or self.route(query)
+        if decision is not None and decision.simple:
+            for task in self._fast_path_tasks(query, decision):
+                yield task
+            return
+        
+        cached = self._cached_tasks(query)
+        if cached is not None:
+            for task in cached:
+                yield task
+            return
+        
+        parser = TaskStreamParser()
+        llm = self.llm.bind(response_format={"type": "json_object"})
+        tasks = []
+        async for chunk in llm.astream(self.task_prompt.format(query=query)):
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            for task in parser.feed(content):
+                tasks.append(SubTask(**task))
+                yield tasks[-1]
+        # 输出不完整或不是合法 JSON 时抛出异常，不写入缓存
+        parser.close()
+        self._observe(query, len(tasks))
+        self._cache_tasks(query, tasks)
+
+    async def aparse_query(self, query: str, decision: Optional["RouteDecision"] = None) -> List[SubTask]:
+        """异步解析用户查询，返回全部子任务"""
+        return [task async for task in self.astream_tasks(query, decision)]
     
     def generate_answer(self, query: str, context: List[Document]) -> str:
         """根据上下文生成答案"""
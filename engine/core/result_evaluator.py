@@ -1,13 +1,12 @@
 from typing import Dict, List, Optional
 from pydantic import BaseModel
-from openai import AzureOpenAI  # 修改导入
-from langchain.prompts import ChatPromptTemplate
 from .fallback_search import FallbackSearchEngine
-from langchain.docstore.document import Document
+from langchain_core.documents import Document
 from ..web.apiconfig import config
 import json
 import os
-import tiktoken
+from ..utils.resources import resources
+from ..utils.tokens import usage_from_dict
 
 class EvaluationResult(BaseModel):
     score: float
@@ -22,30 +21,20 @@ class EvaluationResult(BaseModel):
 
 class ResultEvaluator:
     def __init__(self):
-        self.client = AzureOpenAI(
-            api_key=config.api.azure_openai["api_key"],
-            api_version=config.api.azure_openai["api_version"],
-            azure_endpoint=config.api.azure_openai["azure_endpoint"]
-        )
+        self.client = resources.openai_client()
         
         self.model = config.api.azure_openai["model"]
         self.fallback_search = FallbackSearchEngine()
-        
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(self.model)
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.token_counter = resources.token_counter(self.model)
     
     def count_tokens(self, text: str) -> int:
-        return len(self.tokenizer.encode(text))
+        return self.token_counter.count(text)
     
     def _truncate_context(self, context_texts: List[str], max_tokens: int = 4000) -> List[str]:
         truncated = []
         current_tokens = 0
         
-        for text in context_texts:
-            tokens = self.count_tokens(text)
+        for text, tokens in zip(context_texts, self.token_counter.count_many(context_texts)):
             if current_tokens + tokens <= max_tokens:
                 truncated.append(text)
                 current_tokens += tokens
@@ -55,8 +44,6 @@ class ResultEvaluator:
         return truncated
     
     def _call_llm(self, system_prompt: str, user_prompt: str) -> Dict:
-        prompt_tokens = self.count_tokens(system_prompt + user_prompt)
-        
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[
@@ -68,15 +55,21 @@ class ResultEvaluator:
         )
         
         content = response.choices[0].message.content
-        completion_tokens = self.count_tokens(content)
         
-        return {
-            "content": content,
-            "token_usage": {
+        # 优先使用服务端返回的 usage，没有时在本地计算
+        token_usage = usage_from_dict(getattr(response, "usage", None))
+        if token_usage is None:
+            prompt_tokens = self.count_tokens(system_prompt + user_prompt)
+            completion_tokens = self.count_tokens(content)
+            token_usage = {
                 "prompt_tokens": prompt_tokens,
                 "completion_tokens": completion_tokens,
                 "total_tokens": prompt_tokens + completion_tokens
             }
+        
+        return {
+            "content": content,
+            "token_usage": token_usage
         }
 
     def evaluate(self, 
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import threading
+import time
+import numpy as np
+from ..utils.resources import resources
+
+class SemanticAnswerCache:
+    """语义答案缓存
+
+    使用与 DocumentStore 相同的 Embedding 模型向量化查询，在固定容量的向量矩阵上
+    做一次矩阵乘法完成余弦相似度检索；容量满时优先复用过期槽位，否则按 LRU 淘汰。
+    命名空间（配置指纹和知识库版本）在没有未过期记录后移除，映射表大小不超过 max_entries。
+    """
+    def __init__(self,
+                 embeddings: Any = None,
+                 threshold: float = 0.92,
+                 max_entries: int = 1024,
+                 ttl: Optional[float] = 3600.0):
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 向量矩阵在第一次写入时按向量维度分配
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._namespaces = np.full(max_entries, -1, dtype=np.int64)
+        self._expires_at = np.full(max_entries, np.inf)
+        self._last_used = np.zeros(max_entries)
+        self._results: List[Optional[Dict]] = [None] * max_entries
+        self._namespace_ids: Dict[str, int] = {}
+        self._next_namespace_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = resources.embeddings()
+        return self._embeddings
+
+    async def embed(self, query: str) -> np.ndarray:
+        """向量化查询并归一化"""
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _namespace_id(self, namespace: str) -> int:
+        if namespace not in self._namespace_ids:
+            self._namespace_ids[namespace] = self._next_namespace_id
+            self._next_namespace_id += 1
+        return self._namespace_ids[namespace]
+
+    def _release_namespace(self, namespace_id: int, now: float):
+        """命名空间已没有未过期的记录时清除其剩余记录并移除映射"""
+        if namespace_id < 0:
+            return
+        rows = self._valid & (self._namespaces == namespace_id)
+        if (rows & (self._expires_at > now)).any():
+            return
+        for index in np.flatnonzero(rows):
+            self._results[index] = None
+        self._valid[rows] = False
+        self._namespaces[rows] = -1
+        for namespace, value in list(self._namespace_ids.items()):
+            if value == namespace_id:
+                del self._namespace_ids[namespace]
+
+    def lookup(self,
+               vector: np.ndarray,
+               namespace: str,
+               min_similarity: Optional[float] = None) -> Optional[Tuple[float, Dict]]:
+        """返回同一命名空间内相似度不低于阈值的最相似结果及其相似度"""
+        min_similarity = self.threshold if min_similarity is None else min_similarity
+        with self._lock:
+            if self._vectors is None or namespace not in self._namespace_ids:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            mask = self._valid & (self._namespaces == self._namespace_ids[namespace]) & (self._expires_at > now)
+            if not mask.any():
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ vector
+            similarities[~mask] = -np.inf
+            index = int(np.argmax(similarities))
+            if similarities[index] < min_similarity:
+                self.misses += 1
+                return None
+            self._last_used[index] = now
+            self.hits += 1
+            return float(similarities[index]), copy.deepcopy(self._results[index])
+
+    def add(self, vector: np.ndarray, namespace: str, result: Dict):
+        """写入一条缓存记录"""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            now = time.time()
+            free = np.flatnonzero(~self._valid | (self._expires_at <= now))
+            if free.size:
+                index = int(free[0])
+            else:
+                index = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            previous = int(self._namespaces[index])
+            self._vectors[index] = vector
+            self._valid[index] = True
+            self._namespaces[index] = self._namespace_id(namespace)
+            self._expires_at[index] = now + self.ttl if self.ttl is not None else np.inf
+            self._last_used[index] = now
+            self._results[index] = copy.deepcopy(result)
+            if previous != self._namespaces[index]:
+                self._release_namespace(previous, now)
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+            self._namespaces[:] = -1
+            self._results = [None] * self.max_entries
+            self._namespace_ids.clear()
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "namespaces": len(self._namespace_ids)
+        }
@@ -1,38 +1,137 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+import asyncio
 import json
+import time
 from .query_parser import SubTask, QueryParser  # 添加 QueryParser 导入
-from ..indexer.document_store import DocumentStore
-from langchain.agents import Tool, AgentExecutor, create_react_agent
-from langchain_openai import AzureChatOpenAI
-from langchain.prompts import PromptTemplate, ChatPromptTemplate
+from .context_packer import ContextPacker, PackedContext
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
 from pydantic import BaseModel
 from ..web.apiconfig import config
-import tiktoken  # 添加 tiktoken 导入
+from ..indexer.document_store import DocumentStore, DEFAULT_INDEX_DIR, read_knowledge_base_version
+from ..utils.resources import resources
+from ..utils.tokens import usage_from_response, usage_from_dict, add_usage
 
-class ToolOrchestrator:
+# ReAct 代理的提示模板
+REACT_PROMPT = """Answer the following questions as best you can...
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought: {agent_scratchpad}"""
+
+class UsageCallback(BaseCallbackHandler):
+    """汇总代理执行期间各次模型调用中服务端返回的 token 使用量"""
     def __init__(self):
+        self.usage: Optional[Dict[str, int]] = None
+
+    def on_llm_end(self, response, **kwargs):
+        usage = usage_from_dict((response.llm_output or {}).get("token_usage"))
+        if usage is None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = add_usage(usage, usage_from_response(getattr(generation, "message", None)))
+        self.usage = add_usage(self.usage, usage)
+
+# 只需检索一个工具即可完成的任务类型，默认跳过 ReAct 代理直接检索后生成
+DIRECT_TASK_TYPES = {"search"}
+
+class ToolOrchestrator:
+    def __init__(self,
+                 max_concurrency: int = 5,
+                 task_timeout: Optional[float] = None,
+                 direct_search: bool = True,
+                 search_k: int = 3,
+                 context_token_budget: int = 6000,
+                 map_reduce_threshold: Optional[int] = 12000,
+                 map_chunk_tokens: int = 2000,
+                 map_summary_tokens: int = 300,
+                 query_parser: Optional[QueryParser] = None):
+        # 并发调度配置
+        self.max_concurrency = max_concurrency
+        self.task_timeout = task_timeout
+        # search 任务直接检索后生成；为 False 时所有任务都经过 ReAct 代理
+        self.direct_search = direct_search
+        self.search_k = search_k
+        # 子任务输出超过 map_reduce_threshold 个 token 时先分块并发压缩，再合成回答；为 None 时关闭
+        self.map_reduce_threshold = map_reduce_threshold
+        self.map_chunk_tokens = map_chunk_tokens
+        self.map_summary_tokens = map_summary_tokens
+        
         # 初始化基本组件
         self.response_prompt = ChatPromptTemplate.from_messages([
             {"role": "system", "content": "基于提供的上下文信息生成回答。"},
             {"role": "user", "content": "问题：{query}\n\n子任务结果：{results}"}
         ])
-        self.doc_store = DocumentStore()
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=config.api.azure_openai["azure_endpoint"],
-            api_key=config.api.azure_openai["api_key"],
-            api_version=config.api.azure_openai["api_version"],
-            model=config.api.azure_openai["model"]
-        )
+        self.search_prompt = ChatPromptTemplate.from_messages([
+            ("system", "你是一个专业的分析助手。请基于检索到的文档内容完成任务，文档中没有的信息请明确指出。"),
+            ("user", "任务：{task}\n\n文档内容：\n{context}")
+        ])
+        self.map_prompt = ChatPromptTemplate.from_messages([
+            ("system", "你是一个信息压缩助手。请从给定内容中提取与问题相关的事实、数据和结论，去掉无关内容，不要编造。"),
+            ("user", "问题：{query}\n\n子任务：{task_type}\n\n内容：\n{content}")
+        ])
+        # 向量库在首次检索时才从共享资源中获取
+        self._doc_store: Optional[DocumentStore] = None
+        self.llm = resources.chat_llm()
+        self.token_counter = resources.token_counter(config.api.azure_openai["model"])
+        # 响应生成前把子任务结果打包进 token 预算；每次生成只打包一次，结果随调用传递
+        self.context_packer = ContextPacker(self.token_counter, budget=context_token_budget)
         
-        # 初始化 tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(config.api.azure_openai["model"])
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 查询解析器由协调器传入共用，未传入时首次使用才创建
+        self._query_parser = query_parser
         
-        # 初始化工具和代理
-        self.query_parser = QueryParser()
+        # 代理执行器依赖 langchain.agents，首次执行任务时才构建
+        self._agent_executor = None
+
+    @property
+    def doc_store(self) -> DocumentStore:
+        """共享的文档向量库"""
+        if self._doc_store is None:
+            self._doc_store = resources.document_store()
+        return self._doc_store
+
+    @doc_store.setter
+    def doc_store(self, value: DocumentStore):
+        self._doc_store = value
+
+    @property
+    def query_parser(self) -> QueryParser:
+        if self._query_parser is None:
+            self._query_parser = QueryParser()
+        return self._query_parser
+
+    @query_parser.setter
+    def query_parser(self, value: QueryParser):
+        self._query_parser = value
+
+    @property
+    def agent_executor(self):
+        """ReAct 代理执行器"""
+        if self._agent_executor is None:
+            self._agent_executor = self._build_agent_executor()
+        return self._agent_executor
+
+    @agent_executor.setter
+    def agent_executor(self, value):
+        self._agent_executor = value
+
+    def _build_agent_executor(self):
+        """构建文档检索工具和 ReAct 代理执行器"""
+        from langchain.agents import Tool, AgentExecutor, create_react_agent
         
         # 创建同步版本的文档搜索函数
         async def sync_document_search(query: str):
@@ -52,33 +151,12 @@ class ToolOrchestrator:
             )
         ]
         
-        # 创建 React 代理
-        react_prompt = PromptTemplate.from_template("""Answer the following questions as best you can...
-
-{tools}
-
-Use the following format:
-
-Question: the input question you must answer
-Thought: you should always think about what to do
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action
-... (this Thought/Action/Action Input/Observation can repeat N times)
-Thought: I now know the final answer
-Final Answer: the final answer to the original input question
-
-Begin!
-
-Question: {input}
-Thought: {agent_scratchpad}""")
-        
         # 初始化代理执行器
-        self.agent_executor = AgentExecutor(
+        return AgentExecutor(
             agent=create_react_agent(
                 llm=self.llm,
                 tools=self.tools,
-                prompt=react_prompt
+                prompt=PromptTemplate.from_template(REACT_PROMPT)
             ),
             tools=self.tools,
             verbose=True,
@@ -86,6 +164,12 @@ Thought: {agent_scratchpad}""")
             max_iterations=3
         )
 
+    def knowledge_base_version(self) -> str:
+        """知识库版本标识，向量库尚未打开时直接读取版本文件"""
+        if self._doc_store is not None:
+            return self._doc_store.version
+        return read_knowledge_base_version(DEFAULT_INDEX_DIR)
+
     def get_model_for_task(self, task_type: str) -> str:
         """获取任务类型对应的模型名称"""
         model_mapping = {
@@ -95,136 +179,299 @@ Thought: {agent_scratchpad}""")
         }
         return model_mapping.get(task_type, model_mapping["default"])
 
-    # 删除以下重复的代码块:
-    # - 重复的 query_parser 初始化
-    # - 重复的 tools 定义
-    # - 重复的 react_prompt 定义
-    # - 重复的 agent_executor 初始化
+    def count_tokens(self, text: str) -> int:
+        """计算文本的 token 数量"""
+        return self.token_counter.count(text)
+
+    def _token_usage(self, reported: Optional[Dict[str, int]], input_text: str, output: str) -> Dict[str, int]:
+        """优先使用服务端返回的 token 使用量，没有时在本地计算"""
+        if reported:
+            return reported
+        input_tokens = self.count_tokens(input_text)
+        output_tokens = self.count_tokens(output)
+        return {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+
+    async def execute_tasks(self,
+                            tasks: List[SubTask],
+                            max_concurrency: Optional[int] = None,
+                            task_timeout: Optional[float] = None,
+                            use_agent: bool = True) -> List[Dict[str, Any]]:
+        """并发执行任务列表，按优先级调度，并按优先级顺序返回结果
+
+        search 任务默认检索后直接生成，其他任务（或 parameters 中 use_agent 为 True 的任务）
+        经过 ReAct 代理。use_agent 为 False 时不调用模型，直接以文档检索结果作为任务结果。
+        不经过代理的任务在执行前通过一次批量检索取回文档。
+        """
+        # sorted 是稳定排序，同优先级的任务保持原有顺序
+        ordered_tasks = sorted(tasks, key=lambda x: x.priority)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        timeout = task_timeout if task_timeout is not None else self.task_timeout
+        prefetched = await self._prefetch_documents(ordered_tasks, use_agent, timeout)
         
-        # 初始化 query_parser
-        self.query_parser = QueryParser()
+        async def run(task: SubTask) -> Dict[str, Any]:
+            # Semaphore 的等待队列先进先出，优先级高的任务先获得执行槽位
+            async with semaphore:
+                return await self._execute_single_task(task, timeout, use_agent, prefetched.get(id(task)))
         
-        self.tools = [
-            Tool(
-                name="document_search",
-                func=self.doc_store.search,
-                description="搜索文档知识库"
-            ),
-            # 可以添加更多工具，如数据库查询、计算工具等
-        ]
+        return list(await asyncio.gather(*(run(task) for task in ordered_tasks)))
+
+    async def execute_task_stream(self,
+                                  tasks: AsyncIterator[SubTask],
+                                  max_concurrency: Optional[int] = None,
+                                  task_timeout: Optional[float] = None,
+                                  use_agent: bool = True) -> List[Dict[str, Any]]:
+        """边接收边执行流式产出的任务，结果按优先级顺序返回
+
+        每个任务到达即开始执行，不等待其余任务；任务逐个到达，因此不做批量检索。
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        timeout = task_timeout if task_timeout is not None else self.task_timeout
         
-        # 添加 React 代理的提示模板
-        react_prompt = PromptTemplate.from_template("""Answer the following questions as best you can. You have access to the following tools:
+        async def run(task: SubTask) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._execute_single_task(task, timeout, use_agent)
+        
+        received: List[SubTask] = []
+        running: List[asyncio.Task] = []
+        try:
+            async for task in tasks:
+                received.append(task)
+                running.append(asyncio.ensure_future(run(task)))
+            results = await asyncio.gather(*running)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+        
+        # 按优先级稳定排序，同优先级保持到达顺序
+        order = sorted(range(len(received)), key=lambda i: received[i].priority)
+        return [results[i] for i in order]
 
-{tools}
+    async def _prefetch_documents(self,
+                                  tasks: List[SubTask],
+                                  use_agent: bool,
+                                  timeout: Optional[float]) -> Dict[int, List[Any]]:
+        """批量检索所有需要文档的任务，重叠的文档块只分给最相关的任务；失败时各任务退回单独检索"""
+        pending = [task for task in tasks if self._task_mode(task, use_agent) != "agent"]
+        if len(pending) < 2:
+            return {}
+        try:
+            results = await asyncio.wait_for(
+                self.doc_store.search_many([task.description for task in pending], k=self.search_k),
+                timeout=timeout
+            )
+        except Exception as e:
+            print(f"批量检索失败: {e}")
+            return {}
+        return {id(task): docs for task, docs in zip(pending, results)}
 
-Use the following format:
+    async def _execute_single_task(self,
+                                   task: SubTask,
+                                   timeout: Optional[float],
+                                   use_agent: bool = True,
+                                   docs: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """执行单个任务，记录耗时并处理超时；docs 为预先批量检索到的文档"""
+        start_time = time.perf_counter()
+        mode = self._task_mode(task, use_agent)
+        try:
+            if mode == "agent":
+                runner = self._run_agent(task)
+            elif mode == "direct":
+                runner = self._run_search(task, docs)
+            else:
+                runner = self._run_retrieval(task, docs)
+            output, token_usage = await asyncio.wait_for(runner, timeout=timeout)
+            
+            return {
+                "task_type": task.task_type,
+                "priority": task.priority,
+                "result": output,
+                "token_usage": token_usage,
+                "mode": mode,
+                "wall_time": time.perf_counter() - start_time
+            }
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                error = f"任务超时（{timeout}s）"
+            else:
+                error = str(e)
+            print(f"任务执行错误: {error}")
+            return {
+                "task_type": task.task_type,
+                "priority": task.priority,
+                "result": f"执行失败: {error}",
+                "error": error,
+                "token_usage": {
+                    "completion_tokens": 0,
+                    "total_tokens": 0
+                },
+                "wall_time": time.perf_counter() - start_time
+            }
 
-Question: the input question you must answer
-Thought: you should always think about what to do
-Action: the action to take, should be one of [{tool_names}]
-Action Input: the input to the action
-Observation: the result of the action
-... (this Thought/Action/Action Input/Observation can repeat N times)
-Thought: I now know the final answer
-Final Answer: the final answer to the original input question
+    def _task_mode(self, task: SubTask, use_agent: bool = True) -> str:
+        """确定任务的执行方式：agent、direct（检索后生成）或 retrieval（仅检索）"""
+        if not use_agent:
+            return "retrieval"
+        if task.parameters.get("use_agent"):
+            return "agent"
+        if self.direct_search and task.task_type in DIRECT_TASK_TYPES:
+            return "direct"
+        return "agent"
 
-Begin!
+    async def _run_agent(self, task: SubTask) -> Tuple[str, Dict[str, int]]:
+        """使用 Agent 执行任务"""
+        callback = UsageCallback()
+        result = await self.agent_executor.ainvoke(
+            {"input": task.description},
+            config={"callbacks": [callback]}
+        )
+        print("Agent 响应:", json.dumps(result, ensure_ascii=False, indent=2, default=str))
+        
+        # 处理响应
+        output = result.get("output", "") if isinstance(result, dict) else str(result)
+        return output, self._token_usage(callback.usage, task.description, output)
 
-Question: {input}
-Thought: {agent_scratchpad}""")
+    async def _run_search(self, task: SubTask, docs: Optional[List[Any]] = None) -> Tuple[str, Dict[str, int]]:
+        """检索后直接生成：一次文档检索加一次模型调用"""
+        if docs is None:
+            docs = await self.doc_store.search(task.description, k=self.search_k)
+        context = "\n\n".join(doc.page_content for doc in docs)
+        messages = self.search_prompt.format_messages(task=task.description, context=context)
+        response = await self.llm.ainvoke(messages)
+        output = response.content if hasattr(response, 'content') else str(response)
+        return output, self._token_usage(usage_from_response(response), task.description + context, output)
+
+    async def _run_retrieval(self, task: SubTask, docs: Optional[List[Any]] = None) -> Tuple[str, Dict[str, int]]:
+        """直接检索文档作为任务结果，不调用 LLM"""
+        if docs is None:
+            docs = await self.doc_store.search(task.description, k=self.search_k)
+        output = "\n\n".join(doc.page_content for doc in docs)
+        return output, {"completion_tokens": 0, "total_tokens": 0}
+
+    def pack_context(self, task_results: List[Dict]) -> PackedContext:
+        """将子任务结果打包进上下文 token 预算"""
+        return self.context_packer.pack(task_results)
+
+    def _format_response_messages(self, query: str, packed: PackedContext) -> List:
+        """构建响应生成所需的消息列表"""
+        return self.response_prompt.format_messages(query=query, results=packed.text)
+
+    def response_token_usage(self,
+                             query: str,
+                             task_results: List[Dict],
+                             response_content: str,
+                             reported: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """响应生成的 token 使用量，服务端未返回时在本地计算"""
+        return self._token_usage(reported, query + self.pack_context(task_results).text, response_content)
+
+    def _response_llm(self, max_tokens: Optional[int] = None):
+        """返回响应生成使用的模型，必要时限制输出长度"""
+        return self.llm.bind(max_tokens=max_tokens) if max_tokens else self.llm
+
+    async def _map_summaries(self, query: str, task_results: List[Dict]) -> Tuple[List[Dict], Optional[Dict[str, int]]]:
+        """map 阶段：把每个子任务的输出按 token 预算切块，并发压缩为要点"""
+        chunks = [
+            (result.get("task_type", "unknown"), chunk)
+            for result in task_results
+            for chunk in self.context_packer.split(ContextPacker.task_output(result), self.map_chunk_tokens)
+        ]
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        llm = self._response_llm(self.map_summary_tokens)
         
-        # 修改 React 代理的创建方式
-        self.agent_executor = AgentExecutor(
-            agent=create_react_agent(
-                llm=self.llm,
-                tools=self.tools,
-                prompt=react_prompt
-            ),
-            tools=self.tools,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=3
-        )
+        async def summarize(task_type: str, chunk: str) -> Tuple[str, Optional[Dict[str, int]]]:
+            async with semaphore:
+                messages = self.map_prompt.format_messages(query=query, task_type=task_type, content=chunk)
+                try:
+                    response = await llm.ainvoke(messages)
+                except Exception as e:
+                    # 压缩失败时保留原文，由上下文打包截断
+                    print(f"子任务结果压缩失败: {e}")
+                    return chunk, None
+                output = response.content if hasattr(response, 'content') else str(response)
+                return output, self._token_usage(usage_from_response(response), query + chunk, output)
+        
+        outputs = await asyncio.gather(*(summarize(task_type, chunk) for task_type, chunk in chunks))
+        usage = None
+        for _, chunk_usage in outputs:
+            usage = add_usage(usage, chunk_usage)
+        summaries = [{"task_type": task_type, "result": output} for (task_type, _), (output, _) in zip(chunks, outputs)]
+        return summaries, usage
 
-    def count_tokens(self, text: str) -> int:
-        """计算文本的 token 数量"""
-        return len(self.tokenizer.encode(text))
+    async def _synthesis_messages(self,
+                                  query: str,
+                                  task_results: List[Dict]) -> Tuple[List, Optional[Dict[str, int]], Dict, PackedContext]:
+        """构建最终生成的消息；子任务输出超过阈值时先经过 map 阶段压缩
 
-    async def execute_tasks(self, tasks: List[SubTask]) -> List[Dict[str, Any]]:
-        """执行任务列表并返回结果"""
-        results = []
-        for task in sorted(tasks, key=lambda x: x.priority):
-            try:
-                # 使用 Agent 执行任务
-                result = await self.agent_executor.ainvoke({
-                    "input": task.description
-                })
-                print("Agent 响应:", json.dumps(result, ensure_ascii=False, indent=2))
-                
-                # 处理响应
-                if isinstance(result, dict):
-                    output = result.get("output", "")
-                    # 使用 tiktoken 计算 token 使用量
-                    input_tokens = self.count_tokens(task.description)
-                    output_tokens = self.count_tokens(output)
-                    
-                    token_usage = {
-                        "completion_tokens": output_tokens,
-                        "total_tokens": input_tokens + output_tokens
-                    }
-                else:
-                    output = str(result)
-                    input_tokens = self.count_tokens(task.description)
-                    output_tokens = self.count_tokens(output)
-                    token_usage = {
-                        "completion_tokens": output_tokens,
-                        "total_tokens": input_tokens + output_tokens
-                    }
-                
-                results.append({
-                    "task_type": task.task_type,
-                    "result": output,
-                    "token_usage": token_usage
-                })
-            except Exception as e:
-                print(f"任务执行错误: {str(e)}")
-                results.append({
-                    "task_type": task.task_type,
-                    "result": f"执行失败: {str(e)}",
-                    "token_usage": {
-                        "completion_tokens": 0,
-                        "total_tokens": 0
-                    }
-                })
-        return results
+        返回消息列表、map 阶段的 token 使用量、合成方式和子任务结果的打包结果。
+        """
+        packed = self.pack_context(task_results)
+        if self.map_reduce_threshold is None or packed.content_tokens < self.map_reduce_threshold:
+            return self._format_response_messages(query, packed), None, {"mode": "single"}, packed
+        summaries, usage = await self._map_summaries(query, task_results)
+        messages = self._format_response_messages(query, self.pack_context(summaries))
+        return messages, usage, {"mode": "map_reduce", "map_calls": len(summaries)}, packed
+
+    @staticmethod
+    def _messages_text(messages: List) -> str:
+        return "".join(getattr(message, "content", str(message)) for message in messages)
 
-    async def generate_response(self, query: str, task_results: List[Dict]) -> Dict:
+    async def astream_response(self,
+                               query: str,
+                               task_results: List[Dict],
+                               max_tokens: Optional[int] = None,
+                               usage: Optional[Dict[str, int]] = None,
+                               details: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """流式生成响应，逐块产出模型输出的文本
+
+        传入 usage 字典时，流结束后写入 token 使用量（包括 map 阶段的调用），
+        服务端未返回时按实际发送的消息在本地计算；
+        传入 details 字典时，生成开始前写入上下文打包统计和合成方式。
+        """
+        messages, map_usage, synthesis, packed = await self._synthesis_messages(query, task_results)
+        if details is not None:
+            details["context_packing"] = packed.stats()
+            details["synthesis"] = synthesis
+        reported = None
+        contents = []
+        async for chunk in self._response_llm(max_tokens).astream(messages):
+            reported = add_usage(reported, usage_from_response(chunk))
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if content:
+                contents.append(content)
+                yield content
+        
+        if usage is not None:
+            usage.update(add_usage(map_usage, self._token_usage(
+                reported, self._messages_text(messages), "".join(contents)
+            )))
+
+    async def generate_response(self,
+                                query: str,
+                                task_results: List[Dict],
+                                max_tokens: Optional[int] = None) -> Dict:
         max_iterations = 3
         current_iteration = 0
         
         while current_iteration < max_iterations:
             try:
-                # 使用 ChatPromptTemplate 格式化消息
-                messages = self.response_prompt.format_messages(
-                    query=query,
-                    results=json.dumps(task_results, ensure_ascii=False)
-                )
+                # 使用 ChatPromptTemplate 格式化消息，子任务输出过大时先并发压缩
+                messages, map_usage, synthesis, packed = await self._synthesis_messages(query, task_results)
                 
-                response = await self.llm.ainvoke(messages)
+                response = await self._response_llm(max_tokens).ainvoke(messages)
                 response_content = response.content if hasattr(response, 'content') else str(response)
-                
-                # 计算 token 使用量
-                input_text = query + json.dumps(task_results, ensure_ascii=False)
-                input_tokens = self.count_tokens(input_text)
-                output_tokens = self.count_tokens(response_content)
+                token_usage = self._token_usage(
+                    usage_from_response(response), self._messages_text(messages), response_content
+                )
                 
                 return {
                     "response": response_content,
-                    "token_usage": {
-                        "completion_tokens": output_tokens,
-                        "total_tokens": input_tokens + output_tokens
-                    }
+                    "token_usage": add_usage(map_usage, token_usage),
+                    "context_packing": packed.stats(),
+                    "synthesis": synthesis
                 }
                 
             except Exception as e:
@@ -1,12 +1,21 @@
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, AsyncIterator, Tuple, TYPE_CHECKING
 from pydantic import BaseModel, Field
 from datetime import datetime
+from contextlib import asynccontextmanager
+from .admission import AdmissionController, AdmissionRejected
 from .events import EventType, WorkflowEvent
-from .query_parser import QueryParser, SubTask
+from .answer_cache import AnswerCache, config_fingerprint
+from .query_parser import QueryParser, SubTask, normalize_query
 from .tool_orchestrator import ToolOrchestrator
 from .result_evaluator import ResultEvaluator
 from .conversation_manager import ConversationManager, Message
 from ..utils.cost_tracker import CostTracker, TokenUsage
+from ..utils.metrics import WorkflowMetrics, workflow_metrics, total_tokens
+import asyncio
+import time
+
+if TYPE_CHECKING:
+    from .semantic_cache import SemanticAnswerCache
 
 class WorkflowConfig(BaseModel):
     """工作流配置"""
@@ -32,6 +41,92 @@ class WorkflowConfig(BaseModel):
         ],
         description="基础任务列表"
     )
+    llm_task_parsing: bool = Field(default=False, description="调用模型分解子任务，关闭时使用基础任务列表")
+    pipelined_task_parsing: bool = Field(
+        default=True,
+        description="模型分解子任务时流式解析，每个子任务解析完成即开始执行"
+    )
+    parse_time_fraction: float = Field(
+        default=0.5,
+        description="有截止时间时模型解析子任务最多占用的剩余时间比例，超时回退到基础任务"
+    )
+    fast_path_threshold: Optional[float] = Field(
+        default=0.7,
+        description="本地分类器判定为简单查询的概率阈值，达到时跳过模型分解直接检索，为 None 时关闭"
+    )
+    decomposition_cache_enabled: bool = Field(default=True, description="是否缓存模型的子任务分解结果")
+    decomposition_cache_ttl: Optional[float] = Field(default=86400.0, description="子任务分解缓存过期时间（秒）")
+    decomposition_cache_max_size: int = Field(default=1024, description="内存子任务分解缓存的最大条目数")
+    decomposition_cache_path: Optional[str] = Field(default=None, description="子任务分解缓存 SQLite 持久层路径")
+    decomposition_cache_persistent_max_entries: Optional[int] = Field(
+        default=100000,
+        description="子任务分解缓存 SQLite 持久层的最大条目数，None 表示不限制"
+    )
+    max_concurrent_tasks: int = Field(default=5, description="子任务最大并发数")
+    task_timeout: Optional[float] = Field(default=120.0, description="单个子任务超时时间（秒）")
+    direct_search: bool = Field(default=True, description="search 子任务直接检索后生成，不经过 ReAct 代理")
+    response_context_tokens: int = Field(default=6000, description="响应生成时子任务结果上下文的 token 预算")
+    map_reduce_threshold: Optional[int] = Field(
+        default=12000,
+        description="子任务输出超过该 token 数时先分块并发压缩再合成回答，为 None 时关闭"
+    )
+    map_chunk_tokens: int = Field(default=2000, description="map 阶段每块输入的 token 上限")
+    map_summary_tokens: int = Field(default=300, description="map 阶段每块压缩结果的 token 上限")
+    answer_cache_enabled: bool = Field(default=True, description="是否启用答案缓存")
+    answer_cache_ttl: Optional[float] = Field(default=3600.0, description="答案缓存过期时间（秒）")
+    answer_cache_max_size: int = Field(default=1024, description="内存答案缓存的最大条目数")
+    answer_cache_path: Optional[str] = Field(default=None, description="答案缓存 SQLite 持久层路径")
+    answer_cache_persistent_max_entries: Optional[int] = Field(
+        default=100000,
+        description="答案缓存 SQLite 持久层的最大条目数，None 表示不限制"
+    )
+    semantic_cache_enabled: bool = Field(default=False, description="是否启用基于查询向量的语义缓存")
+    semantic_cache_threshold: float = Field(default=0.92, description="语义缓存直接返回结果的余弦相似度阈值")
+    semantic_cache_seed_threshold: Optional[float] = Field(
+        default=None,
+        description="语义缓存作为子任务结果复用的相似度阈值，低于直接返回阈值时生效"
+    )
+    semantic_cache_max_entries: int = Field(default=1024, description="语义缓存向量矩阵的最大行数")
+    semantic_cache_skip_below: float = Field(
+        default=10.0,
+        description="剩余时间低于该值（秒）时跳过语义缓存查询；查询向量化最多占用剩余时间减去该值"
+    )
+    degrade_reduce_tasks_below: float = Field(default=60.0, description="剩余时间低于该值（秒）时减少子任务数量")
+    degraded_task_count: int = Field(default=2, description="减少子任务后保留的任务数")
+    degrade_direct_retrieval_below: float = Field(
+        default=40.0,
+        description="剩余时间低于该值（秒）时跳过 ReAct 代理，直接检索文档"
+    )
+    degrade_skip_evaluation_below: float = Field(default=20.0, description="剩余时间低于该值（秒）时跳过质量评估")
+    degrade_max_tokens_below: float = Field(default=30.0, description="剩余时间低于该值（秒）时限制回答长度")
+    degraded_max_tokens: int = Field(default=512, description="限制回答长度时的最大输出 token 数")
+    max_in_flight_queries: Optional[int] = Field(default=None, description="同时处理的最大查询数，None 表示不限制")
+    max_queued_queries: int = Field(default=64, description="等待准入的最大排队查询数")
+
+# 缓存相关配置不影响答案内容，不参与配置指纹
+ANSWER_CACHE_FIELDS = {
+    "answer_cache_enabled", "answer_cache_ttl", "answer_cache_max_size", "answer_cache_path",
+    "answer_cache_persistent_max_entries",
+    "semantic_cache_enabled", "semantic_cache_threshold", "semantic_cache_seed_threshold",
+    "semantic_cache_max_entries", "semantic_cache_skip_below", "decomposition_cache_enabled", "decomposition_cache_ttl",
+    "decomposition_cache_max_size", "decomposition_cache_path", "decomposition_cache_persistent_max_entries"
+}
+
+# 降级阈值只在截止时间临近时生效，且降级结果不写入缓存
+DEGRADATION_FIELDS = {
+    "degrade_reduce_tasks_below", "degraded_task_count", "degrade_direct_retrieval_below",
+    "degrade_skip_evaluation_below", "degrade_max_tokens_below", "degraded_max_tokens",
+    "parse_time_fraction"
+}
+
+# 准入控制只影响排队，不影响答案内容
+ADMISSION_FIELDS = {"max_in_flight_queries", "max_queued_queries"}
+
+# 只描述某一次执行过程的元数据，缓存命中时不沿用原始执行的值
+RUN_METADATA_FIELDS = {
+    "stage_timings", "queue_time", "degradations", "shared_tasks", "failed_tasks", "cache_hit",
+    "semantic_similarity", "semantic_seed_similarity", "semantic_cache_skipped", "admission_rejected"
+}
 
 class WorkflowResult(BaseModel):
     """工作流结果"""
@@ -43,60 +138,508 @@ class WorkflowResult(BaseModel):
 
 class WorkflowContext:
     """工作流上下文"""
-    def __init__(self, query: str, session_id: str):
+    def __init__(self, query: str, session_id: str, deadline: Optional[float] = None):
         self.query = query
         self.session_id = session_id
+        # 截止时间，基于 time.monotonic()，None 表示不限时
+        self.deadline = deadline
         self.tasks: List[SubTask] = []
         self.task_results: List[Dict] = []
         self.response: Optional[Dict] = None
         self.evaluation: Optional[Dict] = None
         self.error: Optional[str] = None
         self.metadata: Dict = {}
+        self.cache_key: Optional[str] = None
+        self.cache_namespace: Optional[str] = None
+        self.query_vector: Optional[Any] = None
+        # 由语义缓存提供子任务结果时跳过任务生成和执行
+        self.seeded = False
+        # 模型解析子任务的截止时间，首次解析时确定
+        self.parse_deadline: Optional[float] = None
+
+    def remaining(self) -> Optional[float]:
+        """距离截止时间的剩余秒数"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+def resolve_deadline(deadline: Optional[float] = None, timeout: Optional[float] = None) -> Optional[float]:
+    """将相对超时与绝对截止时间合并为基于 time.monotonic() 的截止时间"""
+    if timeout is not None:
+        timeout_deadline = time.monotonic() + timeout
+        deadline = timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+    return deadline
 
 class WorkflowCoordinator:
     """工作流协调器"""
-    def __init__(self, config: Optional[WorkflowConfig] = None):
+    def __init__(self,
+                 config: Optional[WorkflowConfig] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 answer_cache: Optional[AnswerCache] = None,
+                 semantic_cache: Optional["SemanticAnswerCache"] = None,
+                 admission: Optional[AdmissionController] = None):
         self.config = config or WorkflowConfig()
-        self.query_parser = QueryParser()
-        self.tool_orchestrator = ToolOrchestrator()
+        # 默认使用进程级共享的指标实例
+        self.metrics = metrics or workflow_metrics
+        self.answer_cache = answer_cache or AnswerCache(
+            max_size=self.config.answer_cache_max_size,
+            ttl=self.config.answer_cache_ttl,
+            sqlite_path=self.config.answer_cache_path,
+            sqlite_max_entries=self.config.answer_cache_persistent_max_entries
+        )
+        self.semantic_cache = semantic_cache
+        if self.semantic_cache is None and self.config.semantic_cache_enabled:
+            # numpy 仅在启用语义缓存时加载
+            from .semantic_cache import SemanticAnswerCache
+            self.semantic_cache = SemanticAnswerCache(
+                threshold=self.config.semantic_cache_threshold,
+                max_entries=self.config.semantic_cache_max_entries,
+                ttl=self.config.answer_cache_ttl
+            )
+        self.admission = admission
+        if self.admission is None and self.config.max_in_flight_queries:
+            self.admission = AdmissionController(
+                max_in_flight=self.config.max_in_flight_queries,
+                max_queue=self.config.max_queued_queries,
+                metrics=self.metrics
+            )
+        self.query_parser = QueryParser(
+            fast_path_threshold=self.config.fast_path_threshold,
+            cache_enabled=self.config.decomposition_cache_enabled,
+            cache_ttl=self.config.decomposition_cache_ttl,
+            cache_max_size=self.config.decomposition_cache_max_size,
+            cache_path=self.config.decomposition_cache_path,
+            cache_persistent_max_entries=self.config.decomposition_cache_persistent_max_entries
+        )
+        self.tool_orchestrator = ToolOrchestrator(
+            max_concurrency=self.config.max_concurrent_tasks,
+            task_timeout=self.config.task_timeout,
+            direct_search=self.config.direct_search,
+            context_token_budget=self.config.response_context_tokens,
+            map_reduce_threshold=self.config.map_reduce_threshold,
+            map_chunk_tokens=self.config.map_chunk_tokens,
+            map_summary_tokens=self.config.map_summary_tokens,
+            query_parser=self.query_parser
+        )
         self.result_evaluator = ResultEvaluator()
         self.conversation_manager = ConversationManager()
         self.cost_tracker = CostTracker()
         
-    async def process_query(self, query: str, session_id: str) -> WorkflowResult:
-        """处理查询"""
-        context = WorkflowContext(query, session_id)
+    def _stages(self, pipelined: bool = True) -> List[Tuple[Callable, EventType]]:
+        """按执行顺序返回各阶段及其完成事件；流水线解析时任务生成与执行合并为一个阶段"""
+        if pipelined and self.config.llm_task_parsing and self.config.pipelined_task_parsing:
+            task_stages = [(self._stream_tasks, EventType.TASKS_EXECUTED)]
+        else:
+            task_stages = [
+                (self._generate_tasks, EventType.TASKS_GENERATED),
+                (self._execute_tasks, EventType.TASKS_EXECUTED)
+            ]
+        return [
+            (self._validate_query, EventType.QUERY_VALIDATED),
+            *task_stages,
+            (self._generate_response, EventType.RESPONSE_GENERATED),
+            (self._evaluate_quality, EventType.QUALITY_EVALUATED),
+            (self._save_conversation, EventType.CONVERSATION_UPDATED)
+        ]
+        
+    async def process_query(self,
+                            query: str,
+                            session_id: str,
+                            deadline: Optional[float] = None,
+                            timeout: Optional[float] = None) -> WorkflowResult:
+        """处理查询
+
+        deadline 为基于 time.monotonic() 的截止时间，timeout 为相对秒数，二者取较早者。
+        剩余时间不足时各阶段按配置逐级降级，应用的降级记录在结果元数据的 degradations 中。
+        启用准入控制时，未命中缓存的查询需排队获取处理槽位，预计等待超过截止时间时直接拒绝。
+        """
+        context = WorkflowContext(query, session_id, resolve_deadline(deadline, timeout))
+        start_time = time.perf_counter()
         
         try:
-            # 验证查询
-            if not await self._validate_query(context):
-                return self._create_error_result(context)
+            cached = await self._lookup_answer_cache(context, start_time)
+            if cached is not None:
+                return cached
             
-            # 生成任务
-            if not await self._generate_tasks(context):
-                return self._create_error_result(context)
+            async with self._admit([context]):
+                # 依次执行验证、任务生成、任务执行、响应生成、质量评估和对话保存
+                for stage, event_type in self._stages():
+                    if self._skip_stage(stage, context):
+                        continue
+                    if not await self._run_stage(stage, event_type, context):
+                        return self._finish(context, start_time, self._create_error_result)
             
-            # 执行任务
-            if not await self._execute_tasks(context):
-                return self._create_error_result(context)
+            return self._finish(context, start_time, self._create_success_result)
             
-            # 生成响应
-            if not await self._generate_response(context):
-                return self._create_error_result(context)
-            
-            # 评估质量
-            if not await self._evaluate_quality(context):
-                return self._create_error_result(context)
+        except AdmissionRejected as e:
+            self._reject(context, e)
+            return self._finish(context, start_time, self._create_error_result)
+        except Exception as e:
+            context.error = str(e)
+            return self._finish(context, start_time, self._create_error_result)
+
+    async def astream_query(self,
+                            query: str,
+                            session_id: str,
+                            deadline: Optional[float] = None,
+                            timeout: Optional[float] = None) -> AsyncIterator[WorkflowEvent]:
+        """以事件流的形式处理查询，每个阶段完成时产出事件，响应生成阶段逐块产出回答"""
+        context = WorkflowContext(query, session_id, resolve_deadline(deadline, timeout))
+        start_time = time.perf_counter()
+        yield WorkflowEvent(
+            type=EventType.QUERY_RECEIVED,
+            data={"query": query, "session_id": session_id}
+        )
+        
+        try:
+            cached = await self._lookup_answer_cache(context, start_time)
+            if cached is not None:
+                yield WorkflowEvent(type=EventType.WORKFLOW_COMPLETED, data={"result": cached.dict()})
+                return
             
-            # 保存对话
-            if not await self._save_conversation(context):
-                return self._create_error_result(context)
+            async with self._admit([context]):
+                for stage, event_type in self._stages():
+                    if self._skip_stage(stage, context):
+                        continue
+                    if stage == self._generate_response:
+                        # 响应生成阶段改为流式输出，降低首字节延迟
+                        stage_start = time.perf_counter()
+                        async for token in self._stream_response(context):
+                            yield WorkflowEvent(type=EventType.RESPONSE_TOKEN, data={"token": token})
+                        succeeded = context.error is None
+                        self._record_stage(event_type, context, time.perf_counter() - stage_start, succeeded)
+                    else:
+                        succeeded = await self._run_stage(stage, event_type, context)
+                    
+                    if not succeeded:
+                        yield self._create_error_event(context, start_time)
+                        return
+                    yield WorkflowEvent(type=event_type, data=self._stage_event_data(event_type, context))
             
-            return self._create_success_result(context)
+            result = self._finish(context, start_time, self._create_success_result)
+            yield WorkflowEvent(
+                type=EventType.WORKFLOW_COMPLETED,
+                data={"result": result.dict()}
+            )
             
+        except AdmissionRejected as e:
+            self._reject(context, e)
+            yield self._create_error_event(context, start_time)
         except Exception as e:
             context.error = str(e)
-            return self._create_error_result(context)
+            yield self._create_error_event(context, start_time)
+
+    async def process_queries(self,
+                              queries: List[Tuple[str, str]],
+                              deadline: Optional[float] = None,
+                              timeout: Optional[float] = None) -> List[WorkflowResult]:
+        """批量处理查询：所有查询共享同一并发预算，规范化后相同的子任务只执行一次
+
+        启用准入控制时，未命中缓存的查询作为一个整体占用一个处理槽位。
+        """
+        deadline = resolve_deadline(deadline, timeout)
+        contexts = [WorkflowContext(query, session_id, deadline) for query, session_id in queries]
+        results: List[Optional[WorkflowResult]] = [None] * len(contexts)
+        start_time = time.perf_counter()
+        
+        pending = []
+        for i, context in enumerate(contexts):
+            cached = await self._lookup_answer_cache(context, start_time)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        if pending:
+            try:
+                async with self._admit([contexts[i] for i in pending]):
+                    await self._run_batch(contexts, pending, results, start_time)
+            except AdmissionRejected as e:
+                for i in pending:
+                    self._reject(contexts[i], e)
+                    results[i] = self._finish(contexts[i], start_time, self._create_error_result)
+        
+        return results
+
+    async def _run_batch(self,
+                         contexts: List[WorkflowContext],
+                         pending: List[int],
+                         results: List[Optional[WorkflowResult]],
+                         start_time: float):
+        """执行未命中缓存的批量查询，结果按位置写入 results"""
+        # 批量查询需要先拿到全部子任务才能跨查询去重，不使用流水线解析
+        stages = self._stages(pipelined=False)
+        execute_index = [stage for stage, _ in stages].index(self._execute_tasks)
+        
+        # 各阶段按查询并发执行，受同一并发上限约束
+        semaphore = asyncio.Semaphore(max(1, self.config.max_concurrent_tasks))
+        
+        async def prepare(i: int) -> bool:
+            # 任务执行之前的阶段；开启 llm_task_parsing 时任务生成会调用模型
+            context = contexts[i]
+            async with semaphore:
+                for stage, event_type in stages[:execute_index]:
+                    if self._skip_stage(stage, context):
+                        continue
+                    if not await self._run_stage(stage, event_type, context):
+                        results[i] = self._finish(context, start_time, self._create_error_result)
+                        return False
+            return True
+        
+        prepared = await asyncio.gather(*(prepare(i) for i in pending))
+        active = [i for i, ok in zip(pending, prepared) if ok]
+        
+        # 跨查询去重子任务，并在一次调度中执行
+        unique_tasks: Dict[str, SubTask] = {}
+        for i in active:
+            for task in contexts[i].tasks:
+                unique_tasks.setdefault(self._task_key(task), task)
+        # execute_tasks 按优先级稳定排序返回结果，这里预先排序以便按位置对应
+        ordered = sorted(unique_tasks.items(), key=lambda item: item[1].priority)
+        
+        execute_start = time.perf_counter()
+        execute_error = None
+        shared_results: Dict[str, Dict] = {}
+        try:
+            if ordered:
+                # 所有查询共享同一截止时间，执行选项相同，但降级需记录到每个查询
+                options = [self._execution_options(contexts[i]) for i in active if not contexts[i].seeded]
+                task_results = await self.tool_orchestrator.execute_tasks(
+                    [task for _, task in ordered], **options[0]
+                )
+                shared_results = dict(zip([key for key, _ in ordered], task_results))
+        except Exception as e:
+            execute_error = f"任务执行失败: {str(e)}"
+        execute_duration = time.perf_counter() - execute_start
+        
+        # 将共享结果分发给每个查询，同一子任务的 token 只计入第一个查询
+        charged = set()
+        for i in active:
+            context = contexts[i]
+            if context.seeded:
+                continue
+            if execute_error:
+                context.error = execute_error
+                succeeded = False
+            else:
+                fanned_out = []
+                shared_count = 0
+                for task in context.tasks:
+                    key = self._task_key(task)
+                    result = shared_results.get(key)
+                    if isinstance(result, dict):
+                        result = dict(result)
+                        if key in charged:
+                            result["token_usage"] = {"completion_tokens": 0, "total_tokens": 0}
+                            shared_count += 1
+                        charged.add(key)
+                    fanned_out.append(result)
+                succeeded = await self._process_task_results(context, fanned_out)
+                context.metadata["shared_tasks"] = shared_count
+            
+            self._record_stage(stages[execute_index][1], context, execute_duration, succeeded)
+            if not succeeded:
+                results[i] = self._finish(context, start_time, self._create_error_result)
+        
+        # 剩余阶段按查询并发执行
+        async def complete(context: WorkflowContext) -> WorkflowResult:
+            async with semaphore:
+                try:
+                    for stage, event_type in stages[execute_index + 1:]:
+                        if not await self._run_stage(stage, event_type, context):
+                            return self._finish(context, start_time, self._create_error_result)
+                    return self._finish(context, start_time, self._create_success_result)
+                except Exception as e:
+                    context.error = str(e)
+                    return self._finish(context, start_time, self._create_error_result)
+        
+        remaining = [i for i in active if results[i] is None]
+        completed = await asyncio.gather(*(complete(contexts[i]) for i in remaining))
+        for i, result in zip(remaining, completed):
+            results[i] = result
+
+    @asynccontextmanager
+    async def _admit(self, contexts: List[WorkflowContext]):
+        """在准入控制下执行，排队时间写入上下文元数据；未启用准入控制时直接执行"""
+        if self.admission is None:
+            yield
+            return
+        async with self.admission.admit(contexts[0].deadline) as queue_time:
+            for context in contexts:
+                context.metadata["queue_time"] = queue_time
+            yield
+
+    def _reject(self, context: WorkflowContext, error: AdmissionRejected):
+        """记录准入拒绝原因"""
+        context.error = f"请求被拒绝: {error}"
+        context.metadata["admission_rejected"] = error.reason
+
+    def _skip_stage(self, stage: Callable, context: WorkflowContext) -> bool:
+        """语义缓存已提供子任务结果时跳过任务生成和执行"""
+        return context.seeded and stage in (self._generate_tasks, self._execute_tasks, self._stream_tasks)
+
+    async def _run_stage(self, stage: Callable, event_type: EventType, context: WorkflowContext) -> bool:
+        """执行单个阶段并记录耗时、token 和错误"""
+        stage_start = time.perf_counter()
+        succeeded = False
+        try:
+            succeeded = await stage(context)
+            return succeeded
+        finally:
+            self._record_stage(event_type, context, time.perf_counter() - stage_start, succeeded)
+
+    def _record_stage(self, event_type: EventType, context: WorkflowContext, duration: float, succeeded: bool):
+        """记录阶段指标，并把耗时写入上下文元数据"""
+        context.metadata.setdefault("stage_timings", {})[event_type.value] = duration
+        self.metrics.record(
+            event_type,
+            duration,
+            tokens=self._stage_tokens(event_type, context) if succeeded else 0,
+            error=not succeeded
+        )
+
+    def _stage_tokens(self, event_type: EventType, context: WorkflowContext) -> int:
+        """统计阶段消耗的 token 数"""
+        if event_type == EventType.TASKS_EXECUTED:
+            return sum(total_tokens(result.get("token_usage")) for result in context.task_results)
+        if event_type == EventType.RESPONSE_GENERATED and context.response:
+            return total_tokens(context.response.get("token_usage"))
+        if event_type == EventType.QUALITY_EVALUATED and context.evaluation:
+            return total_tokens(context.evaluation.get("token_usage"))
+        return 0
+
+    def _finish(self, context: WorkflowContext, start_time: float,
+                create_result: Callable[[WorkflowContext], WorkflowResult]) -> WorkflowResult:
+        """记录整体耗时并生成结果，成功且完整的结果写入答案缓存"""
+        self.metrics.record(
+            EventType.WORKFLOW_COMPLETED,
+            time.perf_counter() - start_time,
+            error=context.error is not None
+        )
+        result = create_result(context)
+        cacheable = not (context.metadata.get("failed_tasks") or context.metadata.get("degradations"))
+        if context.error is None and cacheable:
+            try:
+                if context.cache_key:
+                    self.answer_cache.set(context.cache_key, result.dict())
+                if self.semantic_cache is not None and context.query_vector is not None:
+                    self.semantic_cache.add(context.query_vector, context.cache_namespace, result.dict())
+            except Exception as e:
+                print(f"答案缓存写入失败: {e}")
+        return result
+
+    async def _lookup_answer_cache(self, context: WorkflowContext, start_time: float) -> Optional[WorkflowResult]:
+        """查询答案缓存，命中时直接返回缓存结果并记录对话"""
+        if not (self.config.answer_cache_enabled and context.query):
+            return None
+        
+        try:
+            fingerprint = config_fingerprint(
+                self.config, exclude=ANSWER_CACHE_FIELDS | DEGRADATION_FIELDS | ADMISSION_FIELDS
+            )
+            kb_version = self.tool_orchestrator.knowledge_base_version()
+            context.cache_namespace = f"{fingerprint}:{kb_version}"
+            context.cache_key = self.answer_cache.make_key(context.query, fingerprint, kb_version)
+            cached = self.answer_cache.get(context.cache_key)
+        except Exception as e:
+            print(f"答案缓存查询失败: {e}")
+            context.cache_key = None
+            return None
+        
+        hit_metadata = {"cache_hit": True}
+        if cached is None:
+            cached = await self._lookup_semantic_cache(context)
+            if cached is None:
+                context.metadata["cache_hit"] = False
+                return None
+            hit_metadata["semantic_similarity"] = context.metadata.pop("semantic_similarity")
+        
+        result = WorkflowResult(**cached)
+        result.conversation_id = context.session_id
+        result.metadata = {
+            **{key: value for key, value in result.metadata.items() if key not in RUN_METADATA_FIELDS},
+            **context.metadata,
+            "timestamp": datetime.now().isoformat(),
+            **hit_metadata
+        }
+        
+        # 命中缓存时仍然记录对话历史
+        context.response = {"response": result.final_answer}
+        context.evaluation = result.evaluation_result
+        if not await self._save_conversation(context):
+            return self._finish(context, start_time, self._create_error_result)
+        
+        self.metrics.record(EventType.WORKFLOW_COMPLETED, time.perf_counter() - start_time)
+        return result
+
+    def _stage_event_data(self, event_type: EventType, context: WorkflowContext) -> Dict[str, Any]:
+        """提取阶段完成事件携带的数据"""
+        if event_type == EventType.QUERY_VALIDATED:
+            return {"query": context.query}
+        if event_type == EventType.TASKS_GENERATED:
+            return {"tasks": [task.dict() for task in context.tasks]}
+        if event_type == EventType.TASKS_EXECUTED:
+            return {"task_results": context.task_results}
+        if event_type == EventType.RESPONSE_GENERATED:
+            return {"response": context.response["response"]}
+        if event_type == EventType.QUALITY_EVALUATED:
+            return {"evaluation": context.evaluation or {}}
+        return {"session_id": context.session_id}
+
+    def _create_error_event(self, context: WorkflowContext, start_time: float) -> WorkflowEvent:
+        """创建错误事件"""
+        return WorkflowEvent(
+            type=EventType.ERROR_OCCURRED,
+            data={
+                "error": context.error,
+                "result": self._finish(context, start_time, self._create_error_result).dict()
+            }
+        )
+
+    async def _lookup_semantic_cache(self, context: WorkflowContext) -> Optional[Dict]:
+        """语义缓存查询：相似度超过阈值时返回缓存结果，超过复用阈值时将已有答案作为子任务结果"""
+        if self.semantic_cache is None:
+            return None
+        
+        threshold = self.config.semantic_cache_threshold
+        seed_threshold = self.config.semantic_cache_seed_threshold
+        min_similarity = min(threshold, seed_threshold) if seed_threshold is not None else threshold
+        # 向量化是一次网络请求，有截止时间时只使用剩余时间中留给后续流程之外的部分
+        remaining = context.remaining()
+        timeout = None if remaining is None else remaining - self.config.semantic_cache_skip_below
+        if timeout is not None and timeout <= 0:
+            context.metadata["semantic_cache_skipped"] = "deadline"
+            return None
+        try:
+            context.query_vector = await asyncio.wait_for(self.semantic_cache.embed(context.query), timeout)
+            match = self.semantic_cache.lookup(context.query_vector, context.cache_namespace, min_similarity)
+        except asyncio.TimeoutError:
+            context.metadata["semantic_cache_skipped"] = "timeout"
+            return None
+        except Exception as e:
+            print(f"语义缓存查询失败: {e}")
+            return None
+        
+        if match is None:
+            return None
+        similarity, cached = match
+        if similarity >= threshold:
+            context.metadata["semantic_similarity"] = similarity
+            return cached
+        
+        # 相似但未达到直接返回阈值：复用已有答案，跳过子任务执行，仅重新生成回答
+        context.task_results = [{
+            "task_type": "semantic_cache",
+            "result": cached["final_answer"],
+            "token_usage": {"completion_tokens": 0, "total_tokens": 0}
+        }]
+        context.seeded = True
+        context.metadata["semantic_seed_similarity"] = similarity
+        return None
 
     async def _validate_query(self, context: WorkflowContext) -> bool:
         """验证查询"""
@@ -113,61 +656,170 @@ class WorkflowCoordinator:
     async def _generate_tasks(self, context: WorkflowContext) -> bool:
         """生成任务"""
         try:
-            # 直接使用基础任务列表
+            # 时间不足时只保留优先级最高的几项
+            limit = self._task_limit(context)
             tasks = []
-            for i, aspect in enumerate(self.config.base_tasks):
-                tasks.append(SubTask(
-                    task_type="search",
-                    description=f"请全面深入地分析{context.query}的{aspect}，需要包含具体数据和事实依据",
-                    priority=i + 1,
-                    parameters={"depth": "detailed", "min_length": 200}
-                ))
+            if self.config.llm_task_parsing:
+                try:
+                    tasks = await asyncio.wait_for(
+                        self.query_parser.aparse_query(context.query, self._route(context)),
+                        timeout=self._parse_timeout(context)
+                    )
+                except asyncio.TimeoutError:
+                    # 解析超出时间预算时回退到基础任务
+                    context.metadata.setdefault("degradations", []).append("parse_timeout")
+                except Exception as e:
+                    print(f"解析查询失败，使用基础任务: {e}")
             
-            context.tasks = tasks
+            context.tasks = (tasks or self._base_tasks(context.query))[:limit]
             return True
             
         except Exception as e:
             context.error = f"任务生成失败: {str(e)}"
             return False
 
+    def _task_limit(self, context: WorkflowContext) -> Optional[int]:
+        """剩余时间不足时限制子任务数量"""
+        if self._degrade(context, "reduced_tasks", self.config.degrade_reduce_tasks_below):
+            return max(1, self.config.degraded_task_count)
+        return None
+
+    def _parse_timeout(self, context: WorkflowContext) -> Optional[float]:
+        """模型解析的超时时间，其余时间留给任务执行和响应生成"""
+        if context.parse_deadline is None:
+            remaining = context.remaining()
+            if remaining is None:
+                return None
+            context.parse_deadline = time.monotonic() + remaining * self.config.parse_time_fraction
+        return max(0.0, context.parse_deadline - time.monotonic())
+
+    def _route(self, context: WorkflowContext):
+        """对查询做快速路径分类，路由结果和置信度写入上下文元数据"""
+        decision = self.query_parser.route(context.query)
+        if decision is not None:
+            context.metadata["query_route"] = decision.to_dict()
+        return decision
+
+    def _base_tasks(self, query: str) -> List[SubTask]:
+        """按基础任务列表生成子任务
+
+        描述保留用户原始查询；去重键由规范化查询和分析角度组成，批量处理时仅空白、大小写
+        或结尾标点不同的查询生成的子任务合并执行。
+        """
+        normalized = normalize_query(query)
+        return [
+            SubTask(
+                task_type="search",
+                description=f"请全面深入地分析{query}的{aspect}，需要包含具体数据和事实依据",
+                priority=i + 1,
+                parameters={"depth": "detailed", "min_length": 200, "dedup_key": f"{normalized}\x00{aspect}"}
+            )
+            for i, aspect in enumerate(self.config.base_tasks)
+        ]
+
+    @staticmethod
+    def _task_key(task: SubTask) -> str:
+        """批量处理时合并子任务的键，未指定 dedup_key 时使用规范化后的描述"""
+        return task.parameters.get("dedup_key") or normalize_query(task.description)
+
+    async def _stream_tasks(self, context: WorkflowContext) -> bool:
+        """流水线执行：查询解析器每产出一个子任务就立即开始执行"""
+        try:
+            if not self._check_deadline(context):
+                return False
+            limit = self._task_limit(context)
+            context.tasks = []
+            results = await self.tool_orchestrator.execute_task_stream(
+                self._parsed_tasks(context, limit), **self._execution_options(context)
+            )
+            return await self._process_task_results(context, results)
+            
+        except Exception as e:
+            context.error = f"任务执行失败: {str(e)}"
+            return False
+
+    async def _parsed_tasks(self, context: WorkflowContext, limit: Optional[int]) -> AsyncIterator[SubTask]:
+        """逐个产出解析出的子任务并记录到上下文；解析失败或超时且没有任务时回退到基础任务"""
+        stream = self.query_parser.astream_tasks(context.query, self._route(context))
+        try:
+            while not (limit and len(context.tasks) >= limit):
+                try:
+                    # 解析截止时间按开始解析时的剩余时间计算
+                    task = await asyncio.wait_for(stream.__anext__(), timeout=self._parse_timeout(context))
+                except StopAsyncIteration:
+                    break
+                context.tasks.append(task)
+                yield task
+        except asyncio.TimeoutError:
+            context.metadata.setdefault("degradations", []).append("parse_timeout")
+        except Exception as e:
+            print(f"流式解析查询失败: {e}")
+        finally:
+            await stream.aclose()
+        
+        if not context.tasks:
+            for task in self._base_tasks(context.query)[:limit]:
+                context.tasks.append(task)
+                yield task
+
     async def _execute_tasks(self, context: WorkflowContext) -> bool:
         """执行任务"""
         try:
-            results = await self.tool_orchestrator.execute_tasks(context.tasks)
+            if not self._check_deadline(context):
+                return False
+            results = await self.tool_orchestrator.execute_tasks(
+                context.tasks, **self._execution_options(context)
+            )
+            return await self._process_task_results(context, results)
             
+        except Exception as e:
+            context.error = f"任务执行失败: {str(e)}"
+            return False
+
+    async def _process_task_results(self, context: WorkflowContext, results: List[Any]) -> bool:
+        """校验任务结果、记录成本并写入上下文"""
+        try:
             # 处理任务结果
             processed_results = []
+            failed_errors = []
             for result in results:
                 # 检查结果是否有效
-                if isinstance(result, dict):
-                    # 如果结果中包含错误信息，则标记为失败
-                    if isinstance(result.get("output"), str) and (
-                        "Agent stopped" in result["output"] or 
-                        "执行失败" in result["output"]
-                    ):
-                        context.error = result["output"]
-                        return False
-                    
-                    # 构建标准化的结果格式
-                    processed_result = {
-                        "task_type": result.get("task_type", "unknown"),
-                        "result": result.get("output", ""),
-                        "token_usage": {
-                            "completion_tokens": 0,
-                            "total_tokens": 0
-                        }
-                    }
-                    
-                    # 如果有 token 使用信息，则更新
-                    if "token_usage" in result:
-                        processed_result["token_usage"] = result["token_usage"]
-                    
-                    # 记录任务执行成本
-                    await self._track_task_cost(processed_result, context.session_id)
-                    processed_results.append(processed_result)
-                else:
+                if not isinstance(result, dict):
                     context.error = "任务返回结果格式无效"
                     return False
+                
+                output = result.get("result", result.get("output", ""))
+                # 单个任务失败或超时不影响其他任务，全部失败时才终止流程
+                if result.get("error") or (isinstance(output, str) and (
+                    "Agent stopped" in output or 
+                    "执行失败" in output
+                )):
+                    failed_errors.append(result.get("error") or output)
+                    continue
+                
+                # 构建标准化的结果格式
+                processed_result = {
+                    "task_type": result.get("task_type", "unknown"),
+                    "result": output,
+                    "token_usage": {
+                        "completion_tokens": 0,
+                        "total_tokens": 0
+                    },
+                    "wall_time": result.get("wall_time", 0.0)
+                }
+                
+                # 如果有 token 使用信息，则更新
+                if "token_usage" in result:
+                    processed_result["token_usage"] = result["token_usage"]
+                
+                # 记录任务执行成本
+                await self._track_task_cost(processed_result, context.session_id)
+                processed_results.append(processed_result)
+            
+            if failed_errors and not processed_results:
+                context.error = failed_errors[0]
+                return False
+            context.metadata["failed_tasks"] = len(failed_errors)
             
             context.task_results = processed_results
             return True
@@ -206,8 +858,20 @@ class WorkflowCoordinator:
     async def _generate_response(self, context: WorkflowContext) -> bool:
         """生成响应"""
         try:
+            if not self._check_deadline(context):
+                return False
             prompt = self._create_response_prompt(context.query)
-            response = await self.tool_orchestrator.generate_response(prompt, context.task_results)
+            response = await asyncio.wait_for(
+                self.tool_orchestrator.generate_response(
+                    prompt, context.task_results, **self._response_options(context)
+                ),
+                timeout=context.remaining()
+            )
+            
+            if isinstance(response, dict):
+                for key in ("context_packing", "synthesis"):
+                    if response.get(key):
+                        context.metadata[key] = response[key]
             
             # 统一响应格式
             response_data = self._normalize_response(response, context)
@@ -219,24 +883,124 @@ class WorkflowCoordinator:
             context.response = response_data
             return True
             
+        except asyncio.TimeoutError:
+            context.error = "响应生成失败: 已超过截止时间"
+            return False
         except Exception as e:
             context.error = f"响应生成失败: {str(e)}"
             return False
 
+    async def _stream_response(self, context: WorkflowContext) -> AsyncIterator[str]:
+        """流式生成响应，逐块产出回答文本，完成后写入上下文"""
+        try:
+            if not self._check_deadline(context):
+                return
+            prompt = self._create_response_prompt(context.query)
+            chunks = []
+            usage: Dict[str, int] = {}
+            details: Dict[str, Any] = {}
+            async for chunk in self.tool_orchestrator.astream_response(
+                prompt, context.task_results, usage=usage, details=details, **self._response_options(context)
+            ):
+                chunks.append(chunk)
+                yield chunk
+                if context.expired():
+                    # 到达截止时间时保留已生成的部分回答
+                    context.metadata.setdefault("degradations", []).append("truncated_response")
+                    break
+            
+            content = "".join(chunks)
+            if not content:
+                raise ValueError("响应内容无效")
+            
+            # 统一响应格式
+            response_data = self._normalize_response({
+                "response": content,
+                "token_usage": usage or self.tool_orchestrator.response_token_usage(
+                    prompt, context.task_results, content
+                )
+            }, context)
+            for key in ("context_packing", "synthesis"):
+                if details.get(key):
+                    context.metadata[key] = details[key]
+            
+            # 记录响应生成成本
+            if response_data.get("token_usage"):
+                await self._track_response_cost(response_data, context.session_id)
+            
+            context.response = response_data
+            
+        except Exception as e:
+            context.error = f"响应生成失败: {str(e)}"
+
     async def _evaluate_quality(self, context: WorkflowContext) -> bool:
         """评估质量"""
+        if self._degrade(context, "skipped_evaluation", self.config.degrade_skip_evaluation_below):
+            context.evaluation = self._skipped_evaluation()
+            return True
+        
         try:
-            eval_result = await self.result_evaluator.evaluate_with_fallback(
-                answer=context.response["response"],
-                query=context.query
+            eval_result = await asyncio.wait_for(
+                self.result_evaluator.evaluate_with_fallback(
+                    answer=context.response["response"],
+                    query=context.query
+                ),
+                timeout=context.remaining()
             )
             context.evaluation = eval_result
             return True
             
+        except asyncio.TimeoutError:
+            # 评估超时不影响已生成的回答
+            context.metadata.setdefault("degradations", []).append("evaluation_timeout")
+            context.evaluation = self._skipped_evaluation()
+            return True
         except Exception as e:
             context.error = f"质量评估失败: {str(e)}"
             return False
 
+    def _degrade(self, context: WorkflowContext, name: str, threshold: float) -> bool:
+        """剩余时间低于阈值时应用降级，并记录到上下文元数据"""
+        remaining = context.remaining()
+        if remaining is None or remaining >= threshold:
+            return False
+        context.metadata.setdefault("degradations", []).append(name)
+        return True
+
+    def _check_deadline(self, context: WorkflowContext) -> bool:
+        """已超过截止时间时终止流程"""
+        if context.expired():
+            context.error = "处理超时: 已超过截止时间"
+            return False
+        return True
+
+    def _execution_options(self, context: WorkflowContext) -> Dict[str, Any]:
+        """根据剩余时间确定子任务执行参数"""
+        remaining = context.remaining()
+        if remaining is None:
+            return {}
+        options = {"task_timeout": max(0.0, remaining)}
+        if self.config.task_timeout is not None:
+            options["task_timeout"] = min(options["task_timeout"], self.config.task_timeout)
+        if self._degrade(context, "direct_retrieval", self.config.degrade_direct_retrieval_below):
+            options["use_agent"] = False
+        return options
+
+    def _response_options(self, context: WorkflowContext) -> Dict[str, Any]:
+        """根据剩余时间确定响应生成参数"""
+        if self._degrade(context, "capped_max_tokens", self.config.degrade_max_tokens_below):
+            return {"max_tokens": self.config.degraded_max_tokens}
+        return {}
+
+    def _skipped_evaluation(self) -> Dict:
+        """跳过质量评估时的占位结果"""
+        return {
+            "quality_score": 0.0,
+            "used_fallback": False,
+            "web_sources": [],
+            "skipped": True
+        }
+
     async def _save_conversation(self, context: WorkflowContext) -> bool:
         """保存对话"""
         try:
@@ -277,13 +1041,9 @@ class WorkflowCoordinator:
             task_type = result.get("task_type")
             used_model = self.config.default_models.get(task_type, "gpt-4o")
         
-        # 使用文本长度计算 token 使用量
-        input_text = result.get("input", "")
-        output_text = result.get("result", "")
-        
         await self.cost_tracker.track_usage(
-            content=output_text,
-            token_usage=result["token_usage"],  # 已经由 ToolOrchestrator 计算好的 token 使用量
+            content=result.get("result", ""),
+            token_usage=result["token_usage"],  # ToolOrchestrator 返回的服务端 token 使用量，缺失时为本地计算值
             model=used_model,
             session_id=session_id,
             task_type=result.get("task_type", "task_execution")
@@ -354,6 +1114,7 @@ class WorkflowCoordinator:
             "web_sources": context.evaluation.get("web_sources", []),
             "quality_score": context.evaluation.get("quality_score", 0.0)
         }
+        metadata.update(context.metadata)
         
         return WorkflowResult(
             final_answer=context.response["response"],
@@ -366,14 +1127,16 @@ class WorkflowCoordinator:
     def _create_error_result(self, context: WorkflowContext) -> WorkflowResult:
         """创建错误结果"""
         error_message = self._create_error_message(context.error or "未知错误")
+        metadata = dict(context.metadata)
+        metadata.update({
+            "timestamp": datetime.now().isoformat(),
+            "error": context.error
+        })
         
         return WorkflowResult(
             final_answer=error_message,
             subtasks=[],
             evaluation_result={"quality_score": 0},
             conversation_id=context.session_id,
-            metadata={
-                "timestamp": datetime.now().isoformat(),
-                "error": context.error
-            }
+            metadata=metadata
         )
\ No newline at end of file
@@ -1,30 +1,35 @@
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 import os
 from pathlib import Path
-from pypdf import PdfReader
-import docx
-import pandas as pd
-import markdown
-from bs4 import BeautifulSoup
-import tiktoken
+from ..utils.resources import resources
 from ..web.apiconfig import config
 
 class DocumentLoader:
+    # 扩展名 -> 加载方法
+    LOADERS = {
+        '.pdf': '_load_pdf',
+        '.docx': '_load_docx',
+        '.xlsx': '_load_excel',
+        '.xls': '_load_excel',
+        '.md': '_load_markdown'
+    }
+
     def __init__(self, base_dir: str = "/Users/bojieli/pyproject/llm-search/knowledge_base/docs",
-                 max_tokens_per_chunk: int = 1000):
+                 max_tokens_per_chunk: int = 1000,
+                 rows_per_block: int = 500,
+                 block_chars: int = 64 * 1024):
         self.base_dir = Path(base_dir)
         self.max_tokens_per_chunk = max_tokens_per_chunk
+        # 流式加载时每次处理的 Excel 行数和 Markdown 字符数，决定单个文件的内存上限
+        self.rows_per_block = rows_per_block
+        self.block_chars = block_chars
         
-        # 初始化 tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(config.api.embedding["model"])
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 进程内共享的 token 计数器
+        self.token_counter = resources.token_counter(config.api.embedding["model"])
 
-    def count_tokens(self, text: str) -> int:
+    def count_tokens(self, text: str, approximate: bool = False) -> int:
         """计算文本的 token 数量"""
-        return len(self.tokenizer.encode(text))
+        return self.token_counter.count(text, approximate=approximate)
 
     def split_text(self, text: str, metadata: Dict) -> List[Dict]:
         """将文本分割成适当大小的块"""
@@ -33,12 +38,9 @@ class DocumentLoader:
         current_tokens = 0
         
         # 按句子分割文本
-        sentences = text.replace('\n', ' ').split('。')
+        sentences = [sentence.strip() + '。' for sentence in text.replace('\n', ' ').split('。')]
         
-        for sentence in sentences:
-            sentence = sentence.strip() + '。'
-            sentence_tokens = self.count_tokens(sentence)
-            
+        for sentence, sentence_tokens in zip(sentences, self.token_counter.count_many(sentences)):
             if current_tokens + sentence_tokens > self.max_tokens_per_chunk:
                 if current_chunk:
                     chunks.append({
@@ -61,9 +63,22 @@ class DocumentLoader:
         
         return chunks
 
-    def _load_pdf(self, file_path: Path) -> List[Dict]:
-        """加载 PDF 文件"""
-        documents = []
+    def iter_file(self, file_path: Path) -> Iterator[Dict]:
+        """按扩展名流式加载文件，逐块产出，不支持的格式不产出任何块"""
+        file_path = Path(file_path)
+        loader = self.LOADERS.get(file_path.suffix.lower())
+        if loader is None:
+            return iter(())
+        return getattr(self, loader)(file_path)
+
+    def load_file(self, file_path: Path) -> List[Dict]:
+        """按扩展名加载文件并分块，不支持的格式返回空列表"""
+        return list(self.iter_file(file_path))
+
+    def _load_pdf(self, file_path: Path) -> Iterator[Dict]:
+        """逐页加载 PDF 文件"""
+        # 文档解析库只在导入阶段需要，按需加载
+        from pypdf import PdfReader
         with open(file_path, 'rb') as file:
             reader = PdfReader(file)
             for i, page in enumerate(reader.pages):
@@ -73,25 +88,25 @@ class DocumentLoader:
                         'source': str(file_path),
                         'page': i + 1
                     }
-                    documents.extend(self.split_text(text, metadata))
-        return documents
+                    yield from self.split_text(text, metadata)
 
-    def _load_docx(self, file_path: Path) -> List[Dict]:
-        """加载 Word 文档"""
+    def _load_docx(self, file_path: Path) -> Iterator[Dict]:
+        """加载 Word 文档，累积到一个块的大小就产出"""
+        import docx
         doc = docx.Document(file_path)
-        documents = []
         current_text = ""
         current_para = 1
         
         for i, paragraph in enumerate(doc.paragraphs):
             if paragraph.text.strip():
                 current_text += paragraph.text + "\n"
-                if self.count_tokens(current_text) >= self.max_tokens_per_chunk:
+                # 只用于判断是否切块，近似计数即可，精确计数在 split_text 中完成
+                if self.count_tokens(current_text, approximate=True) >= self.max_tokens_per_chunk:
                     metadata = {
                         'source': str(file_path),
                         'paragraph_range': f"{current_para}-{i+1}"
                     }
-                    documents.extend(self.split_text(current_text, metadata))
+                    yield from self.split_text(current_text, metadata)
                     current_text = ""
                     current_para = i + 2
         
@@ -100,32 +115,91 @@ class DocumentLoader:
                 'source': str(file_path),
                 'paragraph_range': f"{current_para}-{len(doc.paragraphs)}"
             }
-            documents.extend(self.split_text(current_text, metadata))
-        
-        return documents
+            yield from self.split_text(current_text, metadata)
 
-    def _load_excel(self, file_path: Path) -> List[Dict]:
-        """加载 Excel 文件"""
-        documents = []
-        df = pd.read_excel(file_path)
-        for sheet_name, sheet_df in df.items():
-            content = sheet_df.to_string()
-            if content.strip():
+    def _load_excel(self, file_path: Path) -> Iterator[Dict]:
+        """按行块加载 Excel 文件，每块带上表头"""
+        for sheet_name, header, start, rows in self._iter_sheet_rows(file_path):
+            lines = ["\t".join(header)] + ["\t".join(row) for row in rows]
+            content = "\n".join(lines)
+            if any(any(cell.strip() for cell in row) for row in rows):
                 metadata = {
                     'source': str(file_path),
-                    'sheet': sheet_name
+                    'sheet': sheet_name,
+                    'rows': f"{start}-{start + len(rows) - 1}"
                 }
-                documents.extend(self.split_text(content, metadata))
-        return documents
+                yield from self.split_text(content, metadata)
+
+    def _iter_sheet_rows(self, file_path: Path) -> Iterator[tuple]:
+        """逐个工作表按 rows_per_block 行产出 (表名, 表头, 起始行号, 行)，行号从 1 开始且不含表头"""
+        def cells(row) -> List[str]:
+            # 空单元格和 NaN 都转为空字符串
+            return ["" if value is None or value != value else str(value) for value in row]
 
-    def _load_markdown(self, file_path: Path) -> List[Dict]:
-        """加载 Markdown 文件"""
+        if file_path.suffix.lower() == '.xlsx':
+            # 只读模式按行读取，不把整个工作表载入内存
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                for sheet in workbook.worksheets:
+                    rows = sheet.iter_rows(values_only=True)
+                    header = cells(next(rows, ()))
+                    block, start = [], 1
+                    for i, row in enumerate(rows, start=1):
+                        block.append(cells(row))
+                        if len(block) >= self.rows_per_block:
+                            yield sheet.title, header, start, block
+                            block, start = [], i + 1
+                    if block:
+                        yield sheet.title, header, start, block
+            finally:
+                workbook.close()
+            return
+
+        # xls 是整体存储的二进制格式，按需加载工作表：同一时间只解析一个工作表，
+        # 读完即释放，行按 rows_per_block 转换，不再构造整张表的 DataFrame
+        import xlrd
+        workbook = xlrd.open_workbook(str(file_path), on_demand=True)
+        try:
+            for sheet_name in workbook.sheet_names():
+                sheet = workbook.sheet_by_name(sheet_name)
+                try:
+                    header = cells(sheet.row_values(0)) if sheet.nrows else []
+                    for start in range(1, sheet.nrows, self.rows_per_block):
+                        end = min(start + self.rows_per_block, sheet.nrows)
+                        yield sheet_name, header, start, [cells(sheet.row_values(i)) for i in range(start, end)]
+                finally:
+                    workbook.unload_sheet(sheet_name)
+        finally:
+            workbook.release_resources()
+
+    def _load_markdown(self, file_path: Path) -> Iterator[Dict]:
+        """按段落块加载 Markdown 文件，每块单独渲染"""
+        import markdown
+        from bs4 import BeautifulSoup
+        metadata = {
+            'source': str(file_path)
+        }
+        for block in self._iter_markdown_blocks(file_path):
+            text = BeautifulSoup(markdown.markdown(block), 'html.parser').get_text()
+            if text.strip():
+                yield from self.split_text(text, metadata)
+
+    def _iter_markdown_blocks(self, file_path: Path) -> Iterator[str]:
+        """逐行读取 Markdown，在空行处切成不超过 block_chars 的块，不在代码块中间切分"""
+        lines = []
+        size = 0
+        in_fence = False
         with open(file_path, 'r', encoding='utf-8') as file:
-            md_text = file.read()
-            html = markdown.markdown(md_text)
-            soup = BeautifulSoup(html, 'html.parser')
-            text = soup.get_text()
-            metadata = {
-                'source': str(file_path)
-            }
-            return self.split_text(text, metadata)
\ No newline at end of file
+            for line in file:
+                if line.lstrip().startswith(("```", "~~~")):
+                    in_fence = not in_fence
+                lines.append(line)
+                size += len(line)
+                boundary = not in_fence and not line.strip()
+                # 长时间没有空行时也强制切分，保证内存有上限
+                if (size >= self.block_chars and boundary) or size >= 2 * self.block_chars:
+                    yield "".join(lines)
+                    lines, size = [], 0
+        if lines:
+            yield "".join(lines)
\ No newline at end of file
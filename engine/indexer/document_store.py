@@ -1,18 +1,38 @@
 from pathlib import Path
-from typing import List, Dict, Optional, Any
-from langchain_chroma import Chroma
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
+from typing import Iterable, Iterator, List, Dict, Optional, Any
+from langchain_core.documents import Document
 from .document_loader import DocumentLoader  # 确保这个导入正确
 from ..web.apiconfig import config
+import itertools
 import json
-import tiktoken
+import uuid
+from ..utils.resources import resources
+
+DEFAULT_DOCS_DIR = "/Users/bojieli/pyproject/llm-search/knowledge_base/docs"
+DEFAULT_INDEX_DIR = "/Users/bojieli/pyproject/llm-search/knowledge_base/indexes"
+VERSION_FILE = "kb_version"
+COLLECTION_NAME = "documents"
+
+def read_knowledge_base_version(index_dir: str = DEFAULT_INDEX_DIR) -> str:
+    """读取知识库版本标识，无需打开向量库"""
+    try:
+        return (Path(index_dir) / VERSION_FILE).read_text(encoding="utf-8").strip() or "0"
+    except OSError:
+        return "0"
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """把可迭代对象按 size 个一批切分，只在内存中保留当前一批"""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 class DocumentStore:
     def __init__(self, 
-                 docs_dir: str = "/Users/bojieli/pyproject/llm-search/knowledge_base/docs",
-                 index_dir: str = "/Users/bojieli/pyproject/llm-search/knowledge_base/indexes",
+                 docs_dir: str = DEFAULT_DOCS_DIR,
+                 index_dir: str = DEFAULT_INDEX_DIR,
                  embedding_config: Optional[Dict[str, Any]] = None):
         # 基础路径配置
         self.docs_dir = Path(docs_dir)
@@ -37,31 +57,48 @@ class DocumentStore:
     
     def _init_components(self):
         """初始化所有组件"""
-        # 初始化 tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(self.embedding_config["model"])
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 进程内共享的 token 计数器
+        self.token_counter = resources.token_counter(self.embedding_config["model"])
         
-        # 初始化 embeddings
-        self.embeddings = AzureOpenAIEmbeddings(**self.embedding_config)
+        # 初始化 embeddings，同配置的客户端在进程内共享
+        self.embeddings = resources.embeddings(self.embedding_config)
         
         # 初始化向量存储
         persist_directory = str(self.index_dir / "chroma_db")
         self.index_dir.mkdir(parents=True, exist_ok=True)
         
+        # Chroma 仅在真正打开向量库时导入
+        import chromadb
+        self._open_store(chromadb.PersistentClient(path=persist_directory))
+    
+    def _open_store(self, client: Any):
+        """在 Chroma 客户端上打开向量库
+
+        self.store 提供常规检索和删除；批量检索和写入预先计算的向量需要直接使用 collection，
+        通过 chromadb 的公开客户端接口获取，不依赖 langchain_chroma 的内部属性。
+        """
+        from langchain_chroma import Chroma
         self.store = Chroma(
-            persist_directory=persist_directory,
+            client=client,
             embedding_function=self.embeddings,
-            collection_name="documents"
+            collection_name=COLLECTION_NAME
         )
+        self.collection = client.get_or_create_collection(name=COLLECTION_NAME, embedding_function=None)
+    
+    @property
+    def version(self) -> str:
+        """知识库版本标识，文档增删时更新"""
+        return read_knowledge_base_version(str(self.index_dir))
+    
+    def _bump_version(self):
+        """更新知识库版本标识，使依赖知识库内容的缓存失效"""
+        (self.index_dir / VERSION_FILE).write_text(uuid.uuid4().hex, encoding="utf-8")
     
     def _process_documents(self, documents: List[Dict]) -> List[Document]:
         """处理文档"""
         # 这里需要实现文档处理逻辑
         # 返回处理后的文档列表
-        return [Document(**doc) for doc in documents]
+        return [Document(page_content=doc['content'], metadata=doc['metadata']) for doc in documents]
     
     async def _track_embedding_usage(self, text: str):
         """追踪 embedding 使用情况"""
@@ -70,7 +107,7 @@ class DocumentStore:
     
     def count_tokens(self, text: str) -> int:
         """计算文本的 token 数量"""
-        return len(self.tokenizer.encode(text))
+        return self.token_counter.count(text)
     
     async def search(self, 
                     query: str, 
@@ -89,28 +126,126 @@ class DocumentStore:
             query, k=k, filter=filters
         )
     
-    async def add_documents(self, 
-                          documents: List[Document], 
-                          metadata: Optional[Dict] = None):
-        """添加文档"""
-        if metadata:
-            for doc in documents:
-                doc.metadata.update(metadata)
+    async def search_many(self,
+                          queries: List[str],
+                          k: int = 5,
+                          filters: Optional[Dict] = None,
+                          deduplicate: bool = True,
+                          min_hits: int = 1) -> List[List[Document]]:
+        """批量搜索：一次 Embedding 请求向量化所有查询，再在向量库中一次性批量检索
+
+        deduplicate 为 True 时，同一文档块只保留在与其距离最近的那个查询的结果中，
+        但每个查询最相近的 min_hits 个结果始终保留，不会因去重而没有检索结果。
+        返回结果与 queries 按位置对应。
+        """
+        if not queries:
+            return []
+        try:
+            if hasattr(self, 'cost_tracker'):
+                await self._track_embedding_usage("\n".join(queries))
+        except Exception as e:
+            print(f"Token 统计错误: {e}")
         
-        processed_docs = self._process_documents([
-            {'content': doc.page_content, 'metadata': doc.metadata}
-            for doc in documents
-        ])
+        vectors = await self.embeddings.aembed_documents(queries)
+        response = self.collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=filters,
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        hits = []
+        for i in range(len(queries)):
+            hits.append(list(zip(
+                response["ids"][i],
+                response["documents"][i],
+                response["metadatas"][i],
+                response["distances"][i]
+            )))
         
-        # 追踪每个文档的 token 使用情况
-        for doc in processed_docs:
-            try:
-                await self._track_embedding_usage(doc.page_content)
-            except Exception as e:
-                print(f"Token 统计错误: {e}")
+        owner: Dict[str, tuple] = {}
+        if deduplicate:
+            # 每个文档块归属于距离最近的查询
+            for i, query_hits in enumerate(hits):
+                for doc_id, _, _, distance in query_hits:
+                    if doc_id not in owner or distance < owner[doc_id][1]:
+                        owner[doc_id] = (i, distance)
+        
+        return [
+            [
+                Document(page_content=content, metadata=metadata or {})
+                for rank, (doc_id, content, metadata, _) in enumerate(query_hits)
+                if not deduplicate or rank < min_hits or owner[doc_id][0] == i
+            ]
+            for i, query_hits in enumerate(hits)
+        ]
+    
+    def iter_file_documents(self, file_path: str) -> Iterator[Document]:
+        """流式加载单个文件，逐块产出 Document"""
+        for chunk in self.loader.iter_file(Path(file_path)):
+            metadata = {key: value for key, value in chunk.items() if key != 'content'}
+            yield Document(page_content=chunk['content'], metadata=metadata)
+    
+    async def add_documents(self, 
+                          documents: Iterable[Document], 
+                          metadata: Optional[Dict] = None,
+                          batch_size: int = 64) -> int:
+        """添加文档
+
+        documents 可以是生成器（如 iter_file_documents），按 batch_size 分批写入，
+        内存中最多保留一批文档。返回写入的文档数。
+        """
+        added = 0
+        for batch in _batched(documents, batch_size):
+            if metadata:
+                for doc in batch:
+                    doc.metadata.update(metadata)
+            
+            processed_docs = self._process_documents([
+                {'content': doc.page_content, 'metadata': doc.metadata}
+                for doc in batch
+            ])
+            
+            # 追踪每个文档的 token 使用情况
+            for doc in processed_docs:
+                try:
+                    await self._track_embedding_usage(doc.page_content)
+                except Exception as e:
+                    print(f"Token 统计错误: {e}")
+            
+            self.store.add_documents(processed_docs)
+            added += len(processed_docs)
         
-        self.store.add_documents(processed_docs)
+        if added:
+            self._bump_version()
+        return added
+    
+    def add_embedded_documents(self,
+                               documents: List[Document],
+                               vectors: List[List[float]],
+                               ids: Optional[List[str]] = None) -> List[str]:
+        """写入已向量化的文档块，不再调用 Embedding，也不更新版本标识
+
+        相同 ID 的文档块会被覆盖，重复导入同一文件是幂等的。
+        """
+        ids = ids or [uuid.uuid4().hex for _ in documents]
+        self.collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata or None for doc in documents]
+        )
+        return ids
+    
+    async def ingest_directory(self, directory: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """并行导入目录中的所有文档，参数见 IngestionPipeline"""
+        from .ingestion import IngestionPipeline
+        pipeline = IngestionPipeline(self, **kwargs)
+        stats = await pipeline.run(directory or str(self.docs_dir))
+        return stats.to_dict()
     
-    def delete_documents(self, document_ids: List[str]):
-        """删除文档"""
-        self.store.delete(document_ids)
\ No newline at end of file
+    def delete_documents(self, document_ids: List[str], bump_version: bool = True):
+        """删除文档，批量操作可关闭 bump_version 并在结束时统一更新版本"""
+        self.store.delete(document_ids)
+        if bump_version:
+            self._bump_version()
\ No newline at end of file
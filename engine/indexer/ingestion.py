@@ -0,0 +1,429 @@
+"""目录导入流水线
+
+发现文件 -> 进程池解析分块 -> 组批 -> 并发向量化 -> 写入 DocumentStore。
+各阶段之间用有界队列连接，下游变慢时上游自动等待，内存占用与目录大小无关。
+解析进程把文档块逐个写入临时文件，主进程按批读回，单个大文件也不会整体驻留内存。
+默认增量导入：按 document_index.json 清单跳过未变化的文件，并删除已移除文件的文档块。
+
+用法：
+    python -m engine.indexer.ingestion /path/to/docs --parse-workers 8 --embed-concurrency 4
+"""
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from langchain_core.documents import Document
+from .document_loader import DocumentLoader
+from .manifest import IndexManifest, MANIFEST_FILE, file_hash
+
+if TYPE_CHECKING:
+    from .document_store import DocumentStore
+
+# 每个解析进程各自持有一个加载器，首次解析时创建
+_worker_loader: Optional[DocumentLoader] = None
+
+def spill_chunks(chunks: Iterable[Dict], spill_dir: Optional[str] = None) -> Tuple[str, int]:
+    """把文档块逐行写入临时 JSONL 文件，返回 (文件路径, 块数)"""
+    fd, spill_path = tempfile.mkstemp(prefix="ingest-", suffix=".jsonl", dir=spill_dir)
+    count = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            for chunk in chunks:
+                file.write(json.dumps(chunk, ensure_ascii=False, default=str) + "\n")
+                count += 1
+    except BaseException:
+        os.unlink(spill_path)
+        raise
+    return spill_path, count
+
+def parse_file(path: str,
+               max_tokens_per_chunk: int,
+               known_hash: Optional[str] = None,
+               spill_dir: Optional[str] = None) -> Tuple[str, Optional[str], int]:
+    """在解析进程中计算内容哈希，流式加载分块单个文件并写入临时文件
+
+    返回 (哈希, 临时文件路径, 块数)，文档块不随进程间消息整体返回；
+    内容哈希与 known_hash 相同时不解析，返回 (哈希, None, 0)。
+    """
+    global _worker_loader
+    content_hash = file_hash(path)
+    if content_hash == known_hash:
+        return content_hash, None, 0
+    if _worker_loader is None or _worker_loader.max_tokens_per_chunk != max_tokens_per_chunk:
+        _worker_loader = DocumentLoader(str(Path(path).parent), max_tokens_per_chunk)
+    spill_path, count = spill_chunks(_worker_loader.iter_file(Path(path)), spill_dir)
+    return content_hash, spill_path, count
+
+def _read_lines(file: IO[str], count: int) -> List[str]:
+    return list(islice(file, count))
+
+def chunk_id(source: str, index: int) -> str:
+    """文档块 ID 由文件路径和块序号决定，重复导入同一文件时覆盖旧的块"""
+    return hashlib.sha1(f"{source}\x00{index}".encode("utf-8")).hexdigest()
+
+@dataclass
+class IngestionStats:
+    """导入进度与吞吐统计"""
+    files_discovered: int = 0
+    files_parsed: int = 0
+    files_failed: int = 0
+    files_unchanged: int = 0
+    files_removed: int = 0
+    chunks: int = 0
+    chunks_embedded: int = 0
+    chunks_written: int = 0
+    chunks_failed: int = 0
+    chunks_deleted: int = 0
+    tokens: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            "files_discovered": self.files_discovered,
+            "files_parsed": self.files_parsed,
+            "files_failed": self.files_failed,
+            "files_unchanged": self.files_unchanged,
+            "files_removed": self.files_removed,
+            "chunks": self.chunks,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_written": self.chunks_written,
+            "chunks_failed": self.chunks_failed,
+            "chunks_deleted": self.chunks_deleted,
+            "tokens": self.tokens,
+            "elapsed": round(elapsed, 3),
+            "files_per_second": self.files_parsed / elapsed if elapsed > 0 else 0.0,
+            "chunks_per_second": self.chunks_written / elapsed if elapsed > 0 else 0.0,
+            "failures": [{"source": source, "error": error} for source, error in self.failures]
+        }
+
+class IngestionPipeline:
+    """并行目录导入流水线
+
+    PDF / Word 解析是 CPU 密集型的，在进程池中进行，分块随解析一起在子进程完成；
+    主进程把文档块按 embed_batch_size 组批，以 embed_concurrency 个并发请求向量化后写入向量库。
+    单个文件解析失败或单批向量化失败只记入统计，写入失败时终止导入。
+
+    incremental 为 True 时，修改时间和大小未变的文件直接跳过，变化的文件在子进程中比较内容哈希，
+    内容相同时不重新解析；文件的所有文档块写入后才记入清单，失败的文件下次导入时重试。
+    """
+    def __init__(self,
+                 store: "DocumentStore",
+                 parse_workers: Optional[int] = None,
+                 embed_concurrency: int = 4,
+                 embed_batch_size: int = 64,
+                 queue_size: int = 256,
+                 max_tokens_per_chunk: int = 1000,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 progress_interval: float = 5.0,
+                 executor: Optional[Executor] = None,
+                 manifest: Optional[IndexManifest] = None,
+                 incremental: bool = True,
+                 checkpoint_interval: float = 30.0,
+                 spill_dir: Optional[str] = None):
+        self.store = store
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.embed_concurrency = embed_concurrency
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.max_tokens_per_chunk = max_tokens_per_chunk
+        self.progress = progress
+        self.progress_interval = progress_interval
+        # 未指定时每次运行创建进程池
+        self.executor = executor
+        self.parse_file = parse_file
+        # 解析结果临时文件所在目录，None 时使用系统临时目录
+        self.spill_dir = spill_dir
+        if manifest is None:
+            manifest = IndexManifest(str(Path(store.index_dir) / MANIFEST_FILE))
+        self.manifest = manifest
+        self.incremental = incremental
+        # 每隔 checkpoint_interval 秒保存一次清单，中断后已完成的文件不必重做
+        self.checkpoint_interval = checkpoint_interval
+        self.stats = IngestionStats()
+        self._last_progress = 0.0
+        self._last_checkpoint = 0.0
+        # 本次发现的文件，以及尚未全部写入的文件：路径 -> 剩余块数、是否失败、清单条目
+        self._seen: set = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def discover(directory: str) -> Iterator[Path]:
+        """递归列出支持格式的文件，跳过隐藏文件和 Office 临时文件"""
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+            for name in sorted(files):
+                if name.startswith((".", "~$")):
+                    continue
+                path = Path(root) / name
+                if path.suffix.lower() in DocumentLoader.LOADERS:
+                    yield path
+
+    async def run(self, directory: str) -> IngestionStats:
+        """导入目录中的所有文档，返回统计"""
+        # 清单以绝对路径为键
+        directory = str(Path(directory).resolve())
+        self.stats = IngestionStats()
+        self._last_progress = 0.0
+        self._last_checkpoint = time.perf_counter()
+        self._seen = set()
+        self._pending = {}
+        files: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(self.queue_size)
+        batches: asyncio.Queue = asyncio.Queue(self.embed_concurrency * 2)
+        embedded: asyncio.Queue = asyncio.Queue(self.embed_concurrency * 2)
+        executor = self.executor or ProcessPoolExecutor(max_workers=self.parse_workers)
+
+        tasks = [asyncio.create_task(stage) for stage in (
+            self._discover(directory, files),
+            self._workers(self.parse_workers, lambda: self._parse(files, chunks, executor), chunks),
+            self._batch(chunks, batches),
+            self._workers(self.embed_concurrency, lambda: self._embed(batches, embedded), embedded),
+            self._write(embedded)
+        )]
+        try:
+            await asyncio.gather(*tasks)
+            # 只有完整遍历目录后才能确定哪些文件已被删除
+            self._remove_missing(directory)
+        except BaseException:
+            # 任一阶段异常时取消其余阶段，避免阻塞在已满的队列上
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            self.stats.finished_at = time.perf_counter()
+            if self.stats.chunks_written or self.stats.chunks_deleted:
+                self.store._bump_version()
+            self.manifest.save()
+            self._report(force=True)
+        return self.stats
+
+    async def _workers(self, count: int, worker: Callable, output: asyncio.Queue):
+        """并发运行 count 个 worker，全部结束后向下游发送结束标记"""
+        await asyncio.gather(*(worker() for _ in range(count)))
+        await output.put(None)
+
+    async def _discover(self, directory: str, files: asyncio.Queue):
+        for path in self.discover(directory):
+            self.stats.files_discovered += 1
+            self._seen.add(str(path))
+            try:
+                stat = path.stat()
+            except OSError as e:
+                print(f"读取文件信息失败 {path}: {e}")
+                self.stats.files_failed += 1
+                self.stats.failures.append((str(path), str(e)))
+                continue
+            entry = self.manifest.get(str(path))
+            if self.incremental and self.manifest.unchanged(entry, stat):
+                self.stats.files_unchanged += 1
+                continue
+            await files.put((path, stat, entry))
+        # 每个解析 worker 一个结束标记
+        for _ in range(self.parse_workers):
+            await files.put(None)
+
+    async def _parse(self, files: asyncio.Queue, chunks: asyncio.Queue, executor: Executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await files.get()
+            if item is None:
+                return
+            path, stat, entry = item
+            source = str(path)
+            known_hash = entry["content_hash"] if entry and self.incremental else None
+            try:
+                content_hash, spill_path, count = await loop.run_in_executor(
+                    executor, self.parse_file, source, self.max_tokens_per_chunk, known_hash, self.spill_dir
+                )
+            except Exception as e:
+                print(f"文件解析失败 {path}: {e}")
+                self.stats.files_failed += 1
+                self.stats.failures.append((source, str(e)))
+                continue
+            if spill_path is None:
+                # 只有修改时间变化，内容未变
+                self.stats.files_unchanged += 1
+                self.manifest.set(source, content_hash, stat.st_mtime, stat.st_size, entry["chunk_ids"])
+                continue
+            self.stats.files_parsed += 1
+            ids = [chunk_id(source, i) for i in range(count)]
+            self._pending[source] = {
+                "remaining": count,
+                "failed": False,
+                "entry": (content_hash, stat.st_mtime, stat.st_size, ids)
+            }
+            if not count:
+                self._finish(source)
+            try:
+                await self._read_spill(spill_path, source, ids, chunks)
+            finally:
+                os.unlink(spill_path)
+
+    async def _read_spill(self, spill_path: str, source: str, ids: List[str], chunks: asyncio.Queue):
+        """按 embed_batch_size 分批从临时文件读回文档块，下游队列满时暂停读取"""
+        loop = asyncio.get_running_loop()
+        doc_ids = iter(ids)
+        with open(spill_path, encoding="utf-8") as file:
+            while True:
+                lines = await loop.run_in_executor(None, _read_lines, file, self.embed_batch_size)
+                if not lines:
+                    return
+                for line in lines:
+                    await chunks.put((next(doc_ids), source, json.loads(line)))
+
+    async def _batch(self, chunks: asyncio.Queue, batches: asyncio.Queue):
+        batch = []
+        while True:
+            item = await chunks.get()
+            if item is None:
+                break
+            doc_id, source, chunk = item
+            metadata = {key: value for key, value in chunk.items() if key != 'content'}
+            batch.append((doc_id, source, Document(page_content=chunk['content'], metadata=metadata)))
+            self.stats.chunks += 1
+            self.stats.tokens += chunk.get('token_count', 0)
+            if len(batch) >= self.embed_batch_size:
+                await batches.put(batch)
+                batch = []
+        if batch:
+            await batches.put(batch)
+        # 每个向量化 worker 一个结束标记
+        for _ in range(self.embed_concurrency):
+            await batches.put(None)
+
+    async def _embed(self, batches: asyncio.Queue, embedded: asyncio.Queue):
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                return
+            ids = [doc_id for doc_id, _, _ in batch]
+            sources = [source for _, source, _ in batch]
+            documents = [doc for _, _, doc in batch]
+            try:
+                vectors = await self.store.embeddings.aembed_documents([doc.page_content for doc in documents])
+            except Exception as e:
+                print(f"向量化失败（{len(documents)} 个文档块）: {e}")
+                self.stats.chunks_failed += len(documents)
+                self._settle(sources, failed=True)
+                continue
+            self.stats.chunks_embedded += len(documents)
+            await embedded.put((ids, sources, documents, vectors))
+
+    async def _write(self, embedded: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await embedded.get()
+            if item is None:
+                return
+            ids, sources, documents, vectors = item
+            # 向量库写入是同步调用，放到线程中执行
+            await loop.run_in_executor(None, self.store.add_embedded_documents, documents, vectors, ids)
+            self.stats.chunks_written += len(documents)
+            self._settle(sources)
+            self._checkpoint()
+            self._report()
+
+    def _settle(self, sources: List[str], failed: bool = False):
+        """记录已写入或失败的文档块，文件的所有块都处理完后更新清单"""
+        for source in sources:
+            pending = self._pending[source]
+            pending["remaining"] -= 1
+            pending["failed"] = pending["failed"] or failed
+            if pending["remaining"] == 0:
+                self._finish(source)
+
+    def _finish(self, source: str):
+        pending = self._pending.pop(source)
+        if pending["failed"]:
+            # 不记入清单，下次导入时重试
+            return
+        content_hash, mtime, size, ids = pending["entry"]
+        # 文件变短后多出来的旧文档块
+        old = self.manifest.get(source)
+        stale = sorted(set(old["chunk_ids"]) - set(ids)) if old else []
+        if stale:
+            self._delete(stale)
+        self.manifest.set(source, content_hash, mtime, size, ids)
+
+    def _remove_missing(self, directory: str):
+        """删除清单中存在、目录中已不存在的文件的文档块"""
+        missing = [path for path in self.manifest.paths(directory) if path not in self._seen]
+        ids = [doc_id for path in missing for doc_id in self.manifest.get(path)["chunk_ids"]]
+        if ids:
+            self._delete(ids)
+        for path in missing:
+            self.manifest.remove(path)
+        self.stats.files_removed = len(missing)
+
+    def _delete(self, ids: List[str]):
+        self.store.delete_documents(ids, bump_version=False)
+        self.stats.chunks_deleted += len(ids)
+
+    def _checkpoint(self):
+        now = time.perf_counter()
+        if now - self._last_checkpoint >= self.checkpoint_interval:
+            self._last_checkpoint = now
+            self.manifest.save()
+
+    def _report(self, force: bool = False):
+        if self.progress is None:
+            return
+        now = time.perf_counter()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.progress(self.stats.to_dict())
+
+def _print_progress(stats: Dict[str, Any]):
+    print(
+        f"文件 {stats['files_parsed']}/{stats['files_discovered']}"
+        f"（未变化 {stats['files_unchanged']}，失败 {stats['files_failed']}），"
+        f"文档块 {stats['chunks_written']}/{stats['chunks']}，"
+        f"{stats['files_per_second']:.1f} 文件/秒，{stats['chunks_per_second']:.1f} 块/秒"
+    )
+
+if __name__ == "__main__":
+    from .document_store import DocumentStore, DEFAULT_INDEX_DIR
+
+    parser = argparse.ArgumentParser(description="并行导入目录中的文档到向量库")
+    parser.add_argument("directory", help="文档目录")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="向量库目录")
+    parser.add_argument("--parse-workers", type=int, default=None, help="解析进程数，默认为 CPU 核数")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="并发向量化请求数")
+    parser.add_argument("--embed-batch-size", type=int, default=64, help="每个向量化请求的文档块数")
+    parser.add_argument("--queue-size", type=int, default=256, help="阶段间队列容量")
+    parser.add_argument("--max-tokens-per-chunk", type=int, default=1000, help="每个文档块的最大 token 数")
+    parser.add_argument("--full", action="store_true", help="忽略清单，重新解析和向量化所有文件")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="进度输出间隔（秒）")
+    args = parser.parse_args()
+
+    store = DocumentStore(docs_dir=args.directory, index_dir=args.index_dir)
+    stats = asyncio.run(store.ingest_directory(
+        args.directory,
+        parse_workers=args.parse_workers,
+        embed_concurrency=args.embed_concurrency,
+        embed_batch_size=args.embed_batch_size,
+        queue_size=args.queue_size,
+        max_tokens_per_chunk=args.max_tokens_per_chunk,
+        progress=_print_progress,
+        progress_interval=args.progress_interval,
+        incremental=not args.full
+    ))
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -0,0 +1,76 @@
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_FILE = "document_index.json"
+
+def file_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    """按块计算文件内容的 SHA-256，不把整个文件读入内存"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IndexManifest:
+    """已索引文件清单，记录每个文件的内容哈希、修改时间、大小和生成的文档块 ID
+
+    保存为 document_index.json 中的条目列表，重新索引时据此只处理新增或变化的文件。
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8") or "[]")
+        except FileNotFoundError:
+            data = []
+        except (OSError, ValueError) as e:
+            # 清单损坏时按空清单处理，所有文件都会重新索引
+            print(f"读取索引清单失败: {e}")
+            data = []
+        self.entries = {entry["path"]: entry for entry in data if isinstance(entry, dict) and "path" in entry}
+
+    def save(self):
+        """先写临时文件再替换，中途退出不会留下半个清单"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps(sorted(self.entries.values(), key=lambda entry: entry["path"]), ensure_ascii=False, indent=2),
+            encoding="utf-8"
+        )
+        os.replace(tmp_path, self.path)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(path)
+
+    def set(self, path: str, content_hash: str, mtime: float, size: int, chunk_ids: List[str]):
+        self.entries[path] = {
+            "path": path,
+            "content_hash": content_hash,
+            "mtime": mtime,
+            "size": size,
+            "chunk_ids": list(chunk_ids),
+            "indexed_at": time.time()
+        }
+
+    def remove(self, path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.pop(path, None)
+
+    def paths(self, directory: str) -> List[str]:
+        """清单中位于 directory 下的文件"""
+        prefix = os.path.join(directory, "")
+        return [path for path in self.entries if path.startswith(prefix)]
+
+    @staticmethod
+    def unchanged(entry: Optional[Dict[str, Any]], stat: os.stat_result) -> bool:
+        """修改时间和大小都未变时认为文件未变，无需计算哈希"""
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -3,7 +3,7 @@ from typing import Dict, List, Optional, Union
 import json
 from datetime import datetime
 from pathlib import Path
-import tiktoken
+from .resources import resources
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
@@ -37,12 +37,8 @@ class CostTracker:
             "gpt-4o": {"input": 15.0, "output": 60.0},  # 添加新模型
         }
         
-        # 初始化 tokenizer
-        try:
-            self.tokenizer = tiktoken.encoding_for_model("gpt-4o")
-        except Exception as e:
-            print(f"初始化 tokenizer 失败: {e}")
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 进程内共享的 token 计数器
+        self.token_counter = resources.token_counter("gpt-4o")
         
         # 初始化线程池
         self.executor = ThreadPoolExecutor(max_workers=4)
@@ -51,7 +47,7 @@ class CostTracker:
     def count_tokens(self, text: str) -> int:
         """计算文本的 token 数量"""
         try:
-            return len(self.tokenizer.encode(text))
+            return self.token_counter.count(text)
         except Exception as e:
             print(f"计算 token 失败: {e}")
             return 0
@@ -78,26 +74,11 @@ class CostTracker:
                          session_id: str,
                          task_type: str,
                          thinking_time: float = 0.0):
-        """记录API使用情况，使用本地 token 计算"""
+        """记录API使用情况，优先使用服务端返回的 token 使用量，缺失时在本地估算"""
         try:
-            # 直接使用 tiktoken 计算 token
-            total_tokens = self.count_tokens(content)
-            # 根据任务类型估算输入输出比例
-            if task_type in ["chat", "completion"]:
-                prompt_ratio = 0.3
-            elif task_type in ["embedding", "search"]:
-                prompt_ratio = 0.8
-            else:
-                prompt_ratio = 0.5
-                
-            prompt_tokens = int(total_tokens * prompt_ratio)
-            completion_tokens = total_tokens - prompt_tokens
-            
-            token_usage = TokenUsage(
-                prompt_tokens=prompt_tokens,
-                completion_tokens=completion_tokens,
-                total_tokens=total_tokens
-            )
+            token_usage = self._reported_usage(token_usage)
+            if token_usage is None:
+                token_usage = self._estimate_usage(content, task_type)
             
             cost = self.calculate_cost(
                 token_usage.prompt_tokens,
@@ -121,6 +102,41 @@ class CostTracker:
         except Exception as e:
             print(f"记录使用情况失败: {e}")
 
+    @staticmethod
+    def _reported_usage(token_usage: Union[Dict, TokenUsage, None]) -> Optional[TokenUsage]:
+        """规范化调用方传入的 token 使用量，没有有效数据时返回 None"""
+        if isinstance(token_usage, TokenUsage):
+            return token_usage if token_usage.total_tokens > 0 else None
+        if not isinstance(token_usage, dict) or not token_usage.get("total_tokens"):
+            return None
+        total_tokens = token_usage["total_tokens"]
+        completion_tokens = token_usage.get("completion_tokens") or 0
+        # 旧格式只有 completion_tokens 和 total_tokens，输入部分由两者相减得到
+        prompt_tokens = token_usage.get("prompt_tokens") or max(0, total_tokens - completion_tokens)
+        return TokenUsage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
+            reasoning_tokens=token_usage.get("reasoning_tokens")
+        )
+
+    def _estimate_usage(self, content: str, task_type: str) -> TokenUsage:
+        """按文本在本地计算 token 数，并按任务类型估算输入输出比例"""
+        total_tokens = self.count_tokens(content)
+        if task_type in ["chat", "completion"]:
+            prompt_ratio = 0.3
+        elif task_type in ["embedding", "search"]:
+            prompt_ratio = 0.8
+        else:
+            prompt_ratio = 0.5
+            
+        prompt_tokens = int(total_tokens * prompt_ratio)
+        return TokenUsage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=total_tokens - prompt_tokens,
+            total_tokens=total_tokens
+        )
+
     async def _save_usage(self, usage: APIUsage):
         """保存使用记录，添加并发控制"""
         try:
@@ -0,0 +1,159 @@
+from typing import Dict, List, Optional, Sequence, Any
+from enum import Enum
+import threading
+
+# 默认耗时分桶（秒），覆盖从本地校验到多轮 LLM 调用的区间
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    """固定分桶直方图"""
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """根据分桶估算分位数，桶内按线性插值"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if cumulative + self.counts[i] >= rank:
+                if self.counts[i] == 0:
+                    return bound
+                fraction = (rank - cumulative) / self.counts[i]
+                return lower + (bound - lower) * fraction
+            cumulative += self.counts[i]
+            lower = bound
+        # 落在 +Inf 桶中时用观测到的最大值
+        return self.max
+
+    def cumulative_counts(self) -> List[int]:
+        """返回 Prometheus 风格的累计计数（包含 +Inf 桶）"""
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+class WorkflowMetrics:
+    """工作流各阶段的进程内指标：耗时直方图、token 数和错误数"""
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, namespace: str = "llm_search"):
+        self.buckets = tuple(sorted(buckets))
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.durations: Dict[str, Histogram] = {}
+        self.tokens: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(stage: Any) -> str:
+        """阶段键统一使用 EventType 的取值"""
+        return stage.value if isinstance(stage, Enum) else str(stage)
+
+    def record(self, stage: Any, duration: float, tokens: int = 0, error: bool = False):
+        """记录一次阶段执行"""
+        key = self._key(stage)
+        with self._lock:
+            histogram = self.durations.get(key)
+            if histogram is None:
+                histogram = self.durations[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+            self.tokens[key] = self.tokens.get(key, 0) + int(tokens or 0)
+            self.errors[key] = self.errors.get(key, 0) + (1 if error else 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回各阶段指标的快照"""
+        with self._lock:
+            return {
+                key: {
+                    **histogram.snapshot(),
+                    "tokens": self.tokens.get(key, 0),
+                    "errors": self.errors.get(key, 0)
+                }
+                for key, histogram in self.durations.items()
+            }
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self.durations.clear()
+            self.tokens.clear()
+            self.errors.clear()
+
+    def to_prometheus(self) -> str:
+        """导出 Prometheus 文本格式"""
+        duration_name = f"{self.namespace}_stage_duration_seconds"
+        tokens_name = f"{self.namespace}_stage_tokens_total"
+        errors_name = f"{self.namespace}_stage_errors_total"
+
+        with self._lock:
+            lines = [
+                f"# HELP {duration_name} Workflow stage duration in seconds.",
+                f"# TYPE {duration_name} histogram"
+            ]
+            for key, histogram in sorted(self.durations.items()):
+                bounds = [_format_float(b) for b in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{duration_name}_bucket{{stage="{key}",le="{bound}"}} {count}')
+                lines.append(f'{duration_name}_sum{{stage="{key}"}} {_format_float(histogram.sum)}')
+                lines.append(f'{duration_name}_count{{stage="{key}"}} {histogram.count}')
+
+            lines += [
+                f"# HELP {tokens_name} Tokens consumed by workflow stage.",
+                f"# TYPE {tokens_name} counter"
+            ]
+            for key, value in sorted(self.tokens.items()):
+                lines.append(f'{tokens_name}{{stage="{key}"}} {value}')
+
+            lines += [
+                f"# HELP {errors_name} Failed executions of workflow stage.",
+                f"# TYPE {errors_name} counter"
+            ]
+            for key, value in sorted(self.errors.items()):
+                lines.append(f'{errors_name}{{stage="{key}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
+
+def total_tokens(token_usage: Optional[Any]) -> int:
+    """从字典或 TokenUsage 对象中读取 total_tokens"""
+    if token_usage is None:
+        return 0
+    if isinstance(token_usage, dict):
+        return int(token_usage.get("total_tokens", 0) or 0)
+    return int(getattr(token_usage, "total_tokens", 0) or 0)
+
+# 全局指标实例，同一进程内的协调器共享
+workflow_metrics = WorkflowMetrics()
@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+import asyncio
+import threading
+from ..web.apiconfig import config
+
+class ResourceRegistry:
+    """进程级共享资源注册表
+
+    LLM 客户端、tokenizer、向量库和 HTTP 会话等重量级资源在首次使用时才创建，
+    同一进程内的所有组件共享同一份实例。
+    """
+    def __init__(self):
+        self._resources: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+        self._http_session = None
+        self._http_session_loop = None
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """获取资源，不存在时调用 factory 创建"""
+        resource = self._resources.get(key)
+        if resource is None:
+            with self._lock:
+                resource = self._resources.get(key)
+                if resource is None:
+                    resource = factory()
+                    self._resources[key] = resource
+        return resource
+
+    def register(self, key: Hashable, resource: Any):
+        """注册或替换资源（例如在测试中注入替身）"""
+        with self._lock:
+            self._resources[key] = resource
+
+    def clear(self):
+        """清空已创建的资源"""
+        with self._lock:
+            self._resources.clear()
+
+    def tokenizer(self, model: str = "gpt-4o"):
+        """获取模型对应的 tokenizer，未知模型回退到 cl100k_base"""
+        def create():
+            import tiktoken
+            try:
+                return tiktoken.encoding_for_model(model)
+            except Exception as e:
+                print(f"初始化 tokenizer 失败: {e}")
+                return tiktoken.get_encoding("cl100k_base")
+        return self.get(("tokenizer", model), create)
+
+    def token_counter(self, model: str = "gpt-4o"):
+        """获取模型对应的带缓存 token 计数器"""
+        def create():
+            from .tokens import TokenCounter
+            return TokenCounter(self.tokenizer(model))
+        return self.get(("token_counter", model), create)
+
+    def chat_llm(self, temperature: Optional[float] = None):
+        """获取 LangChain 的 Azure 聊天模型"""
+        def create():
+            from langchain_openai import AzureChatOpenAI
+            kwargs = {
+                "azure_endpoint": config.api.azure_openai["azure_endpoint"],
+                "api_key": config.api.azure_openai["api_key"],
+                "api_version": config.api.azure_openai["api_version"],
+                "model": config.api.azure_openai["model"],
+                # 流式输出时在最后一个块中返回 token 使用量
+                "stream_usage": True
+            }
+            if temperature is not None:
+                kwargs["temperature"] = temperature
+            return AzureChatOpenAI(**kwargs)
+        return self.get(("chat_llm", temperature), create)
+
+    def openai_client(self):
+        """获取 OpenAI SDK 的 Azure 客户端"""
+        def create():
+            from openai import AzureOpenAI
+            return AzureOpenAI(
+                api_key=config.api.azure_openai["api_key"],
+                api_version=config.api.azure_openai["api_version"],
+                azure_endpoint=config.api.azure_openai["azure_endpoint"]
+            )
+        return self.get("openai_client", create)
+
+    def embeddings(self, embedding_config: Optional[Dict[str, Any]] = None):
+        """获取 Azure Embeddings 客户端"""
+        embedding_config = embedding_config or config.api.embedding
+
+        def create():
+            from langchain_openai import AzureOpenAIEmbeddings
+            return AzureOpenAIEmbeddings(**embedding_config)
+        return self.get(("embeddings", tuple(sorted(embedding_config.items()))), create)
+
+    def document_store(self):
+        """获取默认配置的文档向量库"""
+        def create():
+            from ..indexer.document_store import DocumentStore
+            return DocumentStore()
+        return self.get("document_store", create)
+
+    async def http_session(self):
+        """获取当前事件循环上共享的 aiohttp 会话"""
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        session = self._http_session
+        # aiohttp 会话绑定事件循环，循环变化或会话已关闭时重新创建
+        if session is None or session.closed or self._http_session_loop is not loop:
+            if session is not None:
+                # 先关闭绑定在旧循环上的会话，释放其连接池
+                await self._close_session(session)
+            session = aiohttp.ClientSession()
+            self._http_session = session
+            self._http_session_loop = loop
+        return session
+
+    async def aclose(self):
+        """关闭共享的 HTTP 会话"""
+        if self._http_session is not None:
+            await self._close_session(self._http_session)
+        self._http_session = None
+        self._http_session_loop = None
+
+    @staticmethod
+    async def _close_session(session):
+        if session.closed:
+            return
+        try:
+            await session.close()
+        except Exception as e:
+            # 旧事件循环已关闭时连接可能无法正常断开，只记录错误
+            print(f"关闭 HTTP 会话失败: {e}")
+
+# 全局资源注册表实例
+resources = ResourceRegistry()
@@ -0,0 +1,108 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import math
+from .cache import TTLCache
+
+def approximate_tokens(text: str) -> int:
+    """不编码的近似 token 数：ASCII 约 4 个字符一个 token，其他字符各算一个"""
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return math.ceil(ascii_chars / 4) + len(text) - ascii_chars
+
+class TokenCounter:
+    """带缓存的 token 计数
+
+    同一模型的所有组件共享一个实例，计数结果按文本哈希 LRU 缓存；
+    count_many 对未命中的文本使用 tiktoken 的多线程批量编码。
+    """
+    def __init__(self, tokenizer: Any, cache_size: int = 8192, num_threads: int = 4):
+        self.tokenizer = tokenizer
+        self.num_threads = num_threads
+        self._cache = TTLCache(max_size=cache_size)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def count(self, text: str, approximate: bool = False) -> int:
+        """计算文本的 token 数量，approximate 为 True 时只做近似估计"""
+        if not text:
+            return 0
+        if approximate:
+            return approximate_tokens(text)
+        key = self._key(text)
+        tokens = self._cache.get(key)
+        if tokens is None:
+            tokens = len(self.tokenizer.encode(text))
+            self._cache.set(key, tokens)
+        return tokens
+
+    def count_many(self, texts: List[str], approximate: bool = False) -> List[int]:
+        """批量计算 token 数量"""
+        if approximate:
+            return [approximate_tokens(text) if text else 0 for text in texts]
+
+        counts = [0] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            key = self._key(text)
+            tokens = self._cache.get(key)
+            if tokens is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                counts[i] = tokens
+
+        if missing:
+            pending = [texts[indexes[0]] for indexes in missing.values()]
+            encode_batch = getattr(self.tokenizer, "encode_batch", None)
+            if encode_batch is not None and len(pending) > 1:
+                encoded = encode_batch(pending, num_threads=self.num_threads)
+            else:
+                encoded = [self.tokenizer.encode(text) for text in pending]
+            for (key, indexes), tokens in zip(missing.items(), encoded):
+                self._cache.set(key, len(tokens))
+                for i in indexes:
+                    counts[i] = len(tokens)
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+def usage_from_response(response: Any) -> Optional[Dict[str, int]]:
+    """提取模型响应中服务端返回的 token 使用量，没有时返回 None
+
+    支持 LangChain 消息的 usage_metadata / response_metadata["token_usage"]
+    以及 OpenAI SDK 响应的 usage 字段。
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), int):
+        return {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage["total_tokens"]
+        }
+
+    metadata = getattr(response, "response_metadata", None)
+    usage = metadata.get("token_usage") if isinstance(metadata, dict) else getattr(response, "usage", None)
+    return usage_from_dict(usage)
+
+def usage_from_dict(usage: Any) -> Optional[Dict[str, int]]:
+    """规范化 OpenAI 格式（prompt_tokens / completion_tokens / total_tokens）的使用量"""
+    if usage is not None and not isinstance(usage, dict):
+        usage = {key: getattr(usage, key, None) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), int):
+        return {
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "total_tokens": usage["total_tokens"]
+        }
+    return None
+
+def add_usage(total: Optional[Dict[str, int]], usage: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """累加两份 token 使用量"""
+    if not usage:
+        return total
+    if not total:
+        return dict(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
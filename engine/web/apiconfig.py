@@ -47,6 +47,8 @@ class Config:
         
         if os.getenv("BING_API_KEY"):
             self.api.bing_search["api_key"] = os.getenv("BING_API_KEY")
+        if os.getenv("BING_SEARCH_ENDPOINT"):
+            self.api.bing_search["endpoint"] = os.getenv("BING_SEARCH_ENDPOINT")
 
 # 全局配置实例
 config = Config()
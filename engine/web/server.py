@@ -0,0 +1,447 @@
+"""异步 HTTP 服务入口
+
+基于 asyncio 标准库实现，每个进程持有一个预热的 WorkflowCoordinator。
+
+接口：
+    POST /query    {"query": ..., "session_id": ..., "timeout": ...}
+    POST /batch    {"queries": [{"query": ..., "session_id": ...}], "timeout": ...}
+    POST /stream   与 /query 参数相同，以 Server-Sent Events 逐个推送工作流事件
+    GET  /health   健康检查
+    GET  /metrics  Prometheus 文本格式的阶段指标
+
+准入控制拒绝的请求返回 429（排队已满）或 503（预计超过截止时间），并带 Retry-After 响应头。
+
+用法：
+    python -m engine.web.server --host 127.0.0.1 --port 8000
+"""
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import asyncio
+import json
+import math
+import time
+import uuid
+
+if TYPE_CHECKING:
+    from ..core.workflow_coordinator import WorkflowCoordinator
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout"
+}
+
+class HTTPError(Exception):
+    """请求处理错误，携带 HTTP 状态码，body 为空时响应体为 {"error": message}"""
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None,
+                 body: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+class Request:
+    """解析后的 HTTP 请求"""
+    def __init__(self, method: str, path: str, version: str, headers: Dict[str, str], body: bytes,
+                 query: Optional[Dict[str, List[str]]] = None):
+        self.method = method
+        self.path = path
+        self.query = query or {}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的 JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象")
+        return data
+
+# 处理函数返回 (状态码, 响应体, Content-Type)，自行写出响应（如 SSE）时返回 None
+Response = Optional[Tuple[int, str, str]]
+
+# 准入拒绝原因对应的状态码：队列已满为 429，按截止时间放弃为 503
+ADMISSION_STATUS = {
+    "queue_full": 429,
+    "deadline": 503
+}
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+class HTTPServer:
+    """基于 asyncio streams 的最小 HTTP/1.1 服务，支持 keep-alive 和读取超时
+
+    子类实现 handle 处理单个请求。
+    """
+    name = "HTTP 服务"
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8000,
+                 keep_alive_timeout: float = 15.0,
+                 read_timeout: float = 10.0,
+                 max_body_size: int = 1024 * 1024):
+        self.host = host
+        self.port = port
+        # 空闲连接在两次请求之间保持的时间
+        self.keep_alive_timeout = keep_alive_timeout
+        # 读取请求头和请求体的时限
+        self.read_timeout = read_timeout
+        self.max_body_size = max_body_size
+        self.started_at = time.time()
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def handle(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        raise NotImplementedError
+
+    async def start(self) -> asyncio.AbstractServer:
+        """开始监听，port 为 0 时由系统分配端口"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"{self.name}已启动: http://{self.host}:{self.port}")
+        return self._server
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的多个请求（keep-alive）"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_error(writer, e, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                self.requests += 1
+                keep_alive = await self._dispatch(request, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"连接处理失败: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        """读取一个请求，连接空闲超时或被关闭时返回 None"""
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not line.strip():
+            return None
+
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "无效的请求行")
+
+        try:
+            headers = await asyncio.wait_for(self._read_headers(reader), self.read_timeout)
+            length = int(headers.get("content-length", 0))
+            if length > self.max_body_size:
+                raise HTTPError(413, "请求体过大")
+            body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "读取请求超时")
+        except ValueError:
+            raise HTTPError(400, "无效的 Content-Length")
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, version, headers, body, parse_qs(url.query))
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """处理请求，返回连接是否可以继续复用"""
+        keep_alive = request.keep_alive
+        try:
+            response = await self.handle(request, writer)
+            if response is None:
+                # 处理函数已自行写出响应，且未声明长度，只能关闭连接
+                return False
+            status, body, content_type = response
+            await self._send(writer, status, body, content_type, keep_alive)
+        except HTTPError as e:
+            await self._send_error(writer, e, keep_alive)
+        except Exception as e:
+            print(f"请求处理失败: {e}")
+            await self._send_error(writer, HTTPError(500, f"请求处理失败: {str(e)}"), keep_alive)
+        return keep_alive
+
+    async def _send_error(self, writer: asyncio.StreamWriter, error: HTTPError, keep_alive: bool):
+        payload = _dumps(error.body or {"error": str(error)}).encode("utf-8")
+        writer.write(self._head(error.status, "application/json; charset=utf-8", keep_alive,
+                                len(payload), error.headers) + payload)
+        await writer.drain()
+
+    @staticmethod
+    def _sse(event: Optional[str], data: Any) -> bytes:
+        """编码一条 Server-Sent Event，data 为字符串时原样发送"""
+        payload = data if isinstance(data, str) else _dumps(data)
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {payload}\n\n".encode("utf-8")
+
+    async def _start_sse(self, writer: asyncio.StreamWriter):
+        writer.write(self._head(200, "text/event-stream; charset=utf-8", keep_alive=False, extra={
+            "Cache-Control": "no-cache"
+        }))
+        await writer.drain()
+
+    def _head(self, status: int, content_type: str, keep_alive: bool,
+              length: Optional[int] = None, extra: Optional[Dict[str, str]] = None) -> bytes:
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if keep_alive:
+            lines.append(f"Keep-Alive: timeout={int(self.keep_alive_timeout)}")
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        for name, value in (extra or {}).items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: str,
+                    content_type: str, keep_alive: bool):
+        payload = body.encode("utf-8")
+        if "charset" not in content_type:
+            content_type += "; charset=utf-8"
+        writer.write(self._head(status, content_type, keep_alive, len(payload)) + payload)
+        await writer.drain()
+
+class SearchServer(HTTPServer):
+    """搜索服务：复用同一个协调器处理所有连接上的请求"""
+    name = "搜索服务"
+
+    def __init__(self,
+                 coordinator: Optional["WorkflowCoordinator"] = None,
+                 host: str = "127.0.0.1",
+                 port: int = 8000,
+                 request_timeout: float = 180.0,
+                 keep_alive_timeout: float = 15.0,
+                 read_timeout: float = 10.0,
+                 max_body_size: int = 1024 * 1024):
+        super().__init__(host, port, keep_alive_timeout, read_timeout, max_body_size)
+        self._coordinator = coordinator
+        # 单个请求的处理时限，作为截止时间传给协调器
+        self.request_timeout = request_timeout
+
+    @property
+    def coordinator(self) -> "WorkflowCoordinator":
+        if self._coordinator is None:
+            from ..core.workflow_coordinator import WorkflowCoordinator
+            self._coordinator = WorkflowCoordinator()
+        return self._coordinator
+
+    async def start(self) -> asyncio.AbstractServer:
+        """预热协调器后开始监听"""
+        self.coordinator
+        return await super().start()
+
+    async def handle(self, request: Request, writer: asyncio.StreamWriter) -> Response:
+        routes = {
+            "/query": ("POST", self._handle_query),
+            "/batch": ("POST", self._handle_batch),
+            "/health": ("GET", self._handle_health),
+            "/metrics": ("GET", self._handle_metrics)
+        }
+        if request.path == "/stream":
+            if request.method != "POST":
+                raise HTTPError(405, "不支持的请求方法")
+            await self._handle_stream(request, writer)
+            return None
+
+        if request.path not in routes:
+            raise HTTPError(404, "接口不存在")
+        method, handler = routes[request.path]
+        if request.method != method:
+            raise HTTPError(405, "不支持的请求方法")
+        return await handler(request)
+
+    def _query_params(self, data: Dict[str, Any]) -> Tuple[str, str]:
+        query = data.get("query")
+        if not isinstance(query, str):
+            raise HTTPError(400, "缺少 query 参数")
+        return query, str(data.get("session_id") or uuid.uuid4().hex)
+
+    def _timeout(self, data: Dict[str, Any]) -> float:
+        """请求可以缩短但不能超过服务端的处理时限"""
+        timeout = data.get("timeout")
+        if timeout is None:
+            return self.request_timeout
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "无效的 timeout 参数")
+        if not math.isfinite(timeout) or timeout <= 0:
+            raise HTTPError(400, "timeout 必须是大于 0 的有限数值")
+        return min(timeout, self.request_timeout)
+
+    async def _bounded(self, awaitable, timeout: float):
+        """协调器按截止时间自行降级，这里额外留出少量余量作为兜底"""
+        try:
+            return await asyncio.wait_for(awaitable, timeout + 1.0)
+        except asyncio.TimeoutError:
+            raise HTTPError(504, "请求处理超时")
+
+    def _admission_error(self, result: Dict[str, Any]) -> Optional[Tuple[int, str, Dict[str, str]]]:
+        """结果被准入控制拒绝时返回 (状态码, 错误信息, 响应头)，否则返回 None"""
+        metadata = result.get("metadata") or {}
+        reason = metadata.get("admission_rejected")
+        if reason is None:
+            return None
+        admission = getattr(self.coordinator, "admission", None)
+        wait = admission.estimated_wait() if admission is not None else 0.0
+        headers = {"Retry-After": str(max(1, math.ceil(wait)))}
+        return ADMISSION_STATUS.get(reason, 503), metadata.get("error") or "请求被拒绝", headers
+
+    async def _handle_query(self, request: Request) -> Tuple[int, str, str]:
+        data = request.json()
+        query, session_id = self._query_params(data)
+        timeout = self._timeout(data)
+        result = await self._bounded(
+            self.coordinator.process_query(query, session_id, timeout=timeout), timeout
+        )
+        data = result.dict()
+        rejection = self._admission_error(data)
+        if rejection is not None:
+            raise HTTPError(*rejection, body={"error": rejection[1], **data})
+        return 200, _dumps(data), "application/json"
+
+    async def _handle_batch(self, request: Request) -> Tuple[int, str, str]:
+        data = request.json()
+        items = data.get("queries")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise HTTPError(400, "queries 必须是对象列表")
+        queries = [self._query_params(item) for item in items]
+        timeout = self._timeout(data)
+        results = await self._bounded(
+            self.coordinator.process_queries(queries, timeout=timeout), timeout
+        )
+        data = {"results": [result.dict() for result in results]}
+        # 部分查询命中缓存时仍返回 200，拒绝原因记录在各自结果的 metadata 中
+        rejections = [self._admission_error(result) for result in data["results"]]
+        if rejections and all(rejections):
+            raise HTTPError(*rejections[0], body={"error": rejections[0][1], **data})
+        return 200, _dumps(data), "application/json"
+
+    async def _handle_health(self, request: Request) -> Tuple[int, str, str]:
+        health = {
+            "status": "ok",
+            "uptime": time.time() - self.started_at,
+            "requests": self.requests
+        }
+        admission = getattr(self.coordinator, "admission", None)
+        if admission is not None:
+            health["admission"] = admission.stats()
+        query_parser = getattr(self.coordinator, "query_parser", None)
+        classifier = getattr(query_parser, "classifier", None)
+        if classifier is not None:
+            health["query_routes"] = classifier.stats()
+        decomposition_cache = getattr(query_parser, "cache", None)
+        if decomposition_cache is not None:
+            health["decomposition_cache"] = query_parser.cache_stats()
+        return 200, _dumps(health), "application/json"
+
+    async def _handle_metrics(self, request: Request) -> Tuple[int, str, str]:
+        return 200, self.coordinator.metrics.to_prometheus(), "text/plain; version=0.0.4"
+
+    async def _handle_stream(self, request: Request, writer: asyncio.StreamWriter):
+        """以 SSE 推送工作流事件，事件流结束后关闭连接"""
+        data = request.json()
+        query, session_id = self._query_params(data)
+        timeout = self._timeout(data)
+
+        await self._start_sse(writer)
+
+        events = self.coordinator.astream_query(query, session_id, timeout=timeout)
+        deadline = time.monotonic() + timeout + 1.0
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    writer.write(self._sse("error_occurred", {"error": "请求处理超时"}))
+                    break
+                data = event.data
+                rejection = self._admission_error(data.get("result") or {})
+                if rejection is not None:
+                    # SSE 响应头已发出，拒绝时在错误事件中附带状态码和重试间隔
+                    status, message, headers = rejection
+                    data = {**data, "error": message, "status": status,
+                            "retry_after": int(headers["Retry-After"])}
+                writer.write(self._sse(event.type.value, data))
+                await writer.drain()
+        finally:
+            await events.aclose()
+        await writer.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="启动搜索 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--request-timeout", type=float, default=180.0, help="单个请求的处理时限（秒）")
+    parser.add_argument("--keep-alive", type=float, default=15.0, help="空闲连接保持时间（秒）")
+    args = parser.parse_args()
+
+    server = SearchServer(
+        host=args.host,
+        port=args.port,
+        request_timeout=args.request_timeout,
+        keep_alive_timeout=args.keep_alive
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+import time
+import pytest
+from engine.core.admission import AdmissionController, AdmissionRejected
+from engine.utils.metrics import WorkflowMetrics
+
+@pytest.mark.asyncio
+async def test_max_in_flight_and_fifo_order():
+    controller = AdmissionController(max_in_flight=2, max_queue=10)
+    active = 0
+    max_active = 0
+    order = []
+    
+    async def job(i):
+        nonlocal active, max_active
+        async with controller.admit():
+            order.append(i)
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+    
+    await asyncio.gather(*(job(i) for i in range(6)))
+    
+    assert max_active == 2
+    assert order == list(range(6))
+    assert controller.stats()["in_flight"] == 0
+    assert controller.admitted == 6
+
+@pytest.mark.asyncio
+async def test_queue_full_rejected():
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+    await controller.acquire()
+    waiting = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+    
+    with pytest.raises(AdmissionRejected) as exc:
+        await controller.acquire()
+    assert exc.value.reason == "queue_full"
+    
+    controller.release()
+    await waiting
+    controller.release()
+    assert controller.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_shed_when_wait_exceeds_deadline():
+    metrics = WorkflowMetrics()
+    controller = AdmissionController(max_in_flight=1, max_queue=10, metrics=metrics)
+    await controller.acquire()
+    controller.release(service_time=5.0)
+    await controller.acquire()
+    
+    with pytest.raises(AdmissionRejected) as exc:
+        await controller.acquire(deadline=time.monotonic() + 1.0)
+    assert exc.value.reason == "deadline"
+    assert metrics.snapshot()["admission_queue"]["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_deadline_expires_while_queued():
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    await controller.acquire()
+    
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(deadline=time.monotonic() + 0.02)
+    
+    controller.release()
+    assert controller.in_flight == 0
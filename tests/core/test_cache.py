@@ -0,0 +1,60 @@
+import time
+from engine.utils.cache import TTLCache, SQLiteCache, TieredCache
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+def test_sqlite_cache_roundtrip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.set("a", {"answer": "回答"})
+    cache.set("b", {"answer": "b"})
+    cache.get("a")
+    cache.set("c", {"answer": "c"})
+    
+    assert cache.get("a") == {"answer": "回答"}
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+def test_sqlite_cache_purges_expired_rows_on_write(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"))
+    cache.set("old", 1, ttl=-1)
+    cache.set("kept", 2)
+    cache.set("new", 3)
+    
+    assert len(cache) == 2
+    assert cache.get("kept") == 2
+
+def test_tiered_cache_promotes_persistent_hits(tmp_path):
+    persistent = SQLiteCache(str(tmp_path / "cache.db"))
+    persistent.set("a", [1, 2])
+    cache = TieredCache(TTLCache(), persistent)
+    
+    assert cache.get("a") == [1, 2]
+    assert cache.memory.get("a") == [1, 2]
+    assert cache.get("missing") is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_tiered_cache_promotes_with_remaining_ttl(tmp_path):
+    persistent = SQLiteCache(str(tmp_path / "cache.db"), ttl=3600)
+    persistent.set("a", 1, ttl=0.5)
+    cache = TieredCache(TTLCache(ttl=3600), persistent)
+    
+    assert cache.get("a") == 1
+    expires_at, _ = cache.memory._entries["a"]
+    assert expires_at <= time.time() + 0.5
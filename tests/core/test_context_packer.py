@@ -0,0 +1,86 @@
+from engine.core.context_packer import ContextPacker
+from engine.utils.tokens import TokenCounter
+
+class CharTokenizer:
+    """每个字符算一个 token"""
+    def encode(self, text):
+        return list(text)
+
+char_counter = TokenCounter(CharTokenizer())
+
+def test_drops_json_noise():
+    packer = ContextPacker(char_counter, budget=1000)
+    packed = packer.pack([
+        {"task_type": "search", "result": "第一条结论。", "status": "success", "wall_time": 1.5}
+    ])
+    assert packed.text == "[1] search\n第一条结论。"
+    assert packed.original_tokens > packed.packed_tokens
+    assert packed.saved_tokens == packed.original_tokens - packed.packed_tokens
+    assert packed.truncated_tasks == 0
+
+def test_removes_duplicate_sentences_across_tasks():
+    packer = ContextPacker(char_counter, budget=1000)
+    packed = packer.pack([
+        {"task_type": "search", "result": "营收增长 10%。利润持平。"},
+        {"task_type": "analysis", "result": "营收增长10%。成本下降。"}
+    ])
+    assert "成本下降。" in packed.text
+    assert packed.text.count("营收增长") == 1
+    assert packed.duplicate_sentences == 1
+
+def test_truncates_proportionally_on_sentence_boundaries():
+    packer = ContextPacker(char_counter, budget=30)
+    long_output = "".join(f"第{i}条长句内容。" for i in range(10))
+    short_output = "短句一。短句二。"
+    packed = packer.pack([
+        {"task_type": "search", "result": long_output},
+        {"task_type": "analysis", "result": short_output}
+    ])
+    sections = packed.text.split("\n\n")
+    body_tokens = sum(len(section.split("\n", 1)[1]) for section in sections)
+    assert body_tokens <= 30
+    assert packed.truncated_tasks == 2
+    # 截断后仍以完整句子结尾
+    assert sections[0].endswith("。")
+    assert sections[0].startswith("[1] search\n第0条长句内容。")
+
+def test_truncates_single_long_sentence_by_characters():
+    packer = ContextPacker(char_counter, budget=10)
+    packed = packer.pack([{"task_type": "search", "result": "很" * 40}])
+    assert packed.text == "[1] search\n" + "很" * 10
+
+def test_reads_agent_output_dict():
+    packer = ContextPacker(char_counter, budget=1000)
+    packed = packer.pack([{"task_type": "search", "result": {"input": "问题", "output": "代理回答。"}}])
+    assert packed.text == "[1] search\n代理回答。"
+
+def test_split_respects_chunk_budget():
+    packer = ContextPacker(char_counter)
+    text = "".join(f"第{i}句。" for i in range(10)) + "很" * 25
+    
+    chunks = packer.split(text, 10)
+    
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert "".join(chunks) == text
+    assert chunks[0] == "第0句。第1句。"
+
+def test_content_tokens_counts_before_truncation():
+    packer = ContextPacker(char_counter, budget=5)
+    packed = packer.pack([{"task_type": "search", "result": "第一句。第二句。"}])
+    
+    assert packed.content_tokens == 8
+    assert packed.stats()["content_tokens"] == 8
+
+def test_original_tokens_sum_sentence_and_field_counts():
+    packer = ContextPacker(char_counter, budget=1000)
+    results = [
+        {"task_type": "search", "result": "甲。乙。", "wall_time": 1.0},
+        {"task_type": "analysis", "result": "甲。丙。"}
+    ]
+    
+    packed = packer.pack(results)
+    
+    # 重复句也计入原始大小
+    fields = sum(len(ContextPacker.envelope(result)) for result in results)
+    assert packed.original_tokens == 8 + fields
+    assert ContextPacker.envelope(results[1]) == '{"task_type": "analysis"}'
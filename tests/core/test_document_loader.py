@@ -0,0 +1,90 @@
+import pytest
+import types
+from engine.indexer.document_loader import DocumentLoader
+from engine.utils.tokens import TokenCounter
+
+class CharTokenizer:
+    """每个字符算一个 token"""
+    def encode(self, text):
+        return list(text)
+
+def make_loader(**kwargs):
+    # 跳过 tokenizer 的资源注册，使用按字符计数的计数器
+    loader = DocumentLoader.__new__(DocumentLoader)
+    loader.base_dir = None
+    loader.max_tokens_per_chunk = kwargs.get("max_tokens_per_chunk", 1000)
+    loader.rows_per_block = kwargs.get("rows_per_block", 500)
+    loader.block_chars = kwargs.get("block_chars", 64 * 1024)
+    loader.token_counter = TokenCounter(CharTokenizer())
+    return loader
+
+def test_iter_file_is_lazy(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_text("# 标题\n\n正文。", encoding="utf-8")
+    loader = make_loader()
+
+    assert isinstance(loader.iter_file(path), types.GeneratorType)
+    assert loader.load_file(tmp_path / "a.unknown") == []
+
+def test_markdown_blocks_split_on_blank_lines(tmp_path):
+    path = tmp_path / "a.md"
+    paragraphs = [f"第{i}段" + "字" * 20 for i in range(10)]
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    loader = make_loader(block_chars=50)
+
+    blocks = list(loader._iter_markdown_blocks(path))
+
+    assert len(blocks) > 1
+    assert "".join(blocks) == path.read_text(encoding="utf-8")
+    assert all(len(block) < 100 for block in blocks)
+
+def test_markdown_blocks_keep_code_fences_whole(tmp_path):
+    path = tmp_path / "a.md"
+    code = "```\n" + "x = 1\n\n" * 5 + "```\n"
+    path.write_text("说明\n\n" + code + "\n结尾\n", encoding="utf-8")
+    loader = make_loader(block_chars=30)
+
+    blocks = list(loader._iter_markdown_blocks(path))
+
+    assert any(code in block for block in blocks)
+
+def test_excel_streams_row_blocks_with_header(tmp_path):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "营收"
+    sheet.append(["季度", "金额"])
+    for i in range(5):
+        sheet.append([f"Q{i + 1}", i * 100])
+    path = tmp_path / "a.xlsx"
+    workbook.save(path)
+    loader = make_loader(rows_per_block=2)
+
+    chunks = list(loader.iter_file(path))
+
+    assert [chunk["rows"] for chunk in chunks] == ["1-2", "3-4", "5-5"]
+    assert all(chunk["content"].startswith("季度\t金额") for chunk in chunks)
+    assert chunks[0]["sheet"] == "营收"
+    assert "Q5\t400" in chunks[2]["content"]
+
+def test_xls_streams_row_blocks_per_sheet(tmp_path):
+    xlwt = pytest.importorskip("xlwt")
+    workbook = xlwt.Workbook()
+    for name in ["营收", "成本"]:
+        sheet = workbook.add_sheet(name)
+        for column, value in enumerate(["季度", "金额"]):
+            sheet.write(0, column, value)
+        for i in range(3):
+            sheet.write(i + 1, 0, f"Q{i + 1}")
+            sheet.write(i + 1, 1, i * 100)
+    path = tmp_path / "a.xls"
+    workbook.save(str(path))
+    loader = make_loader(rows_per_block=2)
+
+    chunks = list(loader.iter_file(path))
+
+    assert [(chunk["sheet"], chunk["rows"]) for chunk in chunks] == [
+        ("营收", "1-2"), ("营收", "3-3"), ("成本", "1-2"), ("成本", "3-3")
+    ]
+    assert all(chunk["content"].startswith("季度\t金额") for chunk in chunks)
+    assert "Q3\t200" in chunks[1]["content"]
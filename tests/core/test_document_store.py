@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+from engine.indexer.document_store import DocumentStore
+
+@pytest.fixture
+def store():
+    # 跳过 Chroma 初始化，只替换 search_many 依赖的组件
+    store = DocumentStore.__new__(DocumentStore)
+    store.embeddings = Mock()
+    store.embeddings.aembed_documents = AsyncMock(return_value=[[0.1, 0.2], [0.3, 0.4]])
+    store.store = Mock()
+    store.collection = Mock()
+    store.collection.query.return_value = {
+        "ids": [["a", "b"], ["b", "c"]],
+        "documents": [["文档A", "文档B"], ["文档B", "文档C"]],
+        "metadatas": [[{"source": "a"}, None], [None, {"source": "c"}]],
+        "distances": [[0.1, 0.5], [0.2, 0.3]]
+    }
+    return store
+
+@pytest.mark.asyncio
+async def test_search_many_single_round(store):
+    results = await store.search_many(["查询一", "查询二"], k=2)
+    
+    store.embeddings.aembed_documents.assert_awaited_once_with(["查询一", "查询二"])
+    _, kwargs = store.collection.query.call_args
+    assert kwargs["query_embeddings"] == [[0.1, 0.2], [0.3, 0.4]]
+    assert kwargs["n_results"] == 2
+    # 重叠的文档 B 只保留在距离更近的第二个查询中
+    assert [doc.page_content for doc in results[0]] == ["文档A"]
+    assert [doc.page_content for doc in results[1]] == ["文档B", "文档C"]
+    assert results[0][0].metadata == {"source": "a"}
+
+@pytest.mark.asyncio
+async def test_search_many_without_dedup(store):
+    results = await store.search_many(["查询一", "查询二"], k=2, deduplicate=False)
+    
+    assert [len(docs) for docs in results] == [2, 2]
+    assert await store.search_many([]) == []
+
+@pytest.mark.asyncio
+async def test_search_many_keeps_top_hit_when_all_shared(store):
+    store.collection.query.return_value = {
+        "ids": [["a", "b"], ["a", "b"]],
+        "documents": [["文档A", "文档B"], ["文档A", "文档B"]],
+        "metadatas": [[None, None], [None, None]],
+        "distances": [[0.1, 0.2], [0.3, 0.4]]
+    }
+    
+    results = await store.search_many(["查询一", "查询二"], k=2)
+    
+    # 两个查询命中相同的文档，第二个查询仍保留自己最相近的结果
+    assert [doc.page_content for doc in results[0]] == ["文档A", "文档B"]
+    assert [doc.page_content for doc in results[1]] == ["文档A"]
+
+@pytest.mark.asyncio
+async def test_add_documents_consumes_stream_in_batches(store):
+    from langchain_core.documents import Document
+    store._bump_version = Mock()
+    
+    def documents():
+        for i in range(5):
+            yield Document(page_content=f"文档{i}", metadata={"source": "a"})
+    
+    added = await store.add_documents(documents(), metadata={"kb": "test"}, batch_size=2)
+    
+    assert added == 5
+    batches = [call.args[0] for call in store.store.add_documents.call_args_list]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0].metadata == {"source": "a", "kb": "test"}
+    store._bump_version.assert_called_once()
+
+class FakeEmbeddings:
+    """按文本首字符生成固定向量"""
+    VECTORS = {"苹": [1.0, 0.0, 0.0], "香": [0.0, 1.0, 0.0], "橙": [0.0, 0.0, 1.0]}
+    
+    def embed_documents(self, texts):
+        return [self.VECTORS[text[0]] for text in texts]
+    
+    def embed_query(self, text):
+        return self.VECTORS[text[0]]
+    
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+@pytest.mark.asyncio
+async def test_search_many_on_real_collection(tmp_path):
+    import chromadb
+    from langchain_core.documents import Document
+    store = DocumentStore.__new__(DocumentStore)
+    store.embeddings = FakeEmbeddings()
+    store._open_store(chromadb.PersistentClient(path=str(tmp_path / "chroma_db")))
+    
+    documents = [Document(page_content=text, metadata={"source": text}) for text in ["苹果", "香蕉", "橙子"]]
+    store.add_embedded_documents(documents, FakeEmbeddings().embed_documents(["苹", "香", "橙"]), ["a", "b", "c"])
+    # 相同 ID 重复写入时覆盖
+    store.add_embedded_documents(documents[:1], [[1.0, 0.0, 0.0]], ["a"])
+    
+    results = await store.search_many(["苹果", "香蕉"], k=1)
+    
+    assert [[doc.page_content for doc in docs] for docs in results] == [["苹果"], ["香蕉"]]
+    assert results[0][0].metadata == {"source": "苹果"}
+    assert store.collection.count() == 3
+    # 通过 langchain 接口也能看到直接写入的文档块
+    assert store.store.similarity_search("橙", k=1)[0].page_content == "橙子"
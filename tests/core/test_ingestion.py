@@ -0,0 +1,188 @@
+import json
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, AsyncMock
+from engine.indexer.ingestion import IngestionPipeline, chunk_id, spill_chunks
+from engine.indexer.manifest import IndexManifest, file_hash
+
+def fake_parse(path, max_tokens_per_chunk, known_hash=None, spill_dir=None):
+    """文件的每一行产生一个文档块，文件名含 broken 时解析失败"""
+    if "broken" in path:
+        raise ValueError("无法解析")
+    content_hash = file_hash(path)
+    if content_hash == known_hash:
+        return content_hash, None, 0
+    with open(path, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    chunks = ({"content": f"{path} {line}", "token_count": 10, "source": path} for line in lines)
+    return (content_hash, *spill_chunks(chunks, spill_dir))
+
+@pytest.fixture
+def docs(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    for name in ["a.pdf", "b.docx", "c.md", "broken.pdf", "notes.txt", ".hidden.md", "~$temp.docx", "sub/d.xlsx"]:
+        (docs / name).write_text("1\n2\n3")
+    return docs.resolve()
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return str(tmp_path / "indexes" / "document_index.json")
+
+@pytest.fixture
+def store():
+    store = Mock()
+    store.embeddings.aembed_documents = AsyncMock(side_effect=lambda texts: [[0.1, 0.2]] * len(texts))
+    return store
+
+def make_pipeline(store, manifest_path, **kwargs):
+    pipeline = IngestionPipeline(
+        store,
+        parse_workers=2,
+        embed_concurrency=2,
+        embed_batch_size=5,
+        queue_size=2,
+        executor=ThreadPoolExecutor(max_workers=2),
+        manifest=IndexManifest(manifest_path),
+        **kwargs
+    )
+    pipeline.parse_file = fake_parse
+    return pipeline
+
+def deleted_ids(store):
+    return sorted(doc_id for call in store.delete_documents.call_args_list for doc_id in call.args[0])
+
+def test_discover_skips_unsupported_and_hidden_files(docs):
+    names = [path.name for path in IngestionPipeline.discover(str(docs))]
+
+    assert names == ["a.pdf", "b.docx", "broken.pdf", "c.md", "d.xlsx"]
+
+@pytest.mark.asyncio
+async def test_ingests_all_chunks_in_batches(docs, store, manifest_path):
+    progress = Mock()
+    pipeline = make_pipeline(store, manifest_path, progress=progress)
+
+    stats = await pipeline.run(str(docs))
+
+    assert stats.files_discovered == 5
+    assert stats.files_parsed == 4
+    assert stats.files_failed == 1
+    assert stats.failures[0][0].endswith("broken.pdf")
+    assert stats.chunks == stats.chunks_embedded == stats.chunks_written == 12
+    assert stats.tokens == 120
+    # 12 个文档块按每批 5 个向量化
+    assert sorted(len(call.args[0]) for call in store.embeddings.aembed_documents.call_args_list) == [2, 5, 5]
+
+    written_ids = [doc_id for call in store.add_embedded_documents.call_args_list for doc_id in call.args[2]]
+    assert chunk_id(str(docs / "a.pdf"), 0) in written_ids
+    assert len(set(written_ids)) == 12
+    store._bump_version.assert_called_once()
+    assert progress.call_args.args[0]["chunks_written"] == 12
+
+@pytest.mark.asyncio
+async def test_spill_files_are_removed(docs, store, manifest_path, tmp_path):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    pipeline = make_pipeline(store, manifest_path, spill_dir=str(spill_dir))
+
+    stats = await pipeline.run(str(docs))
+
+    assert stats.chunks_written == 12
+    # 解析结果经临时文件传回主进程，读完后删除
+    assert list(spill_dir.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_embedding_failure_is_counted(docs, store, manifest_path):
+    store.embeddings.aembed_documents = AsyncMock(side_effect=RuntimeError("限流"))
+    pipeline = make_pipeline(store, manifest_path)
+
+    stats = await pipeline.run(str(docs))
+
+    assert stats.chunks_failed == 12
+    assert stats.chunks_written == 0
+    store.add_embedded_documents.assert_not_called()
+    store._bump_version.assert_not_called()
+    # 失败的文件不记入清单，下次导入时重试
+    assert len(IndexManifest(manifest_path)) == 0
+
+@pytest.mark.asyncio
+async def test_write_failure_stops_pipeline(docs, store, manifest_path):
+    store.add_embedded_documents.side_effect = RuntimeError("磁盘已满")
+    pipeline = make_pipeline(store, manifest_path)
+
+    with pytest.raises(RuntimeError):
+        await pipeline.run(str(docs))
+
+@pytest.mark.asyncio
+async def test_manifest_records_indexed_files(docs, store, manifest_path):
+    await make_pipeline(store, manifest_path).run(str(docs))
+
+    manifest = IndexManifest(manifest_path)
+    entry = manifest.get(str(docs / "a.pdf"))
+    assert len(manifest) == 4
+    assert entry["content_hash"] == file_hash(str(docs / "a.pdf"))
+    assert entry["size"] == os.path.getsize(docs / "a.pdf")
+    assert entry["chunk_ids"] == [chunk_id(str(docs / "a.pdf"), i) for i in range(3)]
+
+@pytest.mark.asyncio
+async def test_reindex_skips_unchanged_files(docs, store, manifest_path):
+    await make_pipeline(store, manifest_path).run(str(docs))
+    store.reset_mock()
+    # 只改修改时间、内容不变的文件按哈希判断为未变化
+    os.utime(docs / "b.docx", (1, 1))
+
+    stats = await make_pipeline(store, manifest_path).run(str(docs))
+
+    assert stats.files_unchanged == 4
+    assert stats.files_parsed == 0
+    store.embeddings.aembed_documents.assert_not_called()
+    store._bump_version.assert_not_called()
+    assert IndexManifest(manifest_path).get(str(docs / "b.docx"))["mtime"] == 1
+
+@pytest.mark.asyncio
+async def test_reindex_changed_and_removed_files(docs, store, manifest_path):
+    await make_pipeline(store, manifest_path).run(str(docs))
+    store.reset_mock()
+    (docs / "a.pdf").write_text("新内容")
+    (docs / "c.md").unlink()
+
+    stats = await make_pipeline(store, manifest_path).run(str(docs))
+
+    assert stats.files_parsed == 1
+    assert stats.files_removed == 1
+    assert stats.chunks_written == 1
+    # a.pdf 只剩一个块，多出的两个旧块和 c.md 的所有块被删除
+    stale = [chunk_id(str(docs / "a.pdf"), i) for i in (1, 2)]
+    removed = [chunk_id(str(docs / "c.md"), i) for i in range(3)]
+    assert deleted_ids(store) == sorted(stale + removed)
+    store._bump_version.assert_called_once()
+    manifest = IndexManifest(manifest_path)
+    assert manifest.get(str(docs / "c.md")) is None
+    assert len(manifest.get(str(docs / "a.pdf"))["chunk_ids"]) == 1
+
+@pytest.mark.asyncio
+async def test_full_rebuild_ignores_manifest(docs, store, manifest_path):
+    await make_pipeline(store, manifest_path).run(str(docs))
+
+    stats = await make_pipeline(store, manifest_path, incremental=False).run(str(docs))
+
+    assert stats.files_parsed == 4
+    assert stats.chunks_written == 12
+
+def test_parse_file_spills_chunks(tmp_path):
+    from engine.indexer.ingestion import parse_file
+    path = tmp_path / "a.md"
+    path.write_text("# 标题\n\n正文内容", encoding="utf-8")
+
+    content_hash, spill_path, count = parse_file(str(path), 1000, spill_dir=str(tmp_path))
+    try:
+        with open(spill_path, encoding="utf-8") as file:
+            chunks = [json.loads(line) for line in file]
+    finally:
+        os.remove(spill_path)
+
+    assert content_hash == file_hash(str(path))
+    assert count == len(chunks) > 0
+    assert "正文内容" in "".join(chunk["content"] for chunk in chunks)
+    assert parse_file(str(path), 1000, known_hash=content_hash) == (content_hash, None, 0)
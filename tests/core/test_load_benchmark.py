@@ -0,0 +1,84 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from benchmarks.load_benchmark import (
+    load_queries,
+    percentile,
+    run_closed_loop,
+    run_open_loop,
+    summarize,
+    UsageRecorder
+)
+from benchmarks.stand_ins import LatencyModel, StandInChatModel
+
+class StubCoordinator:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.config = SimpleNamespace(default_models={"response_generation": "gpt-4o"})
+
+    async def process_query(self, query, session_id, timeout=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return SimpleNamespace(
+            metadata={"stage_timings": {"tasks_executed": 0.01}},
+            evaluation_result={"token_usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}}
+        )
+
+def test_load_queries(tmp_path):
+    log = tmp_path / "queries.jsonl"
+    log.write_text("\n".join([
+        json.dumps({"query": "查询一"}),
+        json.dumps({"title": "查询二", "body": "正文"}),
+        ""
+    ]), encoding="utf-8")
+    
+    assert load_queries(str(log)) == ["查询一", "查询二"]
+    assert load_queries(str(log), limit=1) == ["查询一"]
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == pytest.approx(50.5)
+    assert percentile(values, 0.99) == pytest.approx(99.01)
+    assert percentile([], 0.5) == 0.0
+
+def test_latency_model_reproducible():
+    first = LatencyModel.parse("lognormal:1.0,0.4", seed=7)
+    second = LatencyModel.parse("lognormal:1.0,0.4", seed=7)
+    assert [first.sample() for _ in range(5)] == [second.sample() for _ in range(5)]
+    assert LatencyModel.parse("fixed:0.2").sample() == 0.2
+    with pytest.raises(ValueError):
+        LatencyModel.parse("gamma:1")
+
+@pytest.mark.asyncio
+async def test_stand_in_chat_model_bind_shares_calls():
+    llm = StandInChatModel(LatencyModel.parse("fixed:0"), response_chars=100)
+    chunks = [chunk.content async for chunk in llm.bind(max_tokens=40).astream(["问题"])]
+    
+    assert len("".join(chunks)) == 40
+    assert llm.calls == 1
+
+@pytest.mark.asyncio
+async def test_closed_loop_caps_concurrency():
+    coordinator = StubCoordinator()
+    cost_tracker = SimpleNamespace(calculate_cost=lambda prompt, completion, model: prompt * 1e-6 + completion * 2e-6)
+    recorder = UsageRecorder(cost_tracker)
+    samples = await run_closed_loop(coordinator, ["a", "b"], total=10, users=3, recorder=recorder)
+    summary = summarize(samples, elapsed=1.0, recorder=recorder)
+    
+    assert coordinator.max_active == 3
+    assert summary["requests"] == 10
+    assert summary["errors"] == 0
+    assert summary["stages"]["tasks_executed"]["count"] == 10
+    assert summary["tokens"]["total"] == 1500
+    assert summary["cost"]["total"] == pytest.approx(10 * (100e-6 + 100e-6))
+
+@pytest.mark.asyncio
+async def test_open_loop_issues_all_requests():
+    coordinator = StubCoordinator()
+    samples = await run_open_loop(coordinator, ["a"], total=5, qps=500.0)
+    
+    assert len(samples) == 5
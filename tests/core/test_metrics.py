@@ -0,0 +1,40 @@
+import pytest
+from engine.core.events import EventType
+from engine.utils.metrics import Histogram, WorkflowMetrics, total_tokens
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=[1, 2, 4])
+    for value in [0.5, 1.5, 1.5, 3, 10]:
+        histogram.observe(value)
+    
+    assert histogram.count == 5
+    assert histogram.cumulative_counts() == [1, 3, 4, 5]
+    assert 1 <= histogram.quantile(0.5) <= 2
+    assert histogram.quantile(0.99) == 10
+
+def test_workflow_metrics_snapshot():
+    metrics = WorkflowMetrics(buckets=[0.1, 1])
+    metrics.record(EventType.TASKS_EXECUTED, 0.05, tokens=100)
+    metrics.record(EventType.TASKS_EXECUTED, 0.5, tokens=50, error=True)
+    
+    snapshot = metrics.snapshot()["tasks_executed"]
+    assert snapshot["count"] == 2
+    assert snapshot["tokens"] == 150
+    assert snapshot["errors"] == 1
+    
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+def test_prometheus_export():
+    metrics = WorkflowMetrics(buckets=[0.1, 1])
+    metrics.record(EventType.RESPONSE_GENERATED, 0.5, tokens=30)
+    
+    text = metrics.to_prometheus()
+    assert "# TYPE llm_search_stage_duration_seconds histogram" in text
+    assert 'llm_search_stage_duration_seconds_bucket{stage="response_generated",le="0.1"} 0' in text
+    assert 'llm_search_stage_duration_seconds_bucket{stage="response_generated",le="+Inf"} 1' in text
+    assert 'llm_search_stage_tokens_total{stage="response_generated"} 30' in text
+
+def test_total_tokens():
+    assert total_tokens(None) == 0
+    assert total_tokens({"total_tokens": 12}) == 12
@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import json
+import pytest
+from array import array
+from benchmarks.mock_services import MockServices
+
+@pytest.fixture
+async def services():
+    services = MockServices(
+        port=0,
+        chat_latency="fixed:0",
+        embedding_latency="fixed:0",
+        search_latency="fixed:0",
+        chunk_delay=0,
+        completion_chars=40,
+        dimensions=8
+    )
+    await services.start()
+    yield services
+    await services.close()
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip()
+    return int(lines[0].split()[1]), headers, body.decode("utf-8")
+
+CHAT_PATH = "/openai/deployments/gpt-4o/chat/completions?api-version=2024-08-01-preview"
+EMBEDDING_PATH = "/openai/deployments/text-embedding-3-large/embeddings?api-version=2024-02-15-preview"
+
+@pytest.mark.asyncio
+async def test_chat_completion(services):
+    status, _, body = await request(services.port, "POST", CHAT_PATH, {
+        "messages": [{"role": "user", "content": "你好"}]
+    })
+    data = json.loads(body)
+    
+    assert status == 200
+    assert data["object"] == "chat.completion"
+    assert len(data["choices"][0]["message"]["content"]) == 40
+    assert data["usage"]["total_tokens"] == data["usage"]["prompt_tokens"] + data["usage"]["completion_tokens"]
+
+@pytest.mark.asyncio
+async def test_chat_completion_stream(services):
+    status, headers, body = await request(services.port, "POST", CHAT_PATH, {
+        "messages": [{"role": "user", "content": "你好"}],
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    })
+    events = [line[len("data: "):] for line in body.split("\n") if line.startswith("data: ")]
+    
+    assert headers["content-type"].startswith("text/event-stream")
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    content = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+    assert len(content) == 40
+    assert chunks[-1]["usage"]["completion_tokens"] > 0
+
+@pytest.mark.asyncio
+async def test_evaluation_prompt_returns_json(services):
+    _, _, body = await request(services.port, "POST", CHAT_PATH, {
+        "messages": [
+            {"role": "system", "content": '返回 JSON：{"score": 0.9, "hallucination_risk": 0.1}'},
+            {"role": "user", "content": "请评估"}
+        ]
+    })
+    
+    assert json.loads(json.loads(body)["choices"][0]["message"]["content"])["score"] == 0.85
+
+@pytest.mark.asyncio
+async def test_embeddings_float_and_base64(services):
+    _, _, body = await request(services.port, "POST", EMBEDDING_PATH, {"input": ["a", "b"]})
+    data = json.loads(body)["data"]
+    assert len(data) == 2 and len(data[0]["embedding"]) == 8
+    
+    _, _, body = await request(services.port, "POST", EMBEDDING_PATH, {
+        "input": [[1, 2, 3]], "encoding_format": "base64"
+    })
+    encoded = json.loads(body)["data"][0]["embedding"]
+    assert len(array("f", base64.b64decode(encoded))) == 8
+
+@pytest.mark.asyncio
+async def test_bing_search(services):
+    status, _, body = await request(services.port, "GET", "/v7.0/search?q=new%20energy&count=3")
+    pages = json.loads(body)["webPages"]["value"]
+    
+    assert status == 200
+    assert len(pages) == 3
+    assert "new energy" in pages[0]["snippet"]
+
+@pytest.mark.asyncio
+async def test_rate_limit_and_errors():
+    services = MockServices(port=0, chat_latency="fixed:0", rate_limit=1, burst=1)
+    await services.start()
+    try:
+        statuses = []
+        for _ in range(3):
+            status, headers, body = await request(services.port, "POST", CHAT_PATH, {"messages": []})
+            statuses.append(status)
+        assert statuses[0] == 200
+        assert statuses[1:] == [429, 429]
+        assert "retry-after" in headers
+        assert json.loads(body)["error"]["code"] == "429"
+    finally:
+        await services.close()
+    
+    services = MockServices(port=0, chat_latency="fixed:0", error_rate=1.0)
+    await services.start()
+    try:
+        status, _, _ = await request(services.port, "POST", CHAT_PATH, {"messages": []})
+        assert status == 500
+    finally:
+        await services.close()
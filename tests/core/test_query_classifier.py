@@ -0,0 +1,48 @@
+import pytest
+from engine.core.query_classifier import QueryClassifier
+
+@pytest.fixture
+def classifier():
+    return QueryClassifier(threshold=0.7)
+
+@pytest.mark.parametrize("query", ["什么是机器学习", "OpenAI的CEO是谁？", "上海有多少人口", "What is RAG?"])
+def test_simple_lookups(classifier, query):
+    decision = classifier.classify(query)
+    
+    assert decision.route == "simple"
+    assert decision.confidence >= 0.7
+
+@pytest.mark.parametrize("query", [
+    "比较2023年和2024年中国新能源汽车销量的变化，并分析原因",
+    "光伏行业的发展现状、政策影响以及未来前景",
+    "why did nvidia stock rise in 2024"
+])
+def test_complex_queries(classifier, query):
+    decision = classifier.classify(query)
+    
+    assert decision.route == "complex"
+    assert decision.features["complex"] >= 1
+
+def test_history_shifts_route(classifier):
+    assert classifier.classify("人工智能发展").route == "complex"
+    
+    classifier.observe("人工智能发展", 1)
+    decision = classifier.classify("人工智能发展 ")
+    
+    assert decision.route == "simple"
+    assert decision.features["history"] == 1
+
+def test_stats(classifier):
+    classifier.classify("什么是机器学习")
+    classifier.classify("新能源汽车未来趋势预测")
+    
+    stats = classifier.stats()
+    
+    assert stats["decisions"] == 2
+    assert stats["simple_rate"] == 0.5
+    assert 0.5 <= stats["avg_confidence"] <= 1.0
+
+def test_decision_to_dict(classifier):
+    data = classifier.classify("什么是机器学习").to_dict()
+    
+    assert set(data) == {"route", "confidence", "probability", "score", "features"}
@@ -1,6 +1,9 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
-from engine.core.query_parser import QueryParser, SubTask
+from engine.core.query_parser import QueryParser, SubTask, TaskStreamParser
 from pydantic import ValidationError  # 修改导入语句
 
 class TestQueryParser(unittest.TestCase):
@@ -47,8 +50,8 @@ class TestQueryParser(unittest.TestCase):
         mock_response.content = "invalid json"
         self.parser.llm.invoke.return_value = mock_response
 
-        # 验证异常
-        with self.assertRaises(SyntaxError):
+        # 验证异常（严格 JSON 解析）
+        with self.assertRaises(ValueError):
             self.parser.parse_query("测试查询")
 
     def test_parse_query_missing_tasks_key(self):
@@ -73,5 +76,173 @@ class TestQueryParser(unittest.TestCase):
         with self.assertRaises(ValidationError):  # 修改异常类型
             self.parser.parse_query("测试查询")
 
+class TestFastPath(unittest.TestCase):
+    def setUp(self):
+        self.parser = QueryParser()
+        self.parser.llm = Mock()
+        self.parser.task_prompt = "分析查询：{query}"
+
+    def test_simple_query_skips_llm(self):
+        result = self.parser.parse_query("什么是机器学习")
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].description, "什么是机器学习")
+        self.assertEqual(result[0].parameters["route"], "fast_path")
+        self.parser.llm.invoke.assert_not_called()
+
+    def test_llm_decomposition_recorded_in_history(self):
+        mock_response = Mock()
+        mock_response.content = """{"tasks": [
+            {"task_type": "search", "description": "人工智能发展", "priority": 1, "parameters": {}}
+        ]}"""
+        self.parser.llm.invoke.return_value = mock_response
+
+        self.parser.parse_query("人工智能发展")
+        self.parser.parse_query("人工智能发展")
+
+        # 模型只分解出一个任务后，相同查询改走快速路径
+        self.parser.llm.invoke.assert_called_once()
+
+    def test_fast_path_disabled(self):
+        parser = QueryParser(fast_path_threshold=None)
+        self.assertIsNone(parser.classifier)
+        self.assertIsNone(parser.route("什么是机器学习"))
+
+class TestTaskStreamParser(unittest.TestCase):
+    DOCUMENT = (
+        '{"note": "[tasks] {}", "tasks": ['
+        '{"task_type": "search", "description": "含 \\"引号\\" 和 } 括号", "parameters": {"filters": {"year": [2023, 2024]}}, "priority": 1}, '
+        '{"task_type": "analysis", "description": "分析", "parameters": {}, "priority": 2}'
+        '], "extra": [{"a": 1}]}'
+    )
+
+    def test_yields_each_task_when_closed(self):
+        parser = TaskStreamParser()
+        completed = []
+        for i in range(0, len(self.DOCUMENT), 5):
+            completed.append(parser.feed(self.DOCUMENT[i:i + 5]))
+        
+        tasks = [task for batch in completed for task in batch]
+        self.assertEqual([task["task_type"] for task in tasks], ["search", "analysis"])
+        self.assertEqual(tasks[0]["description"], '含 "引号" 和 } 括号')
+        # 第一个任务在文档结束之前就已产出
+        first_batch = next(i for i, batch in enumerate(completed) if batch)
+        self.assertLess(first_batch, len(completed) - 1)
+        self.assertEqual(len(parser.close()["tasks"]), 2)
+
+    def test_close_rejects_incomplete_json(self):
+        parser = TaskStreamParser()
+        parser.feed('{"tasks": [{"task_type": "search"}, {"task_type"')
+        with self.assertRaises(ValueError):
+            parser.close()
+
+class TestStreamingParse(unittest.TestCase):
+    def setUp(self):
+        self.parser = QueryParser()
+        self.parser.task_prompt = "分析查询：{query}"
+        self.parser.llm = Mock()
+
+    def stream(self, *chunks):
+        async def astream(prompt):
+            for chunk in chunks:
+                yield Mock(content=chunk)
+        self.parser.llm.bind.return_value.astream = astream
+
+    def test_astream_tasks(self):
+        self.stream(
+            '{"tasks": [{"task_type": "search", "description": "现状", ',
+            '"parameters": {}, "priority": 1}, {"task_type": "search", ',
+            '"description": "历史", "parameters": {}, "priority": 2}]}'
+        )
+        
+        tasks = asyncio.run(self.parser.aparse_query("人工智能发展"))
+        
+        self.assertEqual([task.description for task in tasks], ["现状", "历史"])
+        self.parser.llm.bind.assert_called_once_with(response_format={"type": "json_object"})
+
+    def test_astream_tasks_invalid_json(self):
+        self.stream('{"tasks": [{"task_type": "search", "description": "现状", "parameters": {}, "priority": 1}')
+        
+        async def collect():
+            tasks = []
+            with self.assertRaises(ValueError):
+                async for task in self.parser.astream_tasks("测试查询"):
+                    tasks.append(task)
+            return tasks
+        
+        # 已闭合的任务在解析失败前已经产出
+        self.assertEqual(len(asyncio.run(collect())), 1)
+
+class TestDecompositionCache(unittest.TestCase):
+    RESPONSE = """{"tasks": [
+        {"task_type": "search", "description": "现状", "priority": 1, "parameters": {}},
+        {"task_type": "analysis", "description": "趋势", "priority": 2, "parameters": {}}
+    ]}"""
+
+    def make_parser(self, **kwargs):
+        parser = QueryParser(fast_path_threshold=None, **kwargs)
+        parser.llm = Mock()
+        parser.llm.invoke.return_value = Mock(content=self.RESPONSE)
+        return parser
+
+    def test_normalized_query_hits_cache(self):
+        parser = self.make_parser()
+        
+        first = parser.parse_query("比较 GPT 和 Claude？")
+        second = parser.parse_query("比较  gpt 和 claude")
+        
+        parser.llm.invoke.assert_called_once()
+        self.assertEqual([task.dict() for task in first], [task.dict() for task in second])
+        self.assertEqual(parser.cache_stats()["hits"], 1)
+        self.assertEqual(parser.cache_stats()["hit_rate"], 0.5)
+
+    def test_prompt_version_change_misses(self):
+        parser = self.make_parser()
+        parser.parse_query("人工智能发展")
+        
+        parser.prompt_version = "changed"
+        parser.parse_query("人工智能发展")
+        
+        self.assertEqual(parser.llm.invoke.call_count, 2)
+
+    def test_stream_hits_cache_and_skips_invalid_output(self):
+        parser = self.make_parser()
+        chunks = ['{"tasks": [{"task_type": "search", "description": "现状", "parameters": {}, "priority": 1}']
+        
+        async def astream(prompt):
+            for chunk in chunks:
+                yield Mock(content=chunk)
+        parser.llm.bind.return_value.astream = astream
+        
+        # 不完整的输出不写入缓存
+        with self.assertRaises(ValueError):
+            asyncio.run(parser.aparse_query("人工智能发展"))
+        chunks[0] += "]}"
+        tasks = asyncio.run(parser.aparse_query("人工智能发展"))
+        cached = asyncio.run(parser.aparse_query("人工智能发展"))
+        
+        self.assertEqual([task.description for task in cached], [task.description for task in tasks])
+        self.assertEqual(parser.cache_stats()["hits"], 1)
+
+    def test_sqlite_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            self.make_parser(cache_path=path).parse_query("人工智能发展")
+            
+            parser = self.make_parser(cache_path=path)
+            tasks = parser.parse_query("人工智能发展")
+            
+            self.assertEqual(len(tasks), 2)
+            parser.llm.invoke.assert_not_called()
+            self.assertEqual(parser.cache_stats()["persistent"]["hits"], 1)
+
+    def test_cache_disabled(self):
+        parser = self.make_parser(cache_enabled=False)
+        parser.parse_query("人工智能发展")
+        parser.parse_query("人工智能发展")
+        
+        self.assertEqual(parser.llm.invoke.call_count, 2)
+        self.assertIsNone(parser.cache_stats())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+import asyncio
+from unittest.mock import Mock
+from engine.utils.resources import ResourceRegistry
+
+def test_get_creates_once():
+    registry = ResourceRegistry()
+    factory = Mock(return_value=object())
+    
+    first = registry.get("client", factory)
+    second = registry.get("client", factory)
+    
+    assert first is second
+    factory.assert_called_once()
+
+def test_register_overrides_resource():
+    registry = ResourceRegistry()
+    stub = object()
+    registry.register("document_store", stub)
+    
+    assert registry.document_store() is stub
+    
+    registry.clear()
+    assert registry.get("document_store", lambda: "new") == "new"
+
+def test_tokenizer_shared_per_model():
+    registry = ResourceRegistry()
+    registry.register(("tokenizer", "gpt-4o"), "encoding")
+    
+    assert registry.tokenizer("gpt-4o") == "encoding"
+
+def test_token_counter_shared_per_model():
+    registry = ResourceRegistry()
+    tokenizer = Mock()
+    registry.register(("tokenizer", "gpt-4o"), tokenizer)
+    
+    counter = registry.token_counter("gpt-4o")
+    
+    assert counter is registry.token_counter("gpt-4o")
+    assert counter.tokenizer is tokenizer
+
+def test_http_session_closed_when_loop_changes():
+    registry = ResourceRegistry()
+    first = asyncio.run(registry.http_session())
+    
+    # 新的事件循环上获取会话时关闭旧循环上的会话
+    second = asyncio.run(registry.http_session())
+    
+    assert second is not first
+    assert first.closed
+    asyncio.run(registry.aclose())
+    assert second.closed
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from engine.core.semantic_cache import SemanticAnswerCache
+
+class FakeEmbeddings:
+    """按关键词生成固定向量的 Embedding 替身"""
+    VECTORS = {
+        "新能源汽车趋势": [1.0, 0.0, 0.0],
+        "新能源汽车的发展趋势": [0.98, 0.2, 0.0],
+        "今天天气": [0.0, 0.0, 1.0]
+    }
+    
+    async def aembed_query(self, text):
+        return self.VECTORS[text]
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(embeddings=FakeEmbeddings(), threshold=0.95, max_entries=2)
+
+@pytest.mark.asyncio
+async def test_paraphrase_hits(cache):
+    cache.add(await cache.embed("新能源汽车趋势"), "ns", {"final_answer": "回答"})
+    
+    match = cache.lookup(await cache.embed("新能源汽车的发展趋势"), "ns")
+    assert match is not None
+    similarity, result = match
+    assert similarity > 0.95
+    assert result["final_answer"] == "回答"
+    
+    assert cache.lookup(await cache.embed("今天天气"), "ns") is None
+    assert cache.lookup(await cache.embed("新能源汽车趋势"), "other") is None
+
+@pytest.mark.asyncio
+async def test_lru_eviction(cache):
+    cache.add(np.array([1.0, 0.0, 0.0]), "ns", {"final_answer": "a"})
+    cache.add(np.array([0.0, 1.0, 0.0]), "ns", {"final_answer": "b"})
+    cache.lookup(np.array([1.0, 0.0, 0.0]), "ns")
+    cache.add(np.array([0.0, 0.0, 1.0]), "ns", {"final_answer": "c"})
+    
+    assert len(cache) == 2
+    assert cache.lookup(np.array([0.0, 1.0, 0.0]), "ns") is None
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "ns")[1]["final_answer"] == "a"
+    assert cache.stats()["evictions"] == 1
+
+def test_namespaces_released_after_eviction(cache):
+    # 每次知识库版本变化产生新的命名空间，旧命名空间的记录被淘汰后映射随之移除
+    for version in range(10):
+        cache.add(np.array([1.0, 0.0, 0.0]), f"ns:{version}", {"final_answer": str(version)})
+    
+    assert cache.stats()["namespaces"] == 2
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "ns:9")[1]["final_answer"] == "9"
+    assert cache.lookup(np.array([1.0, 0.0, 0.0]), "ns:0") is None
+    
+    cache.clear()
+    assert cache.stats()["namespaces"] == 0
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from engine.web.server import SearchServer
+
+class StubResult:
+    def __init__(self, answer, rejected=None):
+        self.answer = answer
+        self.rejected = rejected
+
+    def dict(self):
+        if self.rejected is None:
+            return {"final_answer": self.answer, "metadata": {}}
+        return {"final_answer": self.answer,
+                "metadata": {"admission_rejected": self.rejected, "error": "请求被拒绝: 排队请求已满"}}
+
+class StubCoordinator:
+    """不调用 LLM 的协调器替身"""
+    def __init__(self, delay=0.0, rejected=None):
+        self.delay = delay
+        self.rejected = rejected
+        self.metrics = SimpleNamespace(to_prometheus=lambda: "llm_search_stage_duration_seconds_count 0\n")
+        self.calls = []
+
+    async def process_query(self, query, session_id, timeout=None):
+        self.calls.append((query, session_id, timeout))
+        await asyncio.sleep(self.delay)
+        return StubResult(f"回答: {query}", self.rejected)
+
+    async def process_queries(self, queries, timeout=None):
+        return [StubResult(f"回答: {query}", self.rejected) for query, _ in queries]
+
+    async def astream_query(self, query, session_id, timeout=None):
+        if self.rejected is not None:
+            yield SimpleNamespace(type=SimpleNamespace(value="error_occurred"),
+                                  data={"error": "请求被拒绝", "result": StubResult("", self.rejected).dict()})
+            return
+        for token in ["你", "好"]:
+            yield SimpleNamespace(type=SimpleNamespace(value="response_token"), data={"token": token})
+        yield SimpleNamespace(type=SimpleNamespace(value="workflow_completed"), data={"result": {}})
+
+@pytest.fixture
+async def server():
+    server = SearchServer(StubCoordinator(), port=0, request_timeout=5.0)
+    await server.start()
+    yield server
+    await server.close()
+
+async def send(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    if "content-length" in headers:
+        data = await reader.readexactly(int(headers["content-length"]))
+    else:
+        data = await reader.read()
+    return status, headers, data.decode("utf-8")
+
+@pytest.mark.asyncio
+async def test_query_and_keep_alive(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+
+    status, headers, body = await send(reader, writer, "POST", "/query", {"query": "测试", "session_id": "s1"})
+    assert status == 200
+    assert headers["connection"] == "keep-alive"
+    assert json.loads(body)["final_answer"] == "回答: 测试"
+
+    # 同一连接上继续发送请求
+    status, _, body = await send(reader, writer, "GET", "/health")
+    assert status == 200
+    assert json.loads(body)["requests"] == 2
+    writer.close()
+
+@pytest.mark.asyncio
+async def test_request_timeout_capped(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    await send(reader, writer, "POST", "/query", {"query": "测试", "timeout": 60})
+
+    assert server.coordinator.calls[0][2] == 5.0
+    writer.close()
+
+@pytest.mark.asyncio
+async def test_batch_and_errors(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+
+    status, _, body = await send(reader, writer, "POST", "/batch", {"queries": [{"query": "a"}, {"query": "b"}]})
+    assert status == 200
+    assert [r["final_answer"] for r in json.loads(body)["results"]] == ["回答: a", "回答: b"]
+
+    status, _, _ = await send(reader, writer, "POST", "/query", {"session_id": "s1"})
+    assert status == 400
+    for timeout in [-1, 0, "nan", "inf", "abc"]:
+        status, _, _ = await send(reader, writer, "POST", "/query", {"query": "a", "timeout": timeout})
+        assert status == 400
+    status, _, _ = await send(reader, writer, "GET", "/missing")
+    assert status == 404
+    status, _, _ = await send(reader, writer, "GET", "/query")
+    assert status == 405
+    writer.close()
+
+@pytest.mark.asyncio
+async def test_stream_sse(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    status, headers, body = await send(reader, writer, "POST", "/stream", {"query": "测试"})
+
+    assert status == 200
+    assert headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+    assert events == ["event: response_token", "event: response_token", "event: workflow_completed"]
+    writer.close()
+
+@pytest.mark.asyncio
+async def test_metrics(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    status, headers, body = await send(reader, writer, "GET", "/metrics")
+
+    assert status == 200
+    assert headers["content-type"].startswith("text/plain")
+    assert "llm_search_stage_duration_seconds" in body
+    writer.close()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reason, expected", [("queue_full", 429), ("deadline", 503)])
+async def test_admission_rejection_status(reason, expected):
+    coordinator = StubCoordinator(rejected=reason)
+    coordinator.admission = SimpleNamespace(estimated_wait=lambda: 2.5)
+    server = SearchServer(coordinator, port=0, request_timeout=5.0)
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        status, headers, body = await send(reader, writer, "POST", "/query", {"query": "测试"})
+        assert status == expected
+        assert headers["retry-after"] == "3"
+        assert json.loads(body)["metadata"]["admission_rejected"] == reason
+
+        status, headers, _ = await send(reader, writer, "POST", "/batch", {"queries": [{"query": "a"}]})
+        assert status == expected
+        assert headers["retry-after"] == "3"
+        writer.close()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        status, _, body = await send(reader, writer, "POST", "/stream", {"query": "测试"})
+        event, data = body.strip().split("\n")
+        assert event == "event: error_occurred"
+        payload = json.loads(data[len("data: "):])
+        assert payload["status"] == expected
+        assert payload["retry_after"] == 3
+        writer.close()
+    finally:
+        await server.close()
@@ -0,0 +1,19 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+def test_import_does_not_load_heavy_dependencies():
+    heavy = ["langchain.agents", "langchain_chroma", "pandas", "pypdf", "docx", "bs4", "markdown"]
+    code = (
+        "import json, sys\n"
+        "import engine.core.workflow_coordinator\n"
+        f"print(json.dumps([m for m in {heavy!r} if m in sys.modules]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    
+    assert json.loads(output.strip().splitlines()[-1]) == []
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+from engine.utils.tokens import TokenCounter, approximate_tokens, usage_from_response, add_usage
+
+def make_tokenizer():
+    tokenizer = Mock()
+    tokenizer.encode.side_effect = lambda text: list(text)
+    tokenizer.encode_batch.side_effect = lambda texts, num_threads=1: [list(text) for text in texts]
+    return tokenizer
+
+def test_count_is_cached():
+    tokenizer = make_tokenizer()
+    counter = TokenCounter(tokenizer)
+    
+    assert counter.count("测试文本") == 4
+    assert counter.count("测试文本") == 4
+    
+    tokenizer.encode.assert_called_once()
+    assert counter.stats()["hits"] == 1
+
+def test_count_many_batches_misses():
+    tokenizer = make_tokenizer()
+    counter = TokenCounter(tokenizer)
+    counter.count("abc")
+    
+    counts = counter.count_many(["abc", "de", "", "de", "fghi"])
+    
+    assert counts == [3, 2, 0, 2, 4]
+    # 只有未命中且去重后的文本进入批量编码
+    tokenizer.encode_batch.assert_called_once_with(["de", "fghi"], num_threads=counter.num_threads)
+
+def test_count_many_without_encode_batch():
+    tokenizer = Mock(spec=["encode"])
+    tokenizer.encode.side_effect = lambda text: list(text)
+    counter = TokenCounter(tokenizer)
+    
+    assert counter.count_many(["ab", "cde"]) == [2, 3]
+    assert counter.count("cde") == 3
+    assert tokenizer.encode.call_count == 2
+
+def test_approximate_mode_skips_tokenizer():
+    tokenizer = make_tokenizer()
+    counter = TokenCounter(tokenizer)
+    
+    assert counter.count("abcdefgh中文", approximate=True) == 4
+    assert approximate_tokens("abcdefgh中文") == 4
+    assert counter.count_many(["abcd", ""], approximate=True) == [1, 0]
+    tokenizer.encode.assert_not_called()
+
+def test_usage_from_langchain_message():
+    message = SimpleNamespace(usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+    
+    assert usage_from_response(message) == {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}
+
+def test_usage_from_response_metadata_and_openai_response():
+    message = SimpleNamespace(
+        usage_metadata=None,
+        response_metadata={"token_usage": {"prompt_tokens": 7, "completion_tokens": 2, "total_tokens": 9}}
+    )
+    completion = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=5, completion_tokens=1, total_tokens=6))
+    
+    assert usage_from_response(message)["total_tokens"] == 9
+    assert usage_from_response(completion) == {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}
+
+def test_usage_missing():
+    assert usage_from_response(SimpleNamespace(content="回答", response_metadata={})) is None
+    assert usage_from_response(Mock()) is None
+
+def test_add_usage():
+    first = {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}
+    
+    assert add_usage(None, first) == first
+    assert add_usage(first, None) == first
+    assert add_usage(first, first) == {"prompt_tokens": 2, "completion_tokens": 4, "total_tokens": 6}
@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 from unittest.mock import Mock, patch, AsyncMock
 import json  # 确保导入 json
 from typing import List, Dict
@@ -8,7 +9,8 @@ from langchain.schema import AIMessage
 
 @pytest.fixture
 def orchestrator():
-    orchestrator = ToolOrchestrator()
+    # 调度相关测试统一走 ReAct 代理路径，检索后直接生成的路径单独测试
+    orchestrator = ToolOrchestrator(direct_search=False)
     orchestrator.llm = AsyncMock()
     orchestrator.agent_executor = AsyncMock()
     orchestrator.query_parser = Mock()
@@ -37,6 +39,117 @@ async def test_execute_tasks_success(orchestrator):
     assert results[1]["task_type"] == "analysis"
     assert orchestrator.agent_executor.ainvoke.call_count == 2
 
+@pytest.mark.asyncio
+async def test_execute_tasks_concurrency_cap(orchestrator):
+    orchestrator, _ = orchestrator
+    tasks = [
+        SubTask(task_type="search", description=f"任务{i}", priority=p, parameters={})
+        for i, p in enumerate([3, 1, 2, 1])
+    ]
+    
+    active = 0
+    max_active = 0
+    started = []
+    
+    async def slow_invoke(inputs, config=None):
+        nonlocal active, max_active
+        started.append(inputs["input"])
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return {"output": f"{inputs['input']}结果"}
+    
+    orchestrator.agent_executor.ainvoke.side_effect = slow_invoke
+    
+    results = await orchestrator.execute_tasks(tasks, max_concurrency=2)
+    
+    assert max_active == 2
+    # 按优先级调度，同优先级保持原顺序
+    assert started[:2] == ["任务1", "任务3"]
+    assert [r["result"] for r in results] == ["任务1结果", "任务3结果", "任务2结果", "任务0结果"]
+    assert all(r["wall_time"] > 0 for r in results)
+
+@pytest.mark.asyncio
+async def test_execute_tasks_timeout(orchestrator):
+    orchestrator, _ = orchestrator
+    tasks = [
+        SubTask(task_type="search", description="慢任务", priority=1, parameters={}),
+        SubTask(task_type="search", description="快任务", priority=2, parameters={})
+    ]
+    
+    async def invoke(inputs, config=None):
+        if inputs["input"] == "慢任务":
+            await asyncio.sleep(1)
+        return {"output": "完成"}
+    
+    orchestrator.agent_executor.ainvoke.side_effect = invoke
+    
+    results = await orchestrator.execute_tasks(tasks, task_timeout=0.05)
+    
+    assert "超时" in results[0]["error"]
+    assert results[1]["result"] == "完成"
+
+@pytest.mark.asyncio
+async def test_search_tasks_use_direct_path(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.direct_search = True
+    orchestrator.doc_store = Mock()
+    orchestrator.doc_store.search = AsyncMock(return_value=[Mock(page_content="文档内容")])
+    tasks = [
+        SubTask(task_type="search", description="搜索任务", priority=1, parameters={}),
+        SubTask(task_type="search", description="代理任务", priority=2, parameters={"use_agent": True}),
+        SubTask(task_type="analysis", description="分析任务", priority=3, parameters={})
+    ]
+    orchestrator.agent_executor.ainvoke.return_value = {"output": "代理结果"}
+    
+    results = await orchestrator.execute_tasks(tasks)
+    
+    assert [r["mode"] for r in results] == ["direct", "agent", "agent"]
+    assert results[0]["result"] == "测试回答"
+    assert results[0]["token_usage"]["total_tokens"] > 0
+    orchestrator.doc_store.search.assert_awaited_once_with("搜索任务", k=orchestrator.search_k)
+    # 直接路径只调用一次模型
+    assert orchestrator.llm.ainvoke.await_count == 1
+    assert orchestrator.agent_executor.ainvoke.call_count == 2
+
+@pytest.mark.asyncio
+async def test_direct_tasks_share_one_retrieval(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.direct_search = True
+    orchestrator.doc_store = Mock()
+    orchestrator.doc_store.search = AsyncMock()
+    orchestrator.doc_store.search_many = AsyncMock(return_value=[
+        [Mock(page_content="文档一")],
+        [Mock(page_content="文档二")]
+    ])
+    tasks = [
+        SubTask(task_type="search", description=f"搜索任务{i}", priority=i, parameters={})
+        for i in range(2)
+    ]
+    
+    results = await orchestrator.execute_tasks(tasks, use_agent=False)
+    
+    orchestrator.doc_store.search_many.assert_awaited_once_with(
+        ["搜索任务0", "搜索任务1"], k=orchestrator.search_k
+    )
+    orchestrator.doc_store.search.assert_not_called()
+    assert [r["result"] for r in results] == ["文档一", "文档二"]
+
+@pytest.mark.asyncio
+async def test_use_agent_false_skips_llm(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.direct_search = True
+    orchestrator.doc_store = Mock()
+    orchestrator.doc_store.search = AsyncMock(return_value=[Mock(page_content="文档内容")])
+    tasks = [SubTask(task_type="search", description="搜索任务", priority=1, parameters={})]
+    
+    results = await orchestrator.execute_tasks(tasks, use_agent=False)
+    
+    assert results[0]["mode"] == "retrieval"
+    assert results[0]["result"] == "文档内容"
+    orchestrator.llm.ainvoke.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_generate_response_direct_answer(orchestrator):
     orchestrator, mock_response = orchestrator
@@ -98,4 +211,136 @@ async def test_generate_response_empty_results(orchestrator):
     result = await orchestrator.generate_response(query, task_results)
     
     assert result == "没有找到相关信息"
-    orchestrator.llm.ainvoke.assert_called_once()
\ No newline at end of file
+    orchestrator.llm.ainvoke.assert_called_once()
+@pytest.mark.asyncio
+async def test_generate_response_packs_context(orchestrator):
+    orchestrator, _ = orchestrator
+    task_results = [
+        {"task_type": "search", "result": "营收增长。利润持平。", "status": "success", "wall_time": 1.0},
+        {"task_type": "analysis", "result": "营收增长。成本下降。", "status": "success", "wall_time": 2.0}
+    ]
+    
+    result = await orchestrator.generate_response("测试查询", task_results)
+    
+    messages = orchestrator.llm.ainvoke.call_args[0][0]
+    assert "wall_time" not in messages[-1].content
+    assert messages[-1].content.count("营收增长") == 1
+    assert result["context_packing"]["duplicate_sentences"] == 1
+    assert result["context_packing"]["saved_tokens"] > 0
+
+@pytest.mark.asyncio
+async def test_astream_response_packs_context_once(orchestrator):
+    orchestrator, _ = orchestrator
+    
+    async def astream(messages):
+        yield AIMessage(content="回答")
+    
+    orchestrator.llm.astream = astream
+    orchestrator.context_packer.pack = Mock(wraps=orchestrator.context_packer.pack)
+    details = {}
+    
+    chunks = [chunk async for chunk in orchestrator.astream_response(
+        "测试查询", [{"task_type": "search", "result": "结果。"}], details=details
+    )]
+    
+    assert chunks == ["回答"]
+    orchestrator.context_packer.pack.assert_called_once()
+    assert details["context_packing"]["packed_tokens"] > 0
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_reported_usage(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.llm.ainvoke.return_value = AIMessage(
+        content="测试回答",
+        usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128}
+    )
+    orchestrator.token_counter = Mock()
+    
+    result = await orchestrator.generate_response("测试查询", [{"task_type": "search", "result": "结果。"}])
+    
+    assert result["token_usage"] == {"prompt_tokens": 120, "completion_tokens": 8, "total_tokens": 128}
+    orchestrator.token_counter.count.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_generate_response_map_reduce_above_threshold(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.map_reduce_threshold = 50
+    orchestrator.map_chunk_tokens = 40
+    orchestrator.llm.bind = Mock(return_value=orchestrator.llm)
+    orchestrator.llm.ainvoke.return_value = AIMessage(content="要点。")
+    task_results = [
+        {"task_type": "search", "result": "".join(f"第{i}条检索结论。" for i in range(20))},
+        {"task_type": "analysis", "result": "简短分析。"}
+    ]
+    
+    result = await orchestrator.generate_response("测试查询", task_results)
+    
+    assert result["synthesis"]["mode"] == "map_reduce"
+    map_calls = result["synthesis"]["map_calls"]
+    assert map_calls > 2
+    assert orchestrator.llm.ainvoke.call_count == map_calls + 1
+    orchestrator.llm.bind.assert_called_with(max_tokens=orchestrator.map_summary_tokens)
+    # 最终生成只看到压缩后的要点
+    final_messages = orchestrator.llm.ainvoke.call_args[0][0]
+    assert "检索结论" not in final_messages[-1].content
+
+@pytest.mark.asyncio
+async def test_astream_response_map_reduce_records_synthesis(orchestrator):
+    orchestrator, _ = orchestrator
+    orchestrator.map_reduce_threshold = 50
+    orchestrator.map_chunk_tokens = 40
+    orchestrator.llm.bind = Mock(return_value=orchestrator.llm)
+    orchestrator.llm.ainvoke.return_value = AIMessage(content="要点。")
+    sent = []
+    
+    async def astream(messages):
+        sent.append(messages)
+        yield AIMessage(content="回答")
+    
+    orchestrator.llm.astream = astream
+    task_results = [{"task_type": "search", "result": "".join(f"第{i}条检索结论。" for i in range(20))}]
+    usage, details = {}, {}
+    
+    chunks = [chunk async for chunk in orchestrator.astream_response(
+        "测试查询", task_results, usage=usage, details=details
+    )]
+    
+    assert chunks == ["回答"]
+    assert details["synthesis"]["mode"] == "map_reduce"
+    map_calls = details["synthesis"]["map_calls"]
+    # 服务端未返回使用量时，最终生成按实际发送的压缩后消息计算
+    assert "检索结论" not in sent[0][-1].content
+    assert usage["prompt_tokens"] > orchestrator.count_tokens(orchestrator._messages_text(sent[0]))
+    assert usage["completion_tokens"] == (
+        map_calls * orchestrator.count_tokens("要点。") + orchestrator.count_tokens("回答")
+    )
+
+@pytest.mark.asyncio
+async def test_generate_response_single_call_below_threshold(orchestrator):
+    orchestrator, _ = orchestrator
+    
+    result = await orchestrator.generate_response("测试查询", [{"task_type": "search", "result": "结果。"}])
+    
+    assert result["synthesis"] == {"mode": "single"}
+    orchestrator.llm.ainvoke.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_execute_task_stream_overlaps_with_parsing(orchestrator):
+    orchestrator, _ = orchestrator
+    started = asyncio.Event()
+    
+    async def run_agent(inputs, config=None):
+        started.set()
+        return {"output": f"结果：{inputs['input']}"}
+    
+    orchestrator.agent_executor.ainvoke.side_effect = run_agent
+    
+    async def parsed_tasks():
+        yield SubTask(task_type="search", description="任务二", priority=2, parameters={})
+        # 第一个任务在解析结束前就已开始执行
+        await asyncio.wait_for(started.wait(), timeout=1)
+        yield SubTask(task_type="search", description="任务一", priority=1, parameters={})
+    
+    results = await orchestrator.execute_task_stream(parsed_tasks())
+    
+    assert [r["result"] for r in results] == ["结果：任务一", "结果：任务二"]
@@ -5,10 +5,13 @@ from engine.core.workflow_coordinator import (
     WorkflowCoordinator,
     WorkflowConfig,
     WorkflowResult,
-    WorkflowContext
+    WorkflowContext,
+    resolve_deadline
 )
 from engine.core.query_parser import SubTask
+from engine.core.events import EventType
 from engine.utils.cost_tracker import TokenUsage
+from engine.utils.metrics import WorkflowMetrics
 
 @pytest.fixture
 def config():
@@ -360,4 +363,394 @@ class TestEndToEnd:
         coordinator.tool_orchestrator.execute_tasks.assert_called_once()
         coordinator.tool_orchestrator.generate_response.assert_called_once()
         coordinator.result_evaluator.evaluate_with_fallback.assert_called_once()
-        coordinator.conversation_manager.add_message.assert_called_once()
\ No newline at end of file
+        coordinator.conversation_manager.add_message.assert_called_once()
+
+class TestStageMetrics:
+    """阶段指标测试"""
+    
+    @pytest.mark.asyncio
+    async def test_stage_metrics_recorded(self, coordinator):
+        coordinator.metrics = WorkflowMetrics()
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(return_value=[{
+            "result": "任务结果",
+            "task_type": "search",
+            "token_usage": {"completion_tokens": 10, "total_tokens": 40}
+        }])
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"completion_tokens": 5, "total_tokens": 25}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        
+        result = await coordinator.process_query("测试查询", "test_session")
+        snapshot = coordinator.metrics.snapshot()
+        
+        assert snapshot["tasks_executed"]["tokens"] == 40
+        assert snapshot["response_generated"]["tokens"] == 25
+        assert snapshot["workflow_completed"]["errors"] == 0
+        assert set(result.metadata["stage_timings"]) >= {"tasks_executed", "conversation_updated"}
+    
+    @pytest.mark.asyncio
+    async def test_stage_error_recorded(self, coordinator):
+        coordinator.metrics = WorkflowMetrics()
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(side_effect=Exception("任务执行失败"))
+        
+        await coordinator.process_query("测试查询", "test_session")
+        snapshot = coordinator.metrics.snapshot()
+        
+        assert snapshot["tasks_executed"]["errors"] == 1
+        assert "response_generated" not in snapshot
+
+class TestStreaming:
+    """流式处理测试"""
+    
+    @pytest.mark.asyncio
+    async def test_astream_query_events(self, coordinator):
+        task_result = {
+            "result": "任务结果",
+            "task_type": "search",
+            "token_usage": {"completion_tokens": 10, "total_tokens": 20}
+        }
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(return_value=[task_result])
+        coordinator.tool_orchestrator.response_token_usage = Mock(
+            return_value={"completion_tokens": 2, "total_tokens": 10}
+        )
+        
+        async def stream(query, task_results, **kwargs):
+            for token in ["生成", "的回答"]:
+                yield token
+        
+        coordinator.tool_orchestrator.astream_response = stream
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        
+        events = [event async for event in coordinator.astream_query("测试查询", "test_session")]
+        types = [event.type for event in events]
+        
+        assert types[0] == EventType.QUERY_RECEIVED
+        assert types.index(EventType.TASKS_EXECUTED) < types.index(EventType.RESPONSE_TOKEN)
+        assert [e.data["token"] for e in events if e.type == EventType.RESPONSE_TOKEN] == ["生成", "的回答"]
+        assert types[-1] == EventType.WORKFLOW_COMPLETED
+        assert events[-1].data["result"]["final_answer"] == "生成的回答"
+        
+    @pytest.mark.asyncio
+    async def test_astream_query_error(self, coordinator):
+        events = [event async for event in coordinator.astream_query("", "test_session")]
+        
+        assert events[-1].type == EventType.ERROR_OCCURRED
+        assert events[-1].data["error"] == "查询内容不能为空"
+
+class TestBatchProcessing:
+    """批量处理测试"""
+    
+    @pytest.mark.asyncio
+    async def test_process_queries_deduplicates_tasks(self, coordinator):
+        async def execute(tasks):
+            return [
+                {"result": f"{task.description}结果", "task_type": task.task_type,
+                 "token_usage": {"completion_tokens": 5, "total_tokens": 10}}
+                for task in tasks
+            ]
+        
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(side_effect=execute)
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"completion_tokens": 5, "total_tokens": 25}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        
+        results = await coordinator.process_queries([
+            ("测试查询", "s1"),
+            ("测试查询 ", "s2"),
+            ("另一个查询", "s3"),
+            ("", "s4")
+        ])
+        
+        assert len(results) == 4
+        assert all(r.final_answer == "生成的回答" for r in results[:3])
+        assert results[3].metadata["error"] == "查询内容不能为空"
+        # 三个基础任务 × 两个不同查询，只调度一次
+        coordinator.tool_orchestrator.execute_tasks.assert_called_once()
+        args, _ = coordinator.tool_orchestrator.execute_tasks.call_args
+        assert len(args[0]) == 6
+        assert results[0].metadata["shared_tasks"] == 0
+        assert results[1].metadata["shared_tasks"] == 3
+    
+    def test_base_tasks_keep_original_query(self, coordinator):
+        tasks = coordinator._base_tasks("iPhone 的 GDP？")
+        normalized = coordinator._base_tasks("iphone 的 gdp")
+        
+        # 发给模型的描述保留原文，去重键与规范化后相同的查询一致
+        assert "iPhone 的 GDP？" in tasks[0].description
+        assert [coordinator._task_key(t) for t in tasks] == [coordinator._task_key(t) for t in normalized]
+    
+    @pytest.mark.asyncio
+    async def test_process_queries_parses_concurrently(self, coordinator):
+        import asyncio
+        coordinator.config.llm_task_parsing = True
+        in_flight = []
+        peak = []
+        
+        async def aparse_query(query, decision=None):
+            in_flight.append(query)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(query)
+            return [SubTask(task_type="search", description=f"{query}任务", priority=1, parameters={})]
+        
+        coordinator.query_parser.aparse_query = aparse_query
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(side_effect=lambda tasks, **kwargs: [
+            {"result": task.description, "task_type": task.task_type} for task in tasks
+        ])
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"completion_tokens": 5, "total_tokens": 25}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        
+        results = await coordinator.process_queries([
+            ("比较甲和乙的发展趋势", "s1"),
+            ("分析丙的影响", "s2"),
+            ("评估丁的前景", "s3")
+        ])
+        
+        assert all(r.final_answer == "生成的回答" for r in results)
+        # 三个查询的模型解析同时进行
+        assert max(peak) == 3
+
+class TestAnswerCache:
+    """答案缓存测试"""
+    
+    @pytest.mark.asyncio
+    async def test_repeated_query_hits_cache(self, coordinator):
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(return_value=[{
+            "result": "任务结果",
+            "task_type": "search",
+            "token_usage": {"completion_tokens": 10, "total_tokens": 20}
+        }])
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"completion_tokens": 5, "total_tokens": 25}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        
+        first = await coordinator.process_query("测试查询", "s1")
+        second = await coordinator.process_query("测试查询？", "s2")
+        
+        assert first.metadata["cache_hit"] is False
+        assert second.metadata["cache_hit"] is True
+        # 命中结果不沿用原始执行的阶段耗时
+        assert "stage_timings" in first.metadata
+        assert "stage_timings" not in second.metadata
+        assert second.final_answer == "生成的回答"
+        assert second.conversation_id == "s2"
+        coordinator.tool_orchestrator.execute_tasks.assert_called_once()
+        assert coordinator.answer_cache.stats()["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_error_results_not_cached(self, coordinator):
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(side_effect=Exception("任务执行失败"))
+        
+        await coordinator.process_query("测试查询", "s1")
+        await coordinator.process_query("测试查询", "s1")
+        
+        assert coordinator.tool_orchestrator.execute_tasks.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_slow_semantic_embedding_is_bounded(self, coordinator):
+        import asyncio
+        
+        async def embed(query):
+            await asyncio.sleep(10)
+        
+        coordinator.semantic_cache = Mock()
+        coordinator.semantic_cache.embed = embed
+        coordinator.config.semantic_cache_skip_below = 0.95
+        context = WorkflowContext("测试查询", "s1", resolve_deadline(timeout=1.0))
+        context.cache_namespace = "ns"
+        
+        assert await coordinator._lookup_semantic_cache(context) is None
+        assert context.metadata["semantic_cache_skipped"] == "timeout"
+        assert context.query_vector is None
+        
+        # 剩余时间不足时不发起向量化请求
+        coordinator.semantic_cache.embed = Mock()
+        context = WorkflowContext("测试查询", "s1", resolve_deadline(timeout=0.5))
+        assert await coordinator._lookup_semantic_cache(context) is None
+        assert context.metadata["semantic_cache_skipped"] == "deadline"
+        coordinator.semantic_cache.embed.assert_not_called()
+
+class TestDeadline:
+    """截止时间与降级测试"""
+    
+    @pytest.fixture
+    def ready(self, coordinator):
+        coordinator.tool_orchestrator.execute_tasks = AsyncMock(return_value=[{
+            "result": "任务结果",
+            "task_type": "search",
+            "token_usage": {"completion_tokens": 10, "total_tokens": 20}
+        }])
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"completion_tokens": 5, "total_tokens": 25}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        return coordinator
+    
+    @pytest.mark.asyncio
+    async def test_no_degradation_with_ample_budget(self, ready):
+        result = await ready.process_query("测试查询", "test_session", timeout=600)
+        
+        assert "degradations" not in result.metadata
+        _, kwargs = ready.tool_orchestrator.execute_tasks.call_args
+        assert kwargs["task_timeout"] <= ready.config.task_timeout
+        assert "use_agent" not in kwargs
+    
+    @pytest.mark.asyncio
+    async def test_degradations_under_tight_budget(self, ready):
+        result = await ready.process_query("测试查询", "test_session", timeout=10)
+        
+        assert result.final_answer == "生成的回答"
+        assert set(result.metadata["degradations"]) == {
+            "reduced_tasks", "direct_retrieval", "capped_max_tokens", "skipped_evaluation"
+        }
+        args, kwargs = ready.tool_orchestrator.execute_tasks.call_args
+        assert len(args[0]) == ready.config.degraded_task_count
+        assert kwargs["use_agent"] is False
+        _, kwargs = ready.tool_orchestrator.generate_response.call_args
+        assert kwargs["max_tokens"] == ready.config.degraded_max_tokens
+        ready.result_evaluator.evaluate_with_fallback.assert_not_called()
+        # 降级结果不写入答案缓存
+        assert ready.answer_cache.stats()["memory"]["size"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_expired_deadline_fails_fast(self, ready):
+        result = await ready.process_query("测试查询", "test_session", timeout=0)
+        
+        assert "截止时间" in result.metadata["error"]
+        ready.tool_orchestrator.execute_tasks.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_slow_parse_falls_back_to_base_tasks(self, ready):
+        import asyncio
+        ready.config.llm_task_parsing = True
+        ready.config.pipelined_task_parsing = False
+        
+        async def aparse_query(query, decision=None):
+            await asyncio.sleep(10)
+        
+        ready.query_parser.aparse_query = aparse_query
+        
+        result = await ready.process_query("比较甲和乙的发展趋势", "test_session", timeout=0.2)
+        
+        assert "parse_timeout" in result.metadata["degradations"]
+        args, _ = ready.tool_orchestrator.execute_tasks.call_args
+        assert args[0][0].description == ready._base_tasks("比较甲和乙的发展趋势")[0].description
+
+class TestAdmission:
+    """准入控制测试"""
+    
+    @pytest.mark.asyncio
+    async def test_rejected_when_queue_full(self, coordinator):
+        from engine.core.admission import AdmissionController
+        coordinator.admission = AdmissionController(max_in_flight=1, max_queue=0)
+        await coordinator.admission.acquire()
+        
+        result = await coordinator.process_query("测试查询", "test_session")
+        
+        assert result.metadata["admission_rejected"] == "queue_full"
+        assert "请求被拒绝" in result.metadata["error"]
+        coordinator.tool_orchestrator.execute_tasks.assert_not_called()
+
+class TestPipelinedParsing:
+    """流水线任务解析测试"""
+    
+    @pytest.fixture
+    def pipelined(self, coordinator):
+        coordinator.config.llm_task_parsing = True
+        coordinator.tool_orchestrator.execute_task_stream = AsyncMock()
+        coordinator.tool_orchestrator.generate_response = AsyncMock(return_value={
+            "response": "生成的回答",
+            "token_usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+        coordinator.result_evaluator.evaluate_with_fallback = AsyncMock(
+            return_value={"quality_score": 0.9}
+        )
+        return coordinator
+    
+    @pytest.mark.asyncio
+    async def test_parsed_tasks_streamed_to_orchestrator(self, pipelined):
+        async def astream_tasks(query, decision=None):
+            yield SubTask(task_type="search", description="解析任务", priority=1, parameters={})
+        
+        async def execute_task_stream(tasks, **kwargs):
+            return [{"task_type": task.task_type, "result": task.description} async for task in tasks]
+        
+        pipelined.query_parser.astream_tasks = astream_tasks
+        pipelined.tool_orchestrator.execute_task_stream.side_effect = execute_task_stream
+        
+        result = await pipelined.process_query("测试查询", "test_session")
+        
+        assert result.final_answer == "生成的回答"
+        assert result.subtasks[0]["description"] == "解析任务"
+        pipelined.tool_orchestrator.execute_tasks.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_parse_failure_falls_back_to_base_tasks(self, pipelined):
+        async def astream_tasks(query, decision=None):
+            raise ValueError("invalid json")
+            yield
+        
+        async def execute_task_stream(tasks, **kwargs):
+            return [{"task_type": task.task_type, "result": task.description} async for task in tasks]
+        
+        pipelined.query_parser.astream_tasks = astream_tasks
+        pipelined.tool_orchestrator.execute_task_stream.side_effect = execute_task_stream
+        
+        result = await pipelined.process_query("测试查询", "test_session")
+        
+        assert len(result.subtasks) == len(pipelined.config.base_tasks)
+        assert "error" not in result.metadata
+
+    @pytest.mark.asyncio
+    async def test_slow_stream_parse_keeps_parsed_tasks(self, pipelined):
+        import asyncio
+        
+        async def astream_tasks(query, decision=None):
+            yield SubTask(task_type="search", description="解析任务", priority=1, parameters={})
+            await asyncio.sleep(10)
+            yield SubTask(task_type="search", description="迟到的任务", priority=2, parameters={})
+        
+        async def execute_task_stream(tasks, **kwargs):
+            return [{"task_type": task.task_type, "result": task.description} async for task in tasks]
+        
+        pipelined.query_parser.astream_tasks = astream_tasks
+        pipelined.tool_orchestrator.execute_task_stream.side_effect = execute_task_stream
+        
+        result = await pipelined.process_query("比较甲和乙的发展趋势", "test_session", timeout=0.5)
+        
+        assert "parse_timeout" in result.metadata["degradations"]
+        assert [task["description"] for task in result.subtasks] == ["解析任务"]
+
+    @pytest.mark.asyncio
+    async def test_route_recorded_in_metadata(self, pipelined):
+        async def execute_task_stream(tasks, **kwargs):
+            return [{"task_type": task.task_type, "result": task.description} async for task in tasks]
+        
+        pipelined.tool_orchestrator.execute_task_stream.side_effect = execute_task_stream
+        
+        result = await pipelined.process_query("什么是机器学习", "test_session")
+        
+        assert result.metadata["query_route"]["route"] == "simple"
+        assert result.subtasks[0]["parameters"]["route"] == "fast_path"